@@ -0,0 +1,291 @@
+"""
+Fleet aggregation - one dashboard for many servers running this app.
+
+One asyncio loop on a daemon thread polls every agent's /api/summary over
+pooled keep-alive connections. Every agent has its own task and timeout, so
+a slow or dead agent only delays itself; how stale its data is and why the
+last poll failed are part of the view. The same connections proxy the
+drill-down pages (/fleet/host/<name>/...) to the agent's own dashboard.
+"""
+
+import asyncio
+import concurrent.futures
+import heapq
+import json
+import logging
+import os
+import threading
+import time
+from urllib.parse import urlsplit
+
+AGENTS = os.environ.get('MONITOR_AGENTS', '')
+AGENTS_FILE = os.environ.get('MONITOR_AGENTS_FILE', '')
+FLEET_INTERVAL = float(os.environ.get('MONITOR_FLEET_INTERVAL', '2'))
+FLEET_TIMEOUT = float(os.environ.get('MONITOR_FLEET_TIMEOUT', '1.5'))
+
+# A failing agent is retried with exponential backoff up to this many seconds.
+MAX_BACKOFF = 30
+# Idle keep-alive connections kept per agent (one poller plus a few drill-down viewers).
+POOL_SIZE = 4
+MAX_BODY = 8 << 20
+
+# Sort keys for the overview: name -> summary field
+SORT_KEYS = {'cpu': 'cpu', 'mem': 'mem', 'disk': 'disk', 'load': 'load1'}
+
+log = logging.getLogger(__name__)
+
+
+class AgentError(Exception):
+    """An agent could not be reached or answered with garbage."""
+
+
+def parse_agents(spec):
+    """'name=http://host:port/prefix' or bare URLs, separated by commas, spaces or newlines."""
+    agents = {}
+    for entry in spec.replace(',', ' ').split():
+        if entry.startswith('#'):
+            continue
+        name, _, url = entry.partition('=') if '=' in entry.split('://')[0] else ('', '', entry)
+        if '://' not in url:
+            url = 'http://' + url
+        parts = urlsplit(url)
+        if parts.scheme != 'http' or not parts.hostname:
+            raise ValueError(f"agent {entry!r}: only http://host[:port][/prefix] is supported")
+        name = name or parts.netloc
+        agents[name] = Agent(name, parts.hostname, parts.port or 80, parts.path.rstrip('/'))
+    return list(agents.values())
+
+def configured_agents():
+    spec = AGENTS
+    if AGENTS_FILE:
+        with open(AGENTS_FILE) as f:
+            spec += '\n' + '\n'.join(line.split('#')[0] for line in f)
+    return parse_agents(spec)
+
+
+class Agent:
+    """Connection pool and last known state of one monitored server."""
+
+    def __init__(self, name, host, port, prefix=''):
+        self.name = name
+        self.host = host
+        self.port = port
+        self.prefix = prefix
+        self.pool = []
+        self.summary = None
+        self.seq = None
+        self.last_ok = None         # local time of the last successful poll
+        self.last_change = None     # local time the agent's snapshot last advanced
+        self.latency = None
+        self.error = None
+        self.failures = 0
+
+    @property
+    def url(self):
+        return f"http://{self.host}:{self.port}{self.prefix}/"
+
+    async def request(self, path, headers=()):
+        """GET prefix+path; returns (status, headers, body). Raises AgentError or TimeoutError."""
+        lines = [f"GET {self.prefix}{path} HTTP/1.1", f"Host: {self.host}:{self.port}"]
+        lines.extend(f"{k}: {v}" for k, v in headers)
+        raw = ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1')
+        while True:
+            pooled = bool(self.pool)
+            reader, writer = self.pool.pop() if pooled else await asyncio.open_connection(self.host, self.port)
+            try:
+                writer.write(raw)
+                status, response_headers, body, keep_alive = await read_response(reader)
+            except (ConnectionError, asyncio.IncompleteReadError) as exc:
+                writer.close()
+                if pooled:
+                    continue    # the agent closed an idle connection; retry on a fresh one
+                raise AgentError(f"connection lost: {exc or type(exc).__name__}") from None
+            except BaseException:
+                # Timeout/cancellation mid-response: the connection is in an unknown state.
+                writer.close()
+                raise
+            if keep_alive and len(self.pool) < POOL_SIZE:
+                self.pool.append((reader, writer))
+            else:
+                writer.close()
+            return status, response_headers, body
+
+    def close(self):
+        for _, writer in self.pool:
+            writer.close()
+        self.pool.clear()
+
+
+async def read_response(reader):
+    """One HTTP/1.1 response: (status, {lowercase header: value}, body, keep_alive)"""
+    status_line = await reader.readuntil(b'\r\n')
+    try:
+        version, status = status_line.split(None, 2)[:2]
+        status = int(status)
+    except ValueError:
+        raise AgentError(f"bad status line {status_line[:40]!r}") from None
+    headers = {}
+    while True:
+        line = await reader.readuntil(b'\r\n')
+        if line == b'\r\n':
+            break
+        key, _, value = line.decode('latin-1').partition(':')
+        headers[key.strip().lower()] = value.strip()
+
+    keep_alive = version == b'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+    if headers.get('transfer-encoding', '').lower() == 'chunked':
+        chunks, length = [], 0
+        while True:
+            size = int((await reader.readuntil(b'\r\n')).split(b';')[0], 16)
+            if size == 0:
+                await reader.readuntil(b'\r\n')     # no trailers expected
+                break
+            length += size
+            if length > MAX_BODY:
+                raise AgentError(f"chunked response over {MAX_BODY} bytes is too large")
+            chunks.append(await reader.readexactly(size))
+            await reader.readexactly(2)
+        body = b''.join(chunks)
+    elif 'content-length' in headers:
+        length = int(headers['content-length'])
+        if length > MAX_BODY:
+            raise AgentError(f"response of {length} bytes is too large")
+        body = await reader.readexactly(length)
+    else:
+        body = await reader.read(MAX_BODY)
+        keep_alive = False
+    return status, headers, body, keep_alive
+
+
+class Fleet:
+    """Cluster-wide view of `agents`, refreshed every `interval` seconds."""
+
+    def __init__(self, agents, interval=FLEET_INTERVAL, timeout=FLEET_TIMEOUT):
+        self.agents = {agent.name: agent for agent in agents}
+        self.interval = interval
+        self.timeout = timeout
+        # Data not refreshed within this long is shown as stale.
+        self.stale_after = 3 * interval + timeout
+        self.pid = os.getpid()
+        self.loop = asyncio.new_event_loop()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='fleet', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        for agent in self.agents.values():
+            self.loop.create_task(self._poll_forever(agent))
+        self.loop.run_forever()
+
+    async def _poll_forever(self, agent):
+        # Spread the first polls over one interval so 200 agents are not hit in the same millisecond.
+        await asyncio.sleep(hash(agent.name) % 1000 / 1000 * self.interval)
+        while True:
+            started = time.monotonic()
+            await self.poll(agent)
+            delay = self.interval if not agent.failures else min(MAX_BACKOFF, self.interval * 2 ** agent.failures)
+            await asyncio.sleep(max(0, delay - (time.monotonic() - started)))
+
+    async def poll(self, agent):
+        started = time.monotonic()
+        try:
+            status, _, body = await asyncio.wait_for(
+                agent.request('/api/summary', (('Accept', 'application/json'),)), self.timeout)
+            if status != 200:
+                raise AgentError(f"HTTP {status}")
+            summary = json.loads(body)
+        except asyncio.TimeoutError:
+            agent.error = f"timeout after {self.timeout:g}s"
+        except (OSError, AgentError, ValueError) as exc:
+            agent.error = str(exc) or type(exc).__name__
+        except Exception as exc:
+            log.exception('polling %s failed', agent.name)
+            agent.error = type(exc).__name__
+        else:
+            now = time.time()
+            agent.latency = time.monotonic() - started
+            agent.last_ok = now
+            if summary.get('seq') != agent.seq:
+                agent.seq = summary.get('seq')
+                agent.last_change = now
+            agent.summary = summary
+            agent.error = None
+            agent.failures = 0
+            return
+        agent.failures += 1
+
+    def status(self, agent, now):
+        """'ok'; 'stale' when the data stopped advancing; 'down' when it did because polls fail."""
+        if agent.summary is None:
+            return 'down'
+        stale_after = self.stale_after
+        if agent.summary.get('interval'):
+            # An idle agent samples less often; its snapshots advance that much slower.
+            stale_after = max(stale_after, 3 * agent.summary['interval'] + self.timeout)
+        if now - agent.last_change > stale_after:
+            return 'down' if agent.error else 'stale'
+        return 'ok'
+
+    def host_view(self, agent, now):
+        view = {
+            'name': agent.name,
+            'url': agent.url,
+            'status': self.status(agent, now),
+            'age': round(now - agent.last_change, 1) if agent.last_change else None,
+            'latency_ms': round(agent.latency * 1000, 1) if agent.latency is not None else None,
+            'error': agent.error,
+        }
+        if agent.summary is not None:
+            view.update(agent.summary)
+        return view
+
+    def view(self, sort='cpu', limit=10):
+        """{'hosts': [...], 'counts': {...}, 'top': {metric: [...]}}; top lists skip down hosts."""
+        now = time.time()
+        hosts = [self.host_view(agent, now) for agent in self.agents.values()]
+        counts = {'ok': 0, 'stale': 0, 'down': 0}
+        for host in hosts:
+            counts[host['status']] += 1
+        live = [host for host in hosts if host['status'] != 'down']
+        top = {key: heapq.nlargest(limit, live, key=lambda h, f=field: h.get(f) or 0)
+               for key, field in SORT_KEYS.items()}
+        field = SORT_KEYS.get(sort)
+        if field is None:
+            hosts.sort(key=lambda h: h['name'])
+        else:
+            hosts.sort(key=lambda h: (h['status'] == 'down', -(h.get(field) or 0), h['name']))
+        return {'ts': round(now, 3), 'interval': self.interval, 'counts': counts, 'top': top, 'hosts': hosts}
+
+    def fetch(self, name, path, headers=()):
+        """Proxy one GET to agent `name` from a request thread; blocks at most the fleet timeout.
+
+        Raises the builtin TimeoutError on timeout (asyncio's is a different class before 3.11).
+        """
+        agent = self.agents[name]
+        future = asyncio.run_coroutine_threadsafe(
+            asyncio.wait_for(agent.request(path, headers), self.timeout * 2), self.loop)
+        try:
+            return future.result()
+        except (asyncio.TimeoutError, concurrent.futures.TimeoutError):
+            raise TimeoutError(f"agent {name} did not answer within {self.timeout * 2:g}s") from None
+
+
+_fleet = None
+_fleet_lock = threading.Lock()
+
+def get_fleet():
+    """This process's Fleet, or None when no agents are configured (plain agent mode)."""
+    global _fleet
+    fleet = _fleet
+    if fleet is not None and fleet.pid == os.getpid():
+        return fleet
+    if not AGENTS and not AGENTS_FILE:
+        return None
+    with _fleet_lock:
+        if _fleet is None or _fleet.pid != os.getpid():
+            _fleet = Fleet(configured_agents())
+            _fleet.start()
+        return _fleet
@@ -0,0 +1,330 @@
+"""
+Threshold alerts evaluated on every sampler tick.
+
+A rule reads like "cpu_percent > 90 for 60s" or "disk / > 85%". Each rule
+only keeps its active (pending or firing) alerts and since when their
+condition has held, so a tick costs one lookup and one comparison per rule
+however long the durations are; history is never scanned. A firing alert
+resolves only once the value is back past its clear threshold, so a value
+hovering at the threshold does not flap. Transitions go to the log and an
+optional webhook, rate limited, from a thread of their own.
+"""
+
+import json
+import logging
+import operator
+import os
+import queue
+import re
+import socket
+import threading
+import time
+
+import disks
+import network
+
+DEFAULT_RULES = 'cpu_percent > 90 for 60s; mem_percent > 90 for 60s; swap_percent > 80 for 5m; disk * > 85%'
+
+# Rules separated by ";" or newlines; MONITOR_ALERT_RULES="" disables alerting.
+ALERT_RULES = os.environ.get('MONITOR_ALERT_RULES', DEFAULT_RULES)
+ALERT_RULES_FILE = os.environ.get('MONITOR_ALERT_RULES_FILE', '')
+# Transitions are POSTed here as JSON (e.g. a local chat bridge); empty = log only.
+ALERT_WEBHOOK = os.environ.get('MONITOR_ALERT_WEBHOOK', '')
+# Notifications per minute, log and webhook together; the rest are counted and dropped.
+ALERT_RATE = float(os.environ.get('MONITOR_ALERT_RATE', '6'))
+# CPU time rule evaluation may take per tick; rules left over run first on the next tick.
+ALERT_BUDGET_MS = float(os.environ.get('MONITOR_ALERT_BUDGET_MS', '2'))
+
+# Without an explicit "clear", a firing alert resolves 5% of the threshold back from it.
+HYSTERESIS = 0.05
+
+# The clock is checked once per this many rules, not once per rule.
+BUDGET_CHECK_EVERY = 32
+
+WEBHOOK_TIMEOUT = 5
+WEBHOOK_QUEUE = 100
+
+# Snapshot fields a rule can name directly
+SCALARS = {
+    'cpu_percent': lambda d: d['cpu_percent'],
+    'mem_percent': lambda d: d['mem_percent'],
+    'swap_percent': lambda d: d['swap_percent'],
+    'disk_percent': lambda d: d['disk_percent'],
+    'disk_read_rate': lambda d: d['disk_read_rate'],
+    'disk_write_rate': lambda d: d['disk_write_rate'],
+    'net_sent_rate': lambda d: d['net_sent_rate'],
+    'net_recv_rate': lambda d: d['net_recv_rate'],
+    'load1': lambda d: d['load_avg'][0],
+    'load5': lambda d: d['load_avg'][1],
+    'load15': lambda d: d['load_avg'][2],
+    'connections': lambda d: d['connections'],
+    'process_count': lambda d: d['process_count'],
+}
+
+# "disk <mount> [column]" and "net <iface> <column>": snapshot key, name column, numeric columns, default
+ITEM_KINDS = {
+    'disk': ('disks', 'mount', disks.COLUMNS[3:], 'percent'),
+    'net': ('net', 'iface', network.COLUMNS[1:], None),
+}
+
+OPERATORS = {'>': operator.gt, '>=': operator.ge, '<': operator.lt, '<=': operator.le}
+
+_RULE_RE = re.compile(
+    r'^(?:(?P<name>[\w.-]+):\s+)?(?P<selector>.+?)\s+(?P<op>>=|<=|>|<)\s*(?P<threshold>-?\d+(?:\.\d+)?)%?'
+    r'(?:\s+for\s+(?P<duration>\d+(?:\.\d+)?[smh]?))?'
+    r'(?:\s+clear\s+(?P<clear>-?\d+(?:\.\d+)?)%?)?$')
+
+_UNITS = {'s': 1, 'm': 60, 'h': 3600}
+
+HOSTNAME = socket.gethostname()
+
+log = logging.getLogger(__name__)
+
+
+def parse_duration(text):
+    """'90', '90s', '5m' or '1h' in seconds"""
+    if text[-1] in _UNITS:
+        return float(text[:-1]) * _UNITS[text[-1]]
+    return float(text)
+
+
+class Rule:
+    """One parsed rule; `item` is a mount/interface name, '*' for all of them, or None."""
+
+    __slots__ = ('name', 'text', 'kind', 'item', 'column', 'op', 'compare', 'threshold', 'clear', 'duration')
+
+    def __init__(self, text):
+        self.text = ' '.join(text.split())
+        match = _RULE_RE.match(self.text)
+        if match is None:
+            raise ValueError(f"alert rule {text!r}: expected '<metric> <op> <threshold> [for <duration>] [clear <value>]'")
+        selector = match['selector'].split()
+        self.kind, self.item, self.column = selector[0], None, None
+        if self.kind in ITEM_KINDS:
+            _, _, columns, default = ITEM_KINDS[self.kind]
+            if len(selector) not in (2, 3) or (len(selector) == 2 and default is None):
+                raise ValueError(f"alert rule {text!r}: use '{self.kind} <name|*> <{'|'.join(columns)}>'")
+            self.item = selector[1]
+            self.column = selector[2] if len(selector) == 3 else default
+            if self.column not in columns:
+                raise ValueError(f"alert rule {text!r}: {self.kind} column must be one of {', '.join(columns)}")
+        elif self.kind not in SCALARS or len(selector) != 1:
+            raise ValueError(f"alert rule {text!r}: unknown metric {match['selector']!r}")
+        self.name = match['name'] or self.text
+        self.op = match['op']
+        self.compare = OPERATORS[self.op]
+        self.threshold = float(match['threshold'])
+        if match['clear'] is not None:
+            self.clear = float(match['clear'])
+        else:
+            band = abs(self.threshold) * HYSTERESIS
+            self.clear = self.threshold - band if self.op[0] == '>' else self.threshold + band
+        if self.clear > self.threshold if self.op[0] == '>' else self.clear < self.threshold:
+            raise ValueError(f"alert rule {text!r}: clear {self.clear:g} must be on the other side of {self.threshold:g}")
+        self.duration = parse_duration(match['duration']) if match['duration'] else 0.0
+
+    def triggered(self, value):
+        return self.compare(value, self.threshold)
+
+    def cleared(self, value):
+        # The same comparison against the clear threshold: "> 90 clear 80" holds until <= 80.
+        return value is None or not self.compare(value, self.clear)
+
+
+def parse_rules(spec):
+    """Rules from text separated by ';' or newlines; '#' starts a comment. Bad rules are logged and skipped."""
+    rules = []
+    for line in spec.replace(';', '\n').splitlines():
+        line = line.split('#')[0].strip()
+        if not line:
+            continue
+        try:
+            rules.append(Rule(line))
+        except ValueError as exc:
+            log.error('%s', exc)
+    return rules
+
+def configured_rules():
+    spec = ALERT_RULES
+    if ALERT_RULES_FILE:
+        try:
+            with open(ALERT_RULES_FILE) as f:
+                spec += '\n' + f.read()
+        except OSError:
+            log.exception('alert rules file not read, using MONITOR_ALERT_RULES only')
+    return parse_rules(spec)
+
+
+class Alert:
+    """A rule (and item) whose condition holds: pending until it held for the rule's duration, then firing."""
+
+    __slots__ = ('rule', 'item', 'since', 'started', 'fired', 'value')
+
+    def __init__(self, rule, item, now, value):
+        self.rule = rule
+        self.item = item
+        self.since = now                # monotonic, for the duration
+        self.started = time.time()      # wall clock, for display
+        self.fired = None
+        self.value = value
+
+    def view(self):
+        return {
+            'rule': self.rule.name,
+            'item': self.item,
+            'state': 'firing' if self.fired else 'pending',
+            'value': self.value,
+            'op': self.rule.op,
+            'threshold': self.rule.threshold,
+            'clear': self.rule.clear,
+            'since': round(self.started, 3),
+            'fired_at': round(self.fired, 3) if self.fired else None,
+        }
+
+
+class AlertEngine:
+    """Evaluates `rules` against snapshot data, at most `budget_ms` of CPU per tick."""
+
+    def __init__(self, rules, notifier=None, budget_ms=ALERT_BUDGET_MS):
+        self.rules = rules
+        self.notifier = notifier
+        self.budget = budget_ms / 1000
+        # Per rule: item -> Alert, only for alerts that are pending or firing.
+        self.active = [{} for _ in rules]
+        self._next = 0              # evaluation resumes here after a tick ran out of budget
+        self.overruns = 0
+
+    def evaluate(self, data):
+        """Advance every rule by one sample and return the alert view for the snapshot."""
+        started = time.thread_time()
+        now = time.monotonic()
+        indexes = {}
+        events = []
+        count, i = len(self.rules), self._next
+        done = 0
+        while done < count:
+            self._evaluate_rule(i, data, indexes, now, events)
+            done += 1
+            i = i + 1 if i + 1 < count else 0
+            if done % BUDGET_CHECK_EVERY == 0 and done < count and time.thread_time() - started > self.budget:
+                self.overruns += 1
+                break
+        self._next = i
+        if self.notifier is not None:
+            for event in events:
+                self.notifier.notify(event)
+        return self.view(count - done, (time.thread_time() - started) * 1000)
+
+    def _evaluate_rule(self, i, data, indexes, now, events):
+        rule, active = self.rules[i], self.active[i]
+        if rule.item is None:
+            self._step(rule, active, None, SCALARS[rule.kind](data), now, events)
+            return
+        key, name_column, _, _ = ITEM_KINDS[rule.kind]
+        columns = data[key]
+        index = indexes.get(key)
+        if index is None:
+            index = indexes[key] = {name: j for j, name in enumerate(columns[name_column])}
+        values = columns[rule.column]
+        if rule.item != '*':
+            j = index.get(rule.item)
+            self._step(rule, active, rule.item, values[j] if j is not None else None, now, events)
+            return
+        for item, j in index.items():
+            self._step(rule, active, item, values[j], now, events)
+        for item in [item for item in active if item not in index]:
+            self._step(rule, active, item, None, now, events)     # unmounted / interface gone
+
+    def _step(self, rule, active, item, value, now, events):
+        alert = active.get(item)
+        if alert is None:
+            if value is None or not rule.triggered(value):
+                return
+            alert = active[item] = Alert(rule, item, now, value)
+        else:
+            alert.value = value
+            if alert.fired:
+                if rule.cleared(value):
+                    del active[item]
+                    events.append(('resolved', alert))
+                return
+            if value is None or not rule.triggered(value):
+                del active[item]    # never fired: drops silently
+                return
+        if now - alert.since >= rule.duration:
+            alert.fired = time.time()
+            events.append(('firing', alert))
+
+    def view(self, deferred=0, cpu_ms=0.0):
+        alerts = [alert.view() for active in self.active for alert in active.values()]
+        firing = sum(1 for alert in alerts if alert['state'] == 'firing')
+        return {
+            'firing': firing,
+            'pending': len(alerts) - firing,
+            'alerts': alerts,
+            'eval': {'rules': len(self.rules), 'cpu_ms': round(cpu_ms, 3),
+                     'deferred': deferred, 'overruns': self.overruns},
+        }
+
+
+class Notifier:
+    """Rate-limited delivery of alert transitions to the log and an optional webhook.
+
+    notify() is called on the sampler thread and never blocks: webhook posts
+    are queued for a daemon thread, and a full queue drops the event.
+    """
+
+    def __init__(self, webhook=ALERT_WEBHOOK, rate=ALERT_RATE):
+        self.webhook = webhook
+        self.rate = rate / 60           # tokens per second
+        self.burst = max(1.0, rate)
+        self.tokens = self.burst
+        self.refilled = time.monotonic()
+        self.suppressed = 0
+        self.dropped = 0
+        self.queue = None
+        if webhook:
+            self.queue = queue.Queue(WEBHOOK_QUEUE)
+            threading.Thread(target=self._deliver, name='alert-webhook', daemon=True).start()
+
+    def notify(self, event):
+        state, alert = event
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.refilled) * self.rate)
+        self.refilled = now
+        if self.tokens < 1:
+            self.suppressed += 1
+            return
+        self.tokens -= 1
+        message = dict(alert.view(), event=state, host=HOSTNAME, rule_text=alert.rule.text,
+                       suppressed=self.suppressed)
+        self.suppressed = 0
+        item = f" [{alert.item}]" if alert.item is not None else ''
+        log.warning('alert %s: %s%s value=%s%s', state, alert.rule.name, item, alert.value,
+                    f" ({message['suppressed']} notifications suppressed)" if message['suppressed'] else '')
+        if self.queue is not None:
+            try:
+                self.queue.put_nowait(message)
+            except queue.Full:
+                self.dropped += 1
+
+    def _deliver(self):
+        import urllib.request   # only with a webhook configured
+        while True:
+            message = self.queue.get()
+            request = urllib.request.Request(
+                self.webhook, data=json.dumps(message).encode(),
+                headers={'Content-Type': 'application/json'}, method='POST')
+            try:
+                with urllib.request.urlopen(request, timeout=WEBHOOK_TIMEOUT) as response:
+                    response.read()
+            except Exception as exc:
+                log.error('alert webhook %s failed: %s', self.webhook, exc)
+
+
+def engine_from_config():
+    """AlertEngine for the configured rules, or None when there are none."""
+    rules = configured_rules()
+    if not rules:
+        return None
+    return AlertEngine(rules, Notifier())
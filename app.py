@@ -4,13 +4,60 @@ Server Monitoring Dashboard - Python/Flask
 kenalipaslon.online/mon2
 """
 
-from flask import Flask, render_template_string, jsonify
-import psutil
-import platform
+from flask import Flask, Response, abort, g, jsonify, render_template, request
+from jinja2 import FileSystemBytecodeCache
+import gzip
+import hashlib
+import math
+import os
+import sys
+import time
 import datetime
-import socket
+
+from collectors import get_uptime
+import compact
+import lazy
+import selfstats
+from procfs import host_facts
+from sampler import PROCESSES_TTL, Follower, get_sampler
+
+# Optional subsystems, imported by the first request that needs them.
+aggregator = lazy.module('aggregator')
+chart = lazy.module('chart')
+metrics = lazy.module('metrics')
+report = lazy.module('report')
+# Collector modules, for their column names and constants; the producer's
+# Sampler imports them anyway, a follower only once a page shows their data.
+disks = lazy.module('disks')
+network = lazy.module('network')
+processes = lazy.module('processes')
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
 
 app = Flask(__name__)
+# Compiled templates are cached on disk (per user, in the temp dir), so a restarted
+# worker loads bytecode instead of compiling index.html again.
+app.jinja_options = dict(app.jinja_options, bytecode_cache=FileSystemBytecodeCache())
+# Static assets are addressed by content hash, so browsers may cache them for a year.
+app.config['SEND_FILE_MAX_AGE_DEFAULT'] = 365 * 24 * 3600
+
+def asset_version(filename):
+    """Short content hash of a static file, used to bust caches when it changes"""
+    with open(os.path.join(app.static_folder, filename), 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()[:10]
+
+STATIC_VERSIONS = {name: asset_version(name) for name in ('dashboard.css', 'dashboard.js', 'fleet.js')}
+
+def static_url(filename):
+    # Relative on purpose: the dashboard is served behind an Nginx prefix (/mon2/).
+    return f"static/{filename}?v={STATIC_VERSIONS[filename]}"
+
+app.jinja_env.globals['static_url'] = static_url
+# Compiled once at import; per request only the HTML fragment is rendered.
+dashboard_template = app.jinja_env.get_template('index.html')
 
 def get_size(bytes_value):
     """Convert bytes to human readable format"""
@@ -28,561 +75,592 @@ def get_status_color(percent):
         return '#f59e0b'
     return '#ef4444'
 
-def get_uptime():
-    """Get system uptime"""
-    boot_time = datetime.datetime.fromtimestamp(psutil.boot_time())
-    now = datetime.datetime.now()
-    delta = now - boot_time
-    days = delta.days
-    hours, remainder = divmod(delta.seconds, 3600)
-    minutes, _ = divmod(remainder, 60)
-    return f"{days}d {hours}h {minutes}m"
-
-def to_mhz(value):
-    """Normalize frequency to MHz. psutil may return GHz (< 100) or MHz (>= 100)."""
-    if value < 100:
-        return round(value * 1000, 0)
-    return round(value, 0)
-
-def get_cpu_freq_mhz():
-    """Read per-core MHz from /proc/cpuinfo for accuracy."""
-    freqs = []
-    try:
-        with open('/proc/cpuinfo', 'r') as f:
-            for line in f:
-                if line.startswith('cpu MHz'):
-                    mhz = float(line.split(':')[1].strip())
-                    freqs.append(round(mhz, 0))
-    except:
-        pass
-    return freqs
-
-@app.route('/api/realtime')
-def api_realtime():
-    """API endpoint for real-time data"""
-    cpu_percent_per_core = psutil.cpu_percent(percpu=True)
-    cpu_freq_current = psutil.cpu_freq()
-
-    # Read actual MHz from /proc/cpuinfo
-    core_mhz = get_cpu_freq_mhz()
-    freq_max = to_mhz(cpu_freq_current.max) if cpu_freq_current else 3700
-    freq_min = to_mhz(cpu_freq_current.min) if cpu_freq_current else 1200
+def firing_alerts(data):
+    alerts = data.get('alerts')
+    if not alerts or not alerts['firing']:
+        return []
+    return [alert for alert in alerts['alerts'] if alert['state'] == 'firing']
 
+def realtime_payload(snapshot):
+    """Build the /api/realtime document from a sampler snapshot"""
+    data = snapshot.data
+    sampled_at = datetime.datetime.fromtimestamp(snapshot.ts)
     core_clocks = []
-    for i, mhz in enumerate(core_mhz):
+    for i, mhz in enumerate(data['core_mhz']):
         core_clocks.append({
             'core': i,
             'current': mhz,
-            'min': freq_min,
-            'max': freq_max,
+            'min': data['cpu_freq_min'],
+            'max': data['cpu_freq_max'],
         })
 
-    avg_mhz = round(sum(core_mhz) / len(core_mhz), 0) if core_mhz else 0
-
-    memory = psutil.virtual_memory()
-    cpu_percent = psutil.cpu_percent()
+    return {
+        'timestamp': sampled_at.strftime('%H:%M:%S'),
+        'cpu_percent': data['cpu_percent'],
+        'cpu_percent_per_core': data['cpu_percent_per_core'],
+        'cpu_freq_avg': data['cpu_freq_avg'],
+        'cpu_freq_max': data['cpu_freq_max'],
+        'cpu_freq_min': data['cpu_freq_min'],
+        'core_clocks': core_clocks,
+        'mem_percent': data['mem_percent'],
+        'mem_used': get_size(data['mem_used']),
+        'mem_total': get_size(data['mem_total']),
+        'disk_percent': data['disk_percent'],
+        'disk_read_rate': data['disk_read_rate'],
+        'disk_write_rate': data['disk_write_rate'],
+        'disks': disks.as_rows(data['disks']),
+        'net_sent_rate': data['net_sent_rate'],
+        'net_recv_rate': data['net_recv_rate'],
+        'net': network.as_rows(data['net']),
+        'alerts': firing_alerts(data),
+        'server_time': sampled_at.strftime('%Y-%m-%d %H:%M:%S'),
+    }
+
+def realtime_json(snapshot):
+    return app.json.dumps(realtime_payload(snapshot)) + '\n'
+
+# Facts about this host that do not change while the process runs, gathered once at startup.
+HOST = host_facts()
+
+def current_host():
+    """HOST, or the recorded machine's facts while a recording is replayed."""
+    return get_sampler().host or HOST
+
+def fullest_mount(columns):
+    if not columns['mount']:
+        return '/'
+    return max(zip(columns['percent'], columns['mount']))[1]
+
+def summary_payload(snapshot):
+    """The few numbers the fleet overview needs from one host"""
+    data = snapshot.data
+    return {
+        'host': current_host()['hostname'],
+        'seq': snapshot.seq,
+        't': round(snapshot.ts, 3),
+        'interval': data.get('sample_interval'),
+        'cpu': data['cpu_percent'],
+        'cores': len(data['cpu_percent_per_core']),
+        'load1': data['load_avg'][0],
+        'mem': data['mem_percent'],
+        'mem_used': data['mem_used'],
+        'mem_total': data['mem_total'],
+        'swap': data['swap_percent'],
+        'disk': max(data['disks']['percent'], default=data['disk_percent']),
+        'disk_mount': fullest_mount(data['disks']),
+        'disk_read_rate': data['disk_read_rate'],
+        'disk_write_rate': data['disk_write_rate'],
+        'net_sent_rate': data['net_sent_rate'],
+        'net_recv_rate': data['net_recv_rate'],
+        'connections': data['connections'],
+        'processes': data['process_count'],
+        'alerts': data['alerts']['firing'] if data.get('alerts') else 0,
+        'boot_time': data['boot_time'],
+    }
+
+def summary_json(snapshot):
+    return app.json.dumps(summary_payload(snapshot)) + '\n'
+
+# Bodies smaller than this are not worth the CPU of compressing.
+COMPRESS_MIN_BYTES = 512
+
+def pick_encoding():
+    accepted = request.accept_encodings
+    if brotli is not None and accepted['br']:
+        return 'br'
+    if accepted['gzip']:
+        return 'gzip'
+    return None
+
+def compress(body, encoding):
+    if isinstance(body, str):
+        body = body.encode()
+    if encoding == 'br':
+        return brotli.compress(body, quality=5)
+    return gzip.compress(body, 6)
+
+def snapshot_response(snapshot, key, build, content_type='application/json'):
+    """Serialize once per snapshot, and compress once per snapshot and encoding"""
+    body = snapshot.derive(key, build)
+    encoding = pick_encoding() if len(body) >= COMPRESS_MIN_BYTES else None
+    if encoding:
+        body = snapshot.derive(f"{key}.{encoding}", lambda s: compress(s.derive(key, build), encoding))
+    response = Response(body, content_type=content_type)
+    response.headers['Vary'] = 'Accept, Accept-Encoding'
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    return response
+
+@app.before_request
+def start_timer():
+    g.started = time.perf_counter()
+
+@app.after_request
+def record_timing(response):
+    """Time to build the response per route; for streams, until the first byte is ready"""
+    started = g.pop('started', None)
+    if started is not None:
+        rule = request.url_rule.rule if request.url_rule is not None else '(unmatched)'
+        selfstats.routes.record(rule, time.perf_counter() - started)
+    return response
+
+@app.after_request
+def compress_json(response):
+    """gzip/brotli for the other JSON endpoints (history, stats)"""
+    if (response.status_code != 200 or response.is_streamed or response.direct_passthrough
+            or response.mimetype != 'application/json' or 'Content-Encoding' in response.headers):
+        return response
+    body = response.get_data()
+    encoding = pick_encoding() if len(body) >= COMPRESS_MIN_BYTES else None
+    if encoding:
+        response.set_data(compress(body, encoding))
+        response.headers['Content-Encoding'] = encoding
+        response.vary.add('Accept-Encoding')
+    return response
+
+def watched_source():
+    """The snapshot source, noting that someone is looking (an idle sampler speeds back up).
+
+    Dashboard and API views go through here; /metrics, history and stats do not,
+    so a Prometheus scrape alone lets the sampler idle.
+    """
+    source = get_sampler()
+    source.touch()
+    return source
+
+def wants_compact():
+    return (request.args.get('format') == 'compact'
+            or request.accept_mimetypes.best == compact.MEDIA_TYPE)
+
+def compact_json(snapshot, base=None):
+    return app.json.dumps(compact.compact_payload(snapshot, base)) + '\n'
 
+@app.route('/api/realtime')
+def api_realtime():
+    """API endpoint for real-time data, served from the latest sampler snapshot.
+
+    ?format=compact (or Accept: application/vnd.monitor.compact+json) selects the
+    packed representation; add &since=<seq> to receive only per-core changes.
+    """
+    sampler = watched_source()
+    snapshot = sampler.latest()
+    if snapshot is None:
+        return Response('{"error": "sampler not ready"}\n', status=503, mimetype='application/json')
+    if not wants_compact():
+        return snapshot_response(snapshot, 'realtime.json', realtime_json)
+
+    since = request.args.get('since', type=int)
+    base = sampler.get(since) if since else None
+    if base is None:
+        return snapshot_response(snapshot, 'compact.full', compact_json, compact.MEDIA_TYPE)
+    return snapshot_response(snapshot, f"compact.since.{base.seq}",
+                             lambda s: compact_json(s, base), compact.MEDIA_TYPE)
+
+@app.route('/api/summary')
+def api_summary():
+    """Small per-host summary polled by the fleet aggregator"""
+    # Not a watcher: fleet polling alone lets the host idle; "interval" tells the aggregator.
+    snapshot = get_sampler().latest()
+    if snapshot is None:
+        return Response('{"error": "sampler not ready"}\n', status=503, mimetype='application/json')
+    return snapshot_response(snapshot, 'summary.json', summary_json)
+
+def processes_json(snapshot, sort, limit):
+    scan = snapshot.data['processes']
+    mem_total = snapshot.data['mem_total']
+    top = [dict(p, mem=round(p['rss'] / mem_total * 100, 1)) for p in scan['top'][sort][:limit]]
+    return app.json.dumps({
+        'sort': sort,
+        'ts': scan['ts'],
+        'count': scan['count'],
+        'states': scan['states'],
+        'scan_ms': scan['scan_ms'],
+        'scan_cpu_ms': scan['scan_cpu_ms'],
+        'processes': top,
+    }) + '\n'
+
+@app.route('/api/processes')
+def api_processes():
+    """Top processes from the sampler's last /proc scan: ?sort=cpu|mem&limit=20"""
+    snapshot = watched_source().latest()
+    if snapshot is None:
+        return Response('{"error": "sampler not ready"}\n', status=503, mimetype='application/json')
+    sort = request.args.get('sort', 'cpu')
+    if sort not in processes.SORT_KEYS:
+        return jsonify({'error': 'sort must be one of ' + ', '.join(processes.SORT_KEYS)}), 400
+    limit = min(max(request.args.get('limit', 20, type=int), 1), processes.PROCESS_TOP)
+    return snapshot_response(snapshot, f"processes.{sort}.{limit}",
+                             lambda s: processes_json(s, sort, limit))
+
+def alerts_json(snapshot):
+    return app.json.dumps(dict(snapshot.data['alerts'], ts=round(snapshot.ts, 3))) + '\n'
+
+@app.route('/api/alerts')
+def api_alerts():
+    """Pending and firing alerts as of the latest snapshot, and what evaluating the rules cost"""
+    snapshot = watched_source().latest()
+    if snapshot is None:
+        return Response('{"error": "sampler not ready"}\n', status=503, mimetype='application/json')
+    if snapshot.data.get('alerts') is None:
+        return Response('{"error": "no alert rules configured"}\n', status=503, mimetype='application/json')
+    return snapshot_response(snapshot, 'alerts.json', alerts_json)
+
+@app.route('/api/self')
+def api_self():
+    """The monitor's own cost: route timings and RSS/CPU of this worker, collector timings of the sampler"""
+    if not selfstats.SELF_STATS:
+        return Response('{"error": "self stats disabled"}\n', status=503, mimetype='application/json')
+    source = get_sampler()
+    follower = isinstance(source, Follower)
+    if follower:
+        # Collectors run in the producer; its figures come with the snapshots, up to 10 s old.
+        snapshot = source.latest(timeout=0)
+        sampler = snapshot.data.get('self') if snapshot is not None else None
+    else:
+        sampler = selfstats.producer_view()
+    profiler = selfstats.last_profile()
     return jsonify({
-        'timestamp': datetime.datetime.now().strftime('%H:%M:%S'),
-        'cpu_percent': cpu_percent,
-        'cpu_percent_per_core': cpu_percent_per_core,
-        'cpu_freq_avg': avg_mhz,
-        'cpu_freq_max': freq_max,
-        'cpu_freq_min': freq_min,
-        'core_clocks': core_clocks,
-        'mem_percent': memory.percent,
-        'mem_used': get_size(memory.used),
-        'mem_total': get_size(memory.total),
-        'server_time': datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'role': 'follower' if follower else 'sampler',
+        'process': selfstats.process_stats(),
+        'routes': selfstats.routes.summary(),
+        'sampler': sampler,
+        'sample_interval': source.tick,
+        'profile': profiler.view() if profiler is not None else None,
     })
 
+@app.route('/api/self/profile', methods=['POST'])
+def api_self_profile():
+    """Run the sampling profiler in every worker for ?seconds=30; profiles land in MONITOR_PROFILE_DIR"""
+    if not selfstats.PROFILE_DIR:
+        return Response('{"error": "profiler disabled, set MONITOR_PROFILE_DIR"}\n', status=503, mimetype='application/json')
+    seconds = request.args.get('seconds', 30, type=float)
+    if not math.isfinite(seconds):
+        return jsonify({'error': 'seconds must be a finite number'}), 400
+    seconds = min(max(seconds, 1), selfstats.PROFILE_MAX_SECONDS)
+    profiler = watched_source().request_profile(seconds)
+    return jsonify({'seconds': seconds, 'directory': os.path.abspath(selfstats.PROFILE_DIR),
+                    'profile': profiler.view() if profiler is not None else None}), 202
+
+@app.route('/metrics')
+def prometheus_metrics():
+    """Prometheus exposition of the latest snapshot, rendered once per snapshot"""
+    snapshot = get_sampler().latest()
+    if snapshot is None:
+        return Response('# sampler not ready\n', status=503, mimetype='text/plain')
+    return snapshot_response(snapshot, 'metrics', metrics.render_metrics, metrics.CONTENT_TYPE)
+
+def query_arg(name, default=None):
+    """Float query parameter; values <= 0 for from/to are seconds relative to now. ValueError if not finite."""
+    raw = request.args.get(name)
+    if raw in (None, ''):
+        return default
+    value = float(raw)
+    if not math.isfinite(value):
+        raise ValueError(f"{name} must be finite")
+    if name in ('from', 'to') and value <= 0:
+        value += time.time()
+    return value
+
+@app.route('/api/history')
+def api_history():
+    """Range query over the on-disk history: ?metric=&from=&to=&step="""
+    history = get_sampler().history
+    if history is None:
+        return Response('{"error": "history disabled"}\n', status=503, mimetype='application/json')
+    metric = request.args.get('metric', 'cpu_percent')
+    try:
+        end = query_arg('to', time.time())
+        start = query_arg('from', end - 3600)
+        step = query_arg('step')
+    except ValueError:
+        return jsonify({'error': 'from, to and step must be finite numbers'}), 400
+    try:
+        result = history.query(metric, int(start), int(end), int(step) if step else None)
+    except KeyError:
+        return jsonify({'error': f'unknown metric {metric!r}'}), 404
+    result.update({'metric': metric, 'from': int(start), 'to': int(end)})
+    return jsonify(result)
+
+@app.route('/api/chart')
+def api_chart():
+    """Chart-ready series: ?metric=&from=&to=&points=300&mode=auto|all|bands|topk&k=4&step="""
+    source = get_sampler()
+    if source.memory is None and source.history is None:
+        return Response('{"error": "history disabled"}\n', status=503, mimetype='application/json')
+    metric = request.args.get('metric', 'core_mhz')
+    mode = request.args.get('mode', 'auto')
+    if mode not in chart.MODES:
+        return jsonify({'error': 'mode must be one of ' + ', '.join(chart.MODES)}), 400
+    try:
+        end = query_arg('to', time.time())
+        start = query_arg('from', end - 120)
+        step = query_arg('step')
+        points = min(max(int(request.args.get('points', 300)), 3), chart.MAX_POINTS)
+        k = min(max(int(request.args.get('k', 4)), 1), 64)
+    except ValueError:
+        return jsonify({'error': 'from, to, step, points and k must be finite numbers'}), 400
+    try:
+        result = chart.chart(metric, start, end, source.memory, source.history,
+                             int(step) if step else None, mode=mode, k=k, points=points)
+    except KeyError:
+        return jsonify({'error': f'unknown metric {metric!r}'}), 404
+    except ImportError:
+        return Response('{"error": "numpy missing"}\n', status=503, mimetype='application/json')
+    if result is None:
+        return Response('{"error": "history disabled"}\n', status=503, mimetype='application/json')
+    result.update({'metric': metric, 'from': round(start, 3), 'to': round(end, 3)})
+    return jsonify(result)
+
+@app.route('/api/report')
+def api_report():
+    """Percentiles, max and time above per metric, two windows: ?from=&to=&compare=&metrics=&above=metric:value"""
+    history = get_sampler().history
+    if history is None:
+        return Response('{"error": "history disabled"}\n', status=503, mimetype='application/json')
+    try:
+        end = query_arg('to', time.time())
+        start = query_arg('from', end - 7 * 86400)
+        shift = query_arg('compare')
+        thresholds = report.parse_thresholds(request.args.get('above', ''))
+    except ValueError:
+        return jsonify({'error': 'from, to and compare must be finite numbers, above metric:value pairs'}), 400
+    if start >= end:
+        return jsonify({'error': 'from must be before to'}), 400
+    names = [m for m in request.args.get('metrics', '').split(',') if m] or report.METRICS
+    try:
+        result = report.report(history.sketches, start, end, shift, names, thresholds)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except KeyError as e:
+        return jsonify({'error': f'no report for metric {e.args[0]!r}'}), 404
+    except ImportError:
+        return Response('{"error": "numpy missing"}\n', status=503, mimetype='application/json')
+    return jsonify(result)
+
+@app.route('/api/stats')
+def api_stats():
+    """Aggregates over the in-memory window: ?metric=&window=&agg=min,max,avg,p95&per_core=1"""
+    memory = get_sampler().memory
+    if memory is None:
+        return Response('{"error": "in-memory history disabled (numpy missing)"}\n', status=503, mimetype='application/json')
+    metric = request.args.get('metric', 'cpu_percent')
+    buffer = memory.get(metric)
+    if buffer is None:
+        return jsonify({'error': f'unknown metric {metric!r}'}), 404
+    aggregates = tuple(a for a in request.args.get('agg', 'min,max,avg,p95').split(',') if a)
+    per_core = request.args.get('per_core', '1') != '0'
+    try:
+        window = float(request.args.get('window', 300))
+        if not (math.isfinite(window) and window > 0):
+            raise ValueError(window)
+        end = time.time()
+        stats = buffer.aggregate(int((end - window) * 1000), int(end * 1000), aggregates, per_core)
+    except (KeyError, ValueError):
+        return jsonify({'error': 'window must be a positive number and agg one of min,max,avg,p95'}), 400
+    stats.update({'metric': metric, 'window': window, 'per_core': per_core})
+    return jsonify(stats)
+
+# A stream is closed after this many seconds; EventSource reconnects on its own.
+STREAM_MAX_AGE = float(os.environ.get('MONITOR_STREAM_MAX_AGE', '300'))
+STREAM_KEEPALIVE = 15
+
+def streaming_enabled():
+    """Push streams need an evented server; sync workers would be pinned per viewer"""
+    setting = os.environ.get('MONITOR_STREAM', 'auto')
+    if setting != 'auto':
+        return setting == '1'
+    monkey = sys.modules.get('gevent.monkey')
+    return monkey is not None and monkey.is_module_patched('socket')
+
+def realtime_event(snapshot):
+    return f"id: {snapshot.seq}\ndata: {realtime_json(snapshot).rstrip()}\n\n"
+
+def compact_event(snapshot, base):
+    return f"id: {snapshot.seq}\ndata: {compact_json(snapshot, base).rstrip()}\n\n"
+
+@app.route('/api/stream')
+def api_stream():
+    """Server-Sent Events stream of sampler snapshots at the client's chosen interval"""
+    if not streaming_enabled():
+        return Response('{"error": "streaming disabled"}\n', status=503, mimetype='application/json')
+    sampler = watched_source()
+    try:
+        interval = float(request.args.get('interval', sampler.interval))
+    except ValueError:
+        interval = sampler.interval
+    interval = min(max(interval, sampler.interval), 60)
+    packed = wants_compact()
+
+    def generate():
+        deadline = time.monotonic() + STREAM_MAX_AGE
+        last_seq, last_ts, last_sent = 0, 0, None
+        yield 'retry: 3000\n\n'
+        while time.monotonic() < deadline:
+            # Looked up every time: a follower worker may have been promoted to producer.
+            # An open stream also counts as someone looking, so the sampler stays at full rate.
+            source = watched_source()
+            snapshot = source.wait_next(last_seq, STREAM_KEEPALIVE)
+            if snapshot is None:
+                yield ': keepalive\n\n'
+                continue
+            last_seq = snapshot.seq
+            # Half a tick of slack so interval == sampler tick never skips a beat.
+            if snapshot.ts - last_ts < interval - source.interval / 2:
+                continue
+            last_ts = snapshot.ts
+            if packed:
+                # Deltas against the previous frame; subscribers at the same rate share the encoding.
+                base = last_sent
+                key = f"compact.sse.{base.seq if base else 0}"
+                yield snapshot.derive(key, lambda s: compact_event(s, base))
+                last_sent = snapshot
+            else:
+                yield snapshot.derive('realtime.sse', realtime_event)
+
+    response = Response(generate(), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+def require_fleet():
+    fleet = aggregator.get_fleet()
+    if fleet is None:
+        abort(404)
+    return fleet
+
+def fleet_view(fleet):
+    limit = min(max(request.args.get('limit', 10, type=int), 1), 100)
+    return fleet.view(request.args.get('sort', 'cpu'), limit)
+
+@app.route('/api/fleet')
+def api_fleet():
+    """Cluster view from the aggregator: ?sort=cpu|mem|disk|load|name&limit=10 (top-N size)"""
+    return jsonify(fleet_view(require_fleet()))
+
+@app.route('/fleet')
+def fleet_overview():
+    fleet = require_fleet()
+    view = fleet_view(fleet)
+    return render_template('fleet.html', view=view, get_size=get_size, get_status_color=get_status_color,
+                           js_config={'interval': fleet.interval})
+
+# Request headers passed to an agent, and response headers passed back.
+PROXY_REQUEST_HEADERS = ('Accept', 'Accept-Encoding', 'If-None-Match')
+PROXY_RESPONSE_HEADERS = ('content-type', 'content-encoding', 'cache-control', 'etag',
+                          'last-modified', 'vary', 'x-sample-age')
+
+@app.route('/fleet/host/<name>/', defaults={'path': ''})
+@app.route('/fleet/host/<name>/<path:path>')
+def fleet_host(name, path):
+    """Drill-down: the agent's own dashboard and API, proxied over the pooled connections"""
+    fleet = require_fleet()
+    if name not in fleet.agents:
+        abort(404)
+    if path == 'api/stream':
+        # Long-lived streams are not proxied; the dashboard falls back to polling.
+        return Response('{"error": "streaming not proxied"}\n', status=503, mimetype='application/json')
+    target = '/' + path
+    if request.query_string:
+        target += '?' + request.query_string.decode('latin-1')
+    headers = [(h, request.headers[h]) for h in PROXY_REQUEST_HEADERS if h in request.headers]
+    try:
+        status, agent_headers, body = fleet.fetch(name, target, headers)
+    except TimeoutError:
+        return jsonify({'error': f'agent {name} timed out'}), 504
+    except (OSError, aggregator.AgentError) as exc:
+        return jsonify({'error': f'agent {name} unreachable: {exc}'}), 502
+    response = Response(body, status=status)
+    for header in PROXY_RESPONSE_HEADERS:
+        if header in agent_headers:
+            response.headers[header] = agent_headers[header]
+    return response
+
+# Rows in the dashboard's Top Processes table
+TOP_PROCESSES_SHOWN = 10
+
 @app.route('/')
 def monitor():
-    # CPU Info
-    cpu_percent = psutil.cpu_percent(interval=1)
-    cpu_count = psutil.cpu_count()
-    cpu_freq = psutil.cpu_freq()
-    load_avg = psutil.getloadavg()
+    source = watched_source()
+    snapshot = source.latest()
+    if snapshot is None:
+        return Response('Sampler not ready, retry in a moment.\n', status=503, mimetype='text/plain')
+    data = snapshot.data
+
+    # CPU Info (delta since the previous sampler tick, no blocking measurement)
+    cpu_percent = data['cpu_percent']
+    host = source.host or HOST
+    cpu_count = host['cpu_count']
+    load_avg = data['load_avg']
     load_str = f"{load_avg[0]:.2f} / {load_avg[1]:.2f} / {load_avg[2]:.2f}"
 
-    # Read actual MHz
-    core_mhz = get_cpu_freq_mhz()
+    # Actual MHz from the same sample
+    core_mhz = data['core_mhz']
     avg_mhz = round(sum(core_mhz) / len(core_mhz)) if core_mhz else 0
-    freq_max = int(to_mhz(cpu_freq.max)) if cpu_freq else 3700
-    freq_min = int(to_mhz(cpu_freq.min)) if cpu_freq else 1200
-
-    # Memory Info
-    memory = psutil.virtual_memory()
-    swap = psutil.swap_memory()
-
-    # Disk Info
-    disk = psutil.disk_usage('/')
+    freq_max = int(data['cpu_freq_max'])
+    freq_min = int(data['cpu_freq_min'])
+    core_chart = chart.auto_mode(cpu_count)
 
     # Network Info
-    net_io = psutil.net_io_counters()
-    connections = len(psutil.net_connections())
+    connections = data['connections']
 
     # System Info
-    uptime = get_uptime()
-    hostname = socket.gethostname()
+    uptime = get_uptime(data['boot_time'])
     server_time = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    os_info = f"{platform.system()} {platform.release()}"
-    python_version = platform.python_version()
 
     # Process Info
-    process_count = len(psutil.pids())
+    process_count = data['process_count']
 
-    # CPU model name
-    cpu_model = "Unknown"
-    try:
-        with open('/proc/cpuinfo', 'r') as f:
-            for line in f:
-                if 'model name' in line:
-                    cpu_model = line.split(':')[1].strip()
-                    break
-    except:
-        pass
-
-    html_template = '''
-<!DOCTYPE html>
-<html lang="id">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>Server Monitor (Python) - kenalipaslon.online</title>
-    <script src="https://cdn.jsdelivr.net/npm/chart.js@4.4.0/dist/chart.umd.min.js"></script>
-    <style>
-        * { margin: 0; padding: 0; box-sizing: border-box; }
-        body {
-            font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, sans-serif;
-            background: linear-gradient(135deg, #0f172a 0%, #1e1b4b 100%);
-            min-height: 100vh;
-            color: #fff;
-            padding: 20px;
-        }
-        .container { max-width: 1200px; margin: 0 auto; }
-        .header { text-align: center; margin-bottom: 30px; padding: 20px; }
-        .header h1 {
-            font-size: 2rem;
-            margin-bottom: 10px;
-            background: linear-gradient(90deg, #a78bfa, #60a5fa);
-            -webkit-background-clip: text;
-            -webkit-text-fill-color: transparent;
-            background-clip: text;
-        }
-        .header .subtitle { color: #94a3b8; font-size: 0.9rem; }
-        .header .badge-container { margin-top: 15px; display: flex; justify-content: center; gap: 10px; flex-wrap: wrap; }
-        .badge { display: inline-block; padding: 5px 15px; border-radius: 20px; font-size: 0.75rem; font-weight: 600; }
-        .badge-online { background: #22c55e; color: white; animation: pulse 2s infinite; }
-        .badge-python { background: #3b82f6; color: white; }
-        .badge-live { background: #ef4444; color: white; animation: pulse 1.5s infinite; font-size: 0.7rem; }
-        @keyframes pulse { 0%, 100% { opacity: 1; } 50% { opacity: 0.7; } }
-        .grid { display: grid; grid-template-columns: repeat(auto-fit, minmax(280px, 1fr)); gap: 20px; margin-bottom: 20px; }
-        .card {
-            background: rgba(255, 255, 255, 0.03);
-            border-radius: 16px;
-            padding: 25px;
-            border: 1px solid rgba(255, 255, 255, 0.08);
-            backdrop-filter: blur(10px);
-            transition: all 0.3s ease;
-        }
-        .card:hover { transform: translateY(-5px); box-shadow: 0 20px 40px rgba(0, 0, 0, 0.3); border-color: rgba(167, 139, 250, 0.3); }
-        .card-title { font-size: 0.8rem; color: #94a3b8; text-transform: uppercase; letter-spacing: 1.5px; margin-bottom: 15px; display: flex; align-items: center; gap: 10px; }
-        .card-value { font-size: 2.5rem; font-weight: 700; margin-bottom: 8px; letter-spacing: -1px; }
-        .card-detail { font-size: 0.85rem; color: #64748b; }
-        .card-sub { font-size: 0.75rem; color: #475569; margin-top: 5px; }
-        .progress-bar { background: rgba(255, 255, 255, 0.08); border-radius: 10px; height: 8px; margin-top: 15px; overflow: hidden; }
-        .progress-fill { height: 100%; border-radius: 10px; transition: width 0.5s ease; }
-        .info-grid { display: grid; grid-template-columns: repeat(auto-fit, minmax(180px, 1fr)); gap: 12px; }
-        .info-item { background: rgba(255, 255, 255, 0.02); padding: 15px; border-radius: 12px; border: 1px solid rgba(255, 255, 255, 0.05); }
-        .info-label { font-size: 0.7rem; color: #64748b; text-transform: uppercase; letter-spacing: 1px; margin-bottom: 5px; }
-        .info-value { font-size: 0.9rem; color: #e2e8f0; word-break: break-all; }
-        .footer { text-align: center; margin-top: 30px; padding: 20px; color: #475569; font-size: 0.8rem; }
-        .icon { width: 18px; height: 18px; opacity: 0.8; }
-        .dual-stat { display: flex; gap: 20px; margin-top: 10px; }
-        .dual-stat-item { flex: 1; }
-        .dual-stat-label { font-size: 0.7rem; color: #64748b; }
-        .dual-stat-value { font-size: 0.9rem; color: #94a3b8; }
-        .card-full { grid-column: 1 / -1; }
-        .chart-container { position: relative; height: 300px; margin-top: 10px; }
-        .core-grid { display: grid; grid-template-columns: repeat(auto-fit, minmax(120px, 1fr)); gap: 10px; margin-top: 15px; }
-        .core-item {
-            background: rgba(255, 255, 255, 0.04);
-            border-radius: 10px;
-            padding: 12px;
-            text-align: center;
-            border: 1px solid rgba(255, 255, 255, 0.06);
-            transition: all 0.3s ease;
-        }
-        .core-item:hover { border-color: rgba(96, 165, 250, 0.4); }
-        .core-label { font-size: 0.65rem; color: #64748b; text-transform: uppercase; letter-spacing: 1px; margin-bottom: 4px; }
-        .core-clock { font-size: 1.2rem; font-weight: 700; color: #60a5fa; }
-        .core-clock-unit { font-size: 0.65rem; color: #475569; }
-        .core-bar { background: rgba(255, 255, 255, 0.06); border-radius: 4px; height: 4px; margin-top: 8px; overflow: hidden; }
-        .core-bar-fill { height: 100%; border-radius: 4px; background: linear-gradient(90deg, #60a5fa, #a78bfa); transition: width 0.5s ease; }
-        .clock-summary { display: flex; gap: 20px; flex-wrap: wrap; margin-bottom: 15px; }
-        .clock-summary-item { flex: 1; min-width: 100px; text-align: center; padding: 10px; background: rgba(255,255,255,0.03); border-radius: 10px; }
-        .clock-summary-label { font-size: 0.65rem; color: #64748b; text-transform: uppercase; letter-spacing: 1px; }
-        .clock-summary-value { font-size: 1.4rem; font-weight: 700; margin-top: 4px; }
-        .live-dot { width: 8px; height: 8px; background: #ef4444; border-radius: 50%; display: inline-block; animation: pulse 1s infinite; margin-right: 5px; }
-    </style>
-</head>
-<body>
-    <div class="container">
-        <div class="header">
-            <h1>Server Monitor</h1>
-            <div class="subtitle">kenalipaslon.online/mon2</div>
-            <div class="badge-container">
-                <span class="badge badge-online">ONLINE</span>
-                <span class="badge badge-python">Python {{ python_version }}</span>
-                <span class="badge badge-live"><span class="live-dot"></span>LIVE</span>
-            </div>
-        </div>
-
-        <div class="grid">
-            <div class="card">
-                <div class="card-title">
-                    <svg class="icon" fill="none" stroke="currentColor" viewBox="0 0 24 24"><path stroke-linecap="round" stroke-linejoin="round" stroke-width="2" d="M9 3v2m6-2v2M9 19v2m6-2v2M5 9H3m2 6H3m18-6h-2m2 6h-2M7 19h10a2 2 0 002-2V7a2 2 0 00-2-2H7a2 2 0 00-2 2v10a2 2 0 002 2zM9 9h6v6H9V9z"/></svg>
-                    CPU Usage
-                </div>
-                <div class="card-value" id="cpu-percent" style="color: {{ cpu_color }}">{{ cpu_percent }}%</div>
-                <div class="card-detail" id="cpu-detail">{{ cpu_count }} cores @ {{ avg_mhz }} MHz</div>
-                <div class="card-sub">Load: {{ load_str }}</div>
-                <div class="progress-bar"><div class="progress-fill" id="cpu-bar" style="width: {{ cpu_percent }}%; background: {{ cpu_color }}"></div></div>
-            </div>
-
-            <div class="card">
-                <div class="card-title">
-                    <svg class="icon" fill="none" stroke="currentColor" viewBox="0 0 24 24"><path stroke-linecap="round" stroke-linejoin="round" stroke-width="2" d="M19 11H5m14 0a2 2 0 012 2v6a2 2 0 01-2 2H5a2 2 0 01-2-2v-6a2 2 0 012-2m14 0V9a2 2 0 00-2-2M5 11V9a2 2 0 012-2m0 0V5a2 2 0 012-2h6a2 2 0 012 2v2M7 7h10"/></svg>
-                    Memory Usage
-                </div>
-                <div class="card-value" id="mem-percent" style="color: {{ mem_color }}">{{ mem_percent }}%</div>
-                <div class="card-detail" id="mem-detail">{{ mem_used }} / {{ mem_total }}</div>
-                <div class="card-sub">Available: {{ mem_available }}</div>
-                <div class="progress-bar"><div class="progress-fill" id="mem-bar" style="width: {{ mem_percent }}%; background: {{ mem_color }}"></div></div>
-            </div>
-
-            <div class="card">
-                <div class="card-title">
-                    <svg class="icon" fill="none" stroke="currentColor" viewBox="0 0 24 24"><path stroke-linecap="round" stroke-linejoin="round" stroke-width="2" d="M4 7v10c0 2.21 3.582 4 8 4s8-1.79 8-4V7M4 7c0 2.21 3.582 4 8 4s8-1.79 8-4M4 7c0-2.21 3.582-4 8-4s8 1.79 8 4"/></svg>
-                    Disk Usage
-                </div>
-                <div class="card-value" style="color: {{ disk_color }}">{{ disk_percent }}%</div>
-                <div class="card-detail">{{ disk_used }} / {{ disk_total }}</div>
-                <div class="card-sub">Free: {{ disk_free }}</div>
-                <div class="progress-bar"><div class="progress-fill" style="width: {{ disk_percent }}%; background: {{ disk_color }}"></div></div>
-            </div>
-
-            <div class="card">
-                <div class="card-title">
-                    <svg class="icon" fill="none" stroke="currentColor" viewBox="0 0 24 24"><path stroke-linecap="round" stroke-linejoin="round" stroke-width="2" d="M12 8v4l3 3m6-3a9 9 0 11-18 0 9 9 0 0118 0z"/></svg>
-                    Uptime
-                </div>
-                <div class="card-value" style="color: #a78bfa">{{ uptime }}</div>
-                <div class="card-detail">Since last restart</div>
-                <div class="card-sub">{{ process_count }} processes running</div>
-            </div>
-        </div>
-
-        <!-- CPU Clock Per Core Card -->
-        <div class="grid">
-            <div class="card card-full">
-                <div class="card-title">
-                    <svg class="icon" fill="none" stroke="currentColor" viewBox="0 0 24 24"><path stroke-linecap="round" stroke-linejoin="round" stroke-width="2" d="M13 10V3L4 14h7v7l9-11h-7z"/></svg>
-                    CPU Clock Speed <span class="badge badge-live" style="margin-left:8px;font-size:0.6rem;padding:2px 8px;"><span class="live-dot"></span>REAL-TIME</span>
-                </div>
-                <div class="card-sub" style="margin-bottom:10px;">{{ cpu_model }}</div>
-                <div class="clock-summary">
-                    <div class="clock-summary-item">
-                        <div class="clock-summary-label">Current Avg</div>
-                        <div class="clock-summary-value" id="clock-avg" style="color:#60a5fa;">{{ avg_mhz }} MHz</div>
-                    </div>
-                    <div class="clock-summary-item">
-                        <div class="clock-summary-label">Base Clock</div>
-                        <div class="clock-summary-value" style="color:#22c55e;">2700 MHz</div>
-                    </div>
-                    <div class="clock-summary-item">
-                        <div class="clock-summary-label">Max Turbo</div>
-                        <div class="clock-summary-value" style="color:#f59e0b;">{{ freq_max }} MHz</div>
-                    </div>
-                    <div class="clock-summary-item">
-                        <div class="clock-summary-label">Min Clock</div>
-                        <div class="clock-summary-value" style="color:#94a3b8;">{{ freq_min }} MHz</div>
-                    </div>
-                </div>
-                <div class="core-grid" id="core-grid">
-                </div>
-            </div>
-        </div>
-
-        <!-- Real-time Clock Chart -->
-        <div class="grid">
-            <div class="card card-full">
-                <div class="card-title">
-                    <svg class="icon" fill="none" stroke="currentColor" viewBox="0 0 24 24"><path stroke-linecap="round" stroke-linejoin="round" stroke-width="2" d="M9 19v-6a2 2 0 00-2-2H5a2 2 0 00-2 2v6a2 2 0 002 2h2a2 2 0 002-2zm0 0V9a2 2 0 012-2h2a2 2 0 012 2v10m-6 0a2 2 0 002 2h2a2 2 0 002-2m0 0V5a2 2 0 012-2h2a2 2 0 012 2v14a2 2 0 01-2 2h-2a2 2 0 01-2-2z"/></svg>
-                    CPU Clock History <span class="badge badge-live" style="margin-left:8px;font-size:0.6rem;padding:2px 8px;"><span class="live-dot"></span>LIVE</span>
-                </div>
-                <div class="card-sub">Clock speed per core (MHz) - Updated every 2 seconds</div>
-                <div class="chart-container">
-                    <canvas id="clockChart"></canvas>
-                </div>
-            </div>
-        </div>
-
-        <!-- CPU & Memory Usage Chart -->
-        <div class="grid">
-            <div class="card card-full">
-                <div class="card-title">
-                    <svg class="icon" fill="none" stroke="currentColor" viewBox="0 0 24 24"><path stroke-linecap="round" stroke-linejoin="round" stroke-width="2" d="M16 8v8m-4-5v5m-4-2v2m-2 4h12a2 2 0 002-2V6a2 2 0 00-2-2H6a2 2 0 00-2 2v12a2 2 0 002 2z"/></svg>
-                    CPU & Memory Usage History <span class="badge badge-live" style="margin-left:8px;font-size:0.6rem;padding:2px 8px;"><span class="live-dot"></span>LIVE</span>
-                </div>
-                <div class="card-sub">Usage percentage - Updated every 2 seconds</div>
-                <div class="chart-container">
-                    <canvas id="usageChart"></canvas>
-                </div>
-            </div>
-        </div>
-
-        <div class="grid">
-            <div class="card">
-                <div class="card-title">
-                    <svg class="icon" fill="none" stroke="currentColor" viewBox="0 0 24 24"><path stroke-linecap="round" stroke-linejoin="round" stroke-width="2" d="M8 9l3 3-3 3m5 0h3M5 20h14a2 2 0 002-2V6a2 2 0 00-2-2H5a2 2 0 00-2 2v12a2 2 0 002 2z"/></svg>
-                    Swap Memory
-                </div>
-                <div class="card-value" style="color: {{ swap_color }}">{{ swap_percent }}%</div>
-                <div class="card-detail">{{ swap_used }} / {{ swap_total }}</div>
-                <div class="progress-bar"><div class="progress-fill" style="width: {{ swap_percent }}%; background: {{ swap_color }}"></div></div>
-            </div>
-
-            <div class="card">
-                <div class="card-title">
-                    <svg class="icon" fill="none" stroke="currentColor" viewBox="0 0 24 24"><path stroke-linecap="round" stroke-linejoin="round" stroke-width="2" d="M13 10V3L4 14h7v7l9-11h-7z"/></svg>
-                    Network I/O
-                </div>
-                <div class="card-value" style="color: #60a5fa">{{ connections }}</div>
-                <div class="card-detail">Active connections</div>
-                <div class="dual-stat">
-                    <div class="dual-stat-item"><div class="dual-stat-label">Sent</div><div class="dual-stat-value">{{ net_sent }}</div></div>
-                    <div class="dual-stat-item"><div class="dual-stat-label">Received</div><div class="dual-stat-value">{{ net_recv }}</div></div>
-                </div>
-            </div>
-        </div>
-
-        <div class="card">
-            <div class="card-title">
-                <svg class="icon" fill="none" stroke="currentColor" viewBox="0 0 24 24"><path stroke-linecap="round" stroke-linejoin="round" stroke-width="2" d="M5 12h14M5 12a2 2 0 01-2-2V6a2 2 0 012-2h14a2 2 0 012 2v4a2 2 0 01-2 2M5 12a2 2 0 00-2 2v4a2 2 0 002 2h14a2 2 0 002-2v-4a2 2 0 00-2-2"/></svg>
-                Server Information
-            </div>
-            <div class="info-grid">
-                <div class="info-item"><div class="info-label">Hostname</div><div class="info-value">{{ hostname }}</div></div>
-                <div class="info-item"><div class="info-label">Operating System</div><div class="info-value">{{ os_info }}</div></div>
-                <div class="info-item"><div class="info-label">CPU Model</div><div class="info-value">{{ cpu_model }}</div></div>
-                <div class="info-item"><div class="info-label">Python Version</div><div class="info-value">{{ python_version }}</div></div>
-                <div class="info-item"><div class="info-label">Server Time</div><div class="info-value" id="server-time">{{ server_time }}</div></div>
-                <div class="info-item"><div class="info-label">Architecture</div><div class="info-value">{{ arch }}</div></div>
-                <div class="info-item"><div class="info-label">CPU Cores</div><div class="info-value">{{ cpu_count }} threads ({{ cpu_count // 2 }} cores)</div></div>
-            </div>
-        </div>
-
-        <div class="footer">
-            <div>Last updated: <span id="last-update">{{ server_time }}</span></div>
-            <div style="margin-top: 5px; font-size: 0.75rem;">Real-time update every 2 seconds | Powered by Python & psutil</div>
-        </div>
-    </div>
-
-    <script>
-        var MAX_POINTS = 60;
-        var API_BASE = window.location.pathname.replace(/\/+$/, '');
-        var CORE_COLORS = [
-            '#ef4444', '#f59e0b', '#22c55e', '#06b6d4',
-            '#3b82f6', '#8b5cf6', '#ec4899', '#f97316'
-        ];
-
-        var labels = [];
-
-        // Clock Chart
-        var clockCtx = document.getElementById('clockChart').getContext('2d');
-        var clockDatasets = [];
-        for (var i = 0; i < {{ cpu_count }}; i++) {
-            clockDatasets.push({
-                label: 'Core ' + i,
-                data: [],
-                borderColor: CORE_COLORS[i % CORE_COLORS.length],
-                backgroundColor: CORE_COLORS[i % CORE_COLORS.length] + '20',
-                borderWidth: 2,
-                pointRadius: 0,
-                tension: 0.3,
-                fill: false,
-            });
-        }
-        var clockChart = new Chart(clockCtx, {
-            type: 'line',
-            data: { labels: labels, datasets: clockDatasets },
-            options: {
-                responsive: true,
-                maintainAspectRatio: false,
-                animation: { duration: 300 },
-                interaction: { mode: 'index', intersect: false },
-                plugins: {
-                    legend: { labels: { color: '#94a3b8', usePointStyle: true, pointStyle: 'circle', font: { size: 11 } } },
-                    tooltip: {
-                        backgroundColor: 'rgba(15, 23, 42, 0.9)',
-                        titleColor: '#e2e8f0', bodyColor: '#94a3b8',
-                        borderColor: 'rgba(255,255,255,0.1)', borderWidth: 1,
-                        callbacks: { label: function(ctx) { return ctx.dataset.label + ': ' + ctx.parsed.y + ' MHz'; } }
-                    }
-                },
-                scales: {
-                    x: { ticks: { color: '#475569', maxTicksLimit: 10 }, grid: { color: 'rgba(255,255,255,0.03)' } },
-                    y: { min: 0, max: {{ freq_max }} + 200,
-                        ticks: { color: '#475569', callback: function(v) { return v + ' MHz'; } },
-                        grid: { color: 'rgba(255,255,255,0.05)' } }
-                }
-            }
-        });
-
-        // Usage Chart
-        var usageCtx = document.getElementById('usageChart').getContext('2d');
-        var usageChart = new Chart(usageCtx, {
-            type: 'line',
-            data: {
-                labels: labels,
-                datasets: [
-                    { label: 'CPU %', data: [], borderColor: '#f59e0b', backgroundColor: 'rgba(245,158,11,0.1)', borderWidth: 2, pointRadius: 0, tension: 0.3, fill: true },
-                    { label: 'Memory %', data: [], borderColor: '#8b5cf6', backgroundColor: 'rgba(139,92,246,0.1)', borderWidth: 2, pointRadius: 0, tension: 0.3, fill: true }
-                ]
-            },
-            options: {
-                responsive: true, maintainAspectRatio: false,
-                animation: { duration: 300 },
-                interaction: { mode: 'index', intersect: false },
-                plugins: {
-                    legend: { labels: { color: '#94a3b8', usePointStyle: true, pointStyle: 'circle', font: { size: 11 } } },
-                    tooltip: {
-                        backgroundColor: 'rgba(15, 23, 42, 0.9)',
-                        titleColor: '#e2e8f0', bodyColor: '#94a3b8',
-                        borderColor: 'rgba(255,255,255,0.1)', borderWidth: 1,
-                        callbacks: { label: function(ctx) { return ctx.dataset.label + ': ' + ctx.parsed.y.toFixed(1) + '%'; } }
-                    }
-                },
-                scales: {
-                    x: { ticks: { color: '#475569', maxTicksLimit: 10 }, grid: { color: 'rgba(255,255,255,0.03)' } },
-                    y: { min: 0, max: 100,
-                        ticks: { color: '#475569', callback: function(v) { return v + '%'; } },
-                        grid: { color: 'rgba(255,255,255,0.05)' } }
-                }
-            }
-        });
-
-        function getColor(percent) {
-            if (percent < 50) return '#22c55e';
-            if (percent < 80) return '#f59e0b';
-            return '#ef4444';
-        }
-
-        function updateCoreGrid(coreClocks, maxFreq) {
-            var grid = document.getElementById('core-grid');
-            var html = '';
-            coreClocks.forEach(function(core) {
-                var pct = (core.current / maxFreq * 100).toFixed(0);
-                var ghz = (core.current / 1000).toFixed(2);
-                html += '<div class="core-item">' +
-                    '<div class="core-label">Core ' + core.core + '</div>' +
-                    '<div class="core-clock">' + ghz + '</div>' +
-                    '<div class="core-clock-unit">GHz (' + Math.round(core.current) + ' MHz)</div>' +
-                    '<div class="core-bar"><div class="core-bar-fill" style="width:' + pct + '%"></div></div></div>';
-            });
-            grid.innerHTML = html;
-        }
-
-        function fetchData() {
-            fetch(API_BASE + '/api/realtime')
-                .then(function(r) { return r.json(); })
-                .then(function(data) {
-                    labels.push(data.timestamp);
-                    if (labels.length > MAX_POINTS) labels.shift();
-
-                    data.core_clocks.forEach(function(core, i) {
-                        if (clockChart.data.datasets[i]) {
-                            clockChart.data.datasets[i].data.push(core.current);
-                            if (clockChart.data.datasets[i].data.length > MAX_POINTS)
-                                clockChart.data.datasets[i].data.shift();
-                        }
-                    });
-                    clockChart.update('none');
-
-                    usageChart.data.datasets[0].data.push(data.cpu_percent);
-                    usageChart.data.datasets[1].data.push(data.mem_percent);
-                    if (usageChart.data.datasets[0].data.length > MAX_POINTS) {
-                        usageChart.data.datasets[0].data.shift();
-                        usageChart.data.datasets[1].data.shift();
-                    }
-                    usageChart.update('none');
-
-                    updateCoreGrid(data.core_clocks, data.cpu_freq_max);
-                    document.getElementById('clock-avg').textContent = Math.round(data.cpu_freq_avg) + ' MHz';
-
-                    var cpuEl = document.getElementById('cpu-percent');
-                    cpuEl.textContent = data.cpu_percent.toFixed(1) + '%';
-                    cpuEl.style.color = getColor(data.cpu_percent);
-                    document.getElementById('cpu-bar').style.width = data.cpu_percent + '%';
-                    document.getElementById('cpu-bar').style.background = getColor(data.cpu_percent);
-                    document.getElementById('cpu-detail').textContent = data.core_clocks.length + ' cores @ ' + Math.round(data.cpu_freq_avg) + ' MHz';
-
-                    var memEl = document.getElementById('mem-percent');
-                    memEl.textContent = data.mem_percent.toFixed(1) + '%';
-                    memEl.style.color = getColor(data.mem_percent);
-                    document.getElementById('mem-bar').style.width = data.mem_percent + '%';
-                    document.getElementById('mem-bar').style.background = getColor(data.mem_percent);
-                    document.getElementById('mem-detail').textContent = data.mem_used + ' / ' + data.mem_total;
-
-                    document.getElementById('server-time').textContent = data.server_time;
-                    document.getElementById('last-update').textContent = data.server_time;
-                })
-                .catch(function(err) { console.error('Fetch error:', err); });
-        }
-
-        fetchData();
-        setInterval(fetchData, 2000);
-    </script>
-</body>
-</html>
-'''
-
-    return render_template_string(html_template,
+    html = dashboard_template.render(
         cpu_percent=cpu_percent,
         cpu_count=cpu_count,
         avg_mhz=avg_mhz,
         freq_max=freq_max,
         freq_min=freq_min,
         cpu_color=get_status_color(cpu_percent),
-        cpu_model=cpu_model,
+        cpu_model=host['cpu_model'],
         load_str=load_str,
-        mem_percent=memory.percent,
-        mem_used=get_size(memory.used),
-        mem_total=get_size(memory.total),
-        mem_available=get_size(memory.available),
-        mem_color=get_status_color(memory.percent),
-        swap_percent=swap.percent,
-        swap_used=get_size(swap.used),
-        swap_total=get_size(swap.total),
-        swap_color=get_status_color(swap.percent),
-        disk_percent=disk.percent,
-        disk_used=get_size(disk.used),
-        disk_total=get_size(disk.total),
-        disk_free=get_size(disk.free),
-        disk_color=get_status_color(disk.percent),
+        mem_percent=data['mem_percent'],
+        mem_used=get_size(data['mem_used']),
+        mem_total=get_size(data['mem_total']),
+        mem_available=get_size(data['mem_available']),
+        mem_color=get_status_color(data['mem_percent']),
+        swap_percent=data['swap_percent'],
+        swap_used=get_size(data['swap_used']),
+        swap_total=get_size(data['swap_total']),
+        swap_color=get_status_color(data['swap_percent']),
+        disk_percent=data['disk_percent'],
+        disk_used=get_size(data['disk_used']),
+        disk_total=get_size(data['disk_total']),
+        disk_free=get_size(data['disk_free']),
+        disk_color=get_status_color(data['disk_percent']),
+        disks=disks.as_rows(data['disks']),
         uptime=uptime,
-        hostname=hostname,
+        hostname=host['hostname'],
         server_time=server_time,
-        os_info=os_info,
-        python_version=python_version,
-        arch=platform.machine(),
+        os_info=host['os_info'],
+        python_version=host['python_version'],
+        arch=host['arch'],
         connections=connections,
-        net_sent=get_size(net_io.bytes_sent),
-        net_recv=get_size(net_io.bytes_recv),
-        process_count=process_count
+        tcp_states=data['tcp_states'],
+        net_sent=get_size(data['net_sent']),
+        net_recv=get_size(data['net_recv']),
+        net_sent_rate=get_size(data['net_sent_rate']),
+        net_recv_rate=get_size(data['net_recv_rate']),
+        interfaces=network.as_rows(data['net']),
+        process_count=process_count,
+        alerts=firing_alerts(data),
+        process_scan_ms=data['processes']['scan_ms'],
+        top_processes=data['processes']['top']['cpu'][:TOP_PROCESSES_SHOWN],
+        get_size=get_size,
+        get_status_color=get_status_color,
+        core_chart=core_chart,
+        js_config={'cpuCount': cpu_count, 'freqMax': freq_max, 'stream': streaming_enabled(),
+                   'coreChart': core_chart,
+                   'topProcesses': TOP_PROCESSES_SHOWN, 'processesMs': int(PROCESSES_TTL * 1000)},
     )
+    response = Response(html, mimetype='text/html')
+    response.headers['X-Sample-Age'] = f"{snapshot.age():.3f}"
+    return response
 
 if __name__ == '__main__':
     app.run(host='127.0.0.1', port=5000)
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+CPU per sampler tick of alert rule evaluation against rule count, without
+a budget and with the default MONITOR_ALERT_BUDGET_MS (rules that do not
+fit run first on the next tick).
+
+Values random-walk around the thresholds so rules keep going pending,
+firing and resolving.
+
+    python benchmarks/bench_alerts.py [ticks]
+"""
+
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from alerts import ALERT_BUDGET_MS, AlertEngine, Rule
+from bench_payload import DISKS, NET
+
+RULE_COUNTS = (100, 500, 2000, 10000)
+
+TEMPLATES = (
+    'cpu_percent > {t} for {d}s',
+    'mem_percent > {t}',
+    'load1 > {t} for {d}s clear {c}',
+    'disk / > {t}%',
+    'disk * > {t}% for {d}s',
+    'disk /var/lib/postgresql util > {t} for {d}s',
+    'net eth0 rx_bps > {t}000 for {d}s',
+    'net * rx_errs > 0',
+)
+
+
+def make_rules(count, rng):
+    rules = []
+    for i in range(count):
+        threshold = rng.randint(40, 90)
+        text = TEMPLATES[i % len(TEMPLATES)].format(t=threshold, d=rng.choice((0, 5, 60)), c=threshold - 10)
+        rules.append(Rule(f"r{i}: {text}"))
+    return rules
+
+
+def make_data(rng, previous=None):
+    def walk(value, low=0, high=100):
+        return round(min(high, max(low, value + rng.uniform(-8, 8))), 1)
+    if previous is None:
+        previous = {'cpu_percent': 60.0, 'mem_percent': 60.0, 'load_avg': (60.0, 50.0, 40.0)}
+    disks = dict(DISKS, percent=[walk(p) for p in DISKS['percent']], util=[walk(u) for u in DISKS['util']])
+    net = dict(NET, rx_bps=[walk(v / 1000, 0, 1e6) * 1000 for v in NET['rx_bps']])
+    return {
+        'cpu_percent': walk(previous['cpu_percent']), 'mem_percent': walk(previous['mem_percent']),
+        'swap_percent': 0.0, 'disk_percent': disks['percent'][0], 'disk_read_rate': 0.0, 'disk_write_rate': 0.0,
+        'net_sent_rate': 0.0, 'net_recv_rate': 0.0, 'connections': 100, 'process_count': 300,
+        'load_avg': tuple(walk(v) for v in previous['load_avg']), 'disks': disks, 'net': net,
+    }
+
+
+def run(rules, ticks, budget_ms, rng):
+    engine = AlertEngine(rules, budget_ms=budget_ms)
+    data = make_data(rng)
+    cpu, deferred, firing = [], 0, 0
+    for _ in range(ticks):
+        data = make_data(rng, data)
+        view = engine.evaluate(data)
+        cpu.append(view['eval']['cpu_ms'])
+        deferred += view['eval']['deferred']
+        firing += view['firing']
+    cpu.sort()
+    return cpu[len(cpu) // 2], cpu[int(len(cpu) * 0.99)], cpu[-1], deferred / ticks, firing / ticks
+
+
+def main():
+    ticks = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    print(f"{'rules':>6}  {'budget':>8}  {'p50 ms':>8}  {'p99 ms':>8}  {'max ms':>8}  {'us/rule':>8}  {'deferred':>9}  {'firing':>7}")
+    for count in RULE_COUNTS:
+        rules = make_rules(count, random.Random(count))
+        for budget in (float('inf'), ALERT_BUDGET_MS):
+            p50, p99, worst, deferred, firing = run(rules, ticks, budget, random.Random(0))
+            label = 'none' if budget == float('inf') else f"{budget:g} ms"
+            per_rule = p50 * 1000 / (count - deferred)
+            print(f"{count:6d}  {label:>8}  {p50:8.3f}  {p99:8.3f}  {worst:8.3f}  {per_rule:8.2f}  {deferred:9.1f}  {firing:7.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Cost of every collector the sampler calls per tick, on fake /proc and /sys
+trees of different core counts (the legacy /proc/cpuinfo and psutil paths
+included for comparison).
+
+    python benchmarks/bench_collectors.py [iterations] [--cores 4,256] [--json]
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+import psutil
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import procfs
+from collectors import get_cpu_freq_mhz, get_uptime
+from disks import DiskCollector
+from fakeproc import add_processes, build_tree, write_system
+from network import NetCollector
+from processes import ProcessTable
+
+CORE_COUNTS = (4, 256)
+PROCESSES = 500
+
+
+def per_call_us(fn, iterations, repeats=5):
+    """best of `repeats` runs, so a busy machine reads as noise less often"""
+    fn()
+    best = float('inf')
+    for _ in range(repeats):
+        started = time.perf_counter()
+        for _ in range(iterations // repeats or 1):
+            fn()
+        best = min(best, (time.perf_counter() - started) / (iterations // repeats or 1))
+    return best * 1e6
+
+
+def collectors(proc_root, sys_root):
+    """name -> zero-argument callable, in sampler order"""
+    freq = procfs.CpuFreqReader(sys_root=sys_root, proc_root=proc_root)
+    disks = DiskCollector(proc_root=proc_root)
+    net = NetCollector(proc_root=proc_root)
+    table = ProcessTable(proc_root=proc_root)
+    clock = iter(range(1, 10 ** 9))
+    return {
+        'get_cpu_freq_mhz (cpuinfo)': lambda: get_cpu_freq_mhz(os.path.join(proc_root, 'cpuinfo')),
+        'cpu_freq (sysfs pread)': freq.read_mhz,
+        'cpu_percent per core': lambda: psutil.cpu_percent(percpu=True),
+        'virtual_memory': psutil.virtual_memory,
+        'swap_memory': psutil.swap_memory,
+        'get_uptime': lambda: get_uptime(psutil.boot_time()),
+        'disks': lambda: disks.sample(next(clock)),
+        'net': lambda: net.sample(next(clock)),
+        'connections (sockstat)': lambda: procfs.count_connections(procfs.read_sockstat(proc_root)),
+        'tcp_states': lambda: procfs.count_tcp_states(proc_root),
+        f'processes ({PROCESSES})': table.scan,
+    }
+
+
+def measure(cores, iterations):
+    with tempfile.TemporaryDirectory() as root:
+        proc_root, sys_root = build_tree(root, cores)
+        write_system(proc_root, cores, tick=1)
+        add_processes(proc_root, PROCESSES)
+        previous = psutil.PROCFS_PATH
+        psutil.PROCFS_PATH = proc_root
+        try:
+            return {name: per_call_us(fn, iterations) for name, fn in collectors(proc_root, sys_root).items()}
+        finally:
+            psutil.PROCFS_PATH = previous
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('iterations', nargs='?', type=int, default=200)
+    parser.add_argument('--cores', default=','.join(map(str, CORE_COUNTS)))
+    parser.add_argument('--json', action='store_true', help='one JSON object per core count, for run_all.py')
+    args = parser.parse_args()
+    core_counts = [int(c) for c in args.cores.split(',')]
+
+    results = {cores: measure(cores, args.iterations) for cores in core_counts}
+    if args.json:
+        for cores, timings in results.items():
+            print(json.dumps({'bench': 'collectors', 'cores': cores, 'us': timings}))
+        return
+    names = list(next(iter(results.values())))
+    print(f"{'collector':<28}" + ''.join(f"{f'{c} cores':>12}" for c in core_counts) + "   (us per call)")
+    for name in names:
+        print(f"{name:<28}" + ''.join(f"{results[c][name]:12.1f}" for c in core_counts))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+"""
+Load test of / and /api/realtime with N concurrent simulated dashboards,
+against a fake /proc and /sys tree of a chosen core count.
+
+Every dashboard loads / once per --page-every requests and polls
+/api/realtime in between (compact deltas with --compact, like the real
+dashboard), with --think seconds between requests (0 = as fast as the
+server answers). Reports p50/p99 latency per endpoint, requests/s and the
+CPU the monitor used.
+
+    python benchmarks/bench_load.py --mode client --cores 256 --clients 8
+    python benchmarks/bench_load.py --mode gunicorn --workers 2 --cores 4
+
+--mode client drives Flask's test client in this process (CPU includes the
+clients); --mode gunicorn starts a local Gunicorn and measures its master
+and workers only.
+"""
+
+import argparse
+import http.client
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import psutil
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+
+from fakeproc import add_processes, build_tree, write_system
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+class Dashboard:
+    """One simulated viewer; `get(path)` returns the body, `latencies[path]` collects seconds."""
+
+    def __init__(self, get, args):
+        self.get = get
+        self.args = args
+        self.latencies = {'/': [], '/api/realtime': []}
+        self.errors = 0
+        self.seq = 0
+
+    def run(self, deadline):
+        i = 0
+        while time.monotonic() < deadline:
+            if i % self.args.page_every == 0:
+                path, key = '/', '/'
+            elif self.args.compact:
+                path = '/api/realtime?format=compact' + (f'&since={self.seq}' if self.seq else '')
+                key = '/api/realtime'
+            else:
+                path, key = '/api/realtime', '/api/realtime'
+            started = time.perf_counter()
+            try:
+                status, body = self.get(path)
+            except (OSError, http.client.HTTPException):
+                self.errors += 1
+                time.sleep(0.1)
+                continue
+            self.latencies[key].append(time.perf_counter() - started)
+            if status != 200:
+                self.errors += 1
+            elif key == '/api/realtime' and self.args.compact:
+                self.seq = json.loads(body)['seq']
+            i += 1
+            if self.args.think:
+                time.sleep(self.args.think)
+
+
+def client_getter(app):
+    client = app.test_client()
+    def get(path):
+        response = client.get(path)
+        return response.status_code, response.get_data()
+    return get
+
+
+def http_getter(port):
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+    def get(path):
+        connection.request('GET', path)
+        response = connection.getresponse()
+        return response.status, response.read()
+    return get
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def cpu_seconds(processes):
+    total = 0.0
+    for process in processes:
+        try:
+            times = process.cpu_times()
+            total += times.user + times.system
+        except psutil.NoSuchProcess:
+            pass
+    return total
+
+
+def run_clients(dashboards, seconds):
+    deadline = time.monotonic() + seconds
+    threads = [threading.Thread(target=d.run, args=(deadline,), daemon=True) for d in dashboards]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - started
+
+
+def tick_tree(proc_root, cores, stop):
+    # Counters move every second, like on a live machine.
+    tick = 1
+    while not stop.wait(1.0):
+        tick += 1
+        write_system(proc_root, cores, tick=tick)
+
+
+def bench(args):
+    with tempfile.TemporaryDirectory() as root:
+        proc_root, sys_root = build_tree(root, args.cores)
+        add_processes(proc_root, args.processes)
+        env = {
+            'MONITOR_PROC_ROOT': proc_root, 'MONITOR_SYS_ROOT': sys_root,
+            'MONITOR_HISTORY': '0', 'MONITOR_SHM_NAME': f"bench-load-{os.getpid()}",
+            'MONITOR_SHM_DIR': root, 'MONITOR_ALERT_RULES': '',
+        }
+        stop = threading.Event()
+        threading.Thread(target=tick_tree, args=(proc_root, args.cores, stop), daemon=True).start()
+        try:
+            if args.mode == 'client':
+                return bench_client(args, env)
+            return bench_gunicorn(args, env)
+        finally:
+            stop.set()
+
+
+def bench_client(args, env):
+    os.environ.update(env)
+    import app as monitor_app
+    from sampler import get_sampler
+    get_sampler().touch()
+    get_sampler().latest()
+    time.sleep(1.2)     # a second tick, so CPU percentages are real deltas
+    dashboards = [Dashboard(client_getter(monitor_app.app), args) for _ in range(args.clients)]
+    # procfs pointed psutil at the fake tree, so this process is timed with os.times().
+    cpu_before = sum(os.times()[:2])
+    elapsed = run_clients(dashboards, args.seconds)
+    return dashboards, elapsed, sum(os.times()[:2]) - cpu_before
+
+
+def bench_gunicorn(args, env):
+    port = free_port()
+    command = [sys.executable, '-m', 'gunicorn', '--workers', str(args.workers), '-k', 'gthread',
+               '--threads', str(args.threads), '--bind', f'127.0.0.1:{port}', 'app:app']
+    server = subprocess.Popen(command, cwd=ROOT, env=dict(os.environ, **env),
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        deadline = time.monotonic() + 20
+        while True:
+            try:
+                status, _ = http_getter(port)('/api/realtime')
+                if status == 200:
+                    break
+            except OSError:
+                pass
+            if time.monotonic() > deadline or server.poll() is not None:
+                raise SystemExit('gunicorn did not come up')
+            time.sleep(0.2)
+        time.sleep(1.2)
+        master = psutil.Process(server.pid)
+        processes = [master] + master.children(recursive=True)
+        dashboards = [Dashboard(http_getter(port), args) for _ in range(args.clients)]
+        cpu_before = cpu_seconds(processes)
+        elapsed = run_clients(dashboards, args.seconds)
+        return dashboards, elapsed, cpu_seconds(processes) - cpu_before
+    finally:
+        # SIGINT is Gunicorn's quick shutdown; SIGTERM would wait out the keep-alive clients.
+        server.send_signal(signal.SIGINT)
+        server.wait(10)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test / and /api/realtime')
+    parser.add_argument('--mode', choices=('client', 'gunicorn'), default='client')
+    parser.add_argument('--cores', type=int, default=4)
+    parser.add_argument('--processes', type=int, default=300, help='fake processes in the tree')
+    parser.add_argument('--clients', type=int, default=8, help='concurrent dashboards')
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--think', type=float, default=0, help='seconds between requests per dashboard')
+    parser.add_argument('--page-every', type=int, default=10, help='load / once per this many requests')
+    parser.add_argument('--compact', action='store_true', help='poll the compact delta format')
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--json', action='store_true', help='one JSON object, for run_all.py')
+    args = parser.parse_args()
+
+    dashboards, elapsed, cpu = bench(args)
+    requests = sum(len(v) for d in dashboards for v in d.latencies.values())
+    endpoints = {}
+    for path in ('/', '/api/realtime'):
+        values = [v for d in dashboards for v in d.latencies[path]]
+        endpoints[path] = {'count': len(values),
+                           'p50_ms': round(percentile(values, 0.5) * 1000, 3),
+                           'p99_ms': round(percentile(values, 0.99) * 1000, 3),
+                           'max_ms': round(max(values, default=0) * 1000, 3)}
+    result = {
+        'bench': 'load', 'mode': args.mode, 'cores': args.cores, 'clients': args.clients,
+        'rps': round(requests / elapsed, 1), 'errors': sum(d.errors for d in dashboards),
+        'cpu_s': round(cpu, 3), 'cpu_percent': round(cpu / elapsed * 100, 1),
+        'cpu_ms_per_request': round(cpu / requests * 1000, 3) if requests else None,
+        'endpoints': endpoints,
+    }
+    if args.json:
+        print(json.dumps(result))
+        return
+    print(f"{args.mode}, {args.cores} cores, {args.clients} dashboards, {elapsed:.1f} s")
+    print(f"{'endpoint':<16}{'requests':>10}{'p50 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for path, stats in endpoints.items():
+        print(f"{path:<16}{stats['count']:10d}{stats['p50_ms']:10.2f}{stats['p99_ms']:10.2f}{stats['max_ms']:10.2f}")
+    print(f"{result['rps']} requests/s, {result['errors']} errors")
+    who = 'monitor + clients' if args.mode == 'client' else 'gunicorn master + workers'
+    print(f"CPU ({who}): {result['cpu_s']} s = {result['cpu_percent']}% of one core, "
+          f"{result['cpu_ms_per_request']} ms per request")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Bytes per tick of /api/realtime: JSON vs the compact format (full and
+delta), raw and gzip/brotli-compressed, for several core counts.
+
+"idle" = most cores parked at a stable frequency with 0% load,
+"busy" = every per-core value changes every tick.
+
+    python benchmarks/bench_payload.py
+"""
+
+import gzip
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import app as monitor_app
+from compact import compact_payload
+from sampler import Snapshot
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+CORE_COUNTS = (4, 64, 256)
+
+DISKS = {
+    'mount': ['/', '/var/lib/postgresql'], 'device': ['nvme0n1p2', 'nvme1n1'], 'fstype': ['ext4', 'xfs'],
+    'total': [107374182400, 1099511627776], 'used': [53687091200, 604462909440],
+    'free': [48318382080, 495048718336], 'percent': [52.6, 55.0],
+    'read_bps': [40960.0, 8388608.0], 'write_bps': [1048576.0, 20971520.0], 'read_iops': [10.0, 850.0],
+    'write_iops': [120.0, 2100.0], 'await_ms': [0.4, 0.9], 'util': [2.1, 38.5],
+}
+
+
+NET = {
+    'iface': ['eth0', 'eth1'], 'rx_bytes': [9876543210, 123456789], 'tx_bytes': [8765432109, 23456789],
+    'rx_bps': [1250000.0, 2048.0], 'tx_bps': [3750000.0, 1024.0], 'rx_pps': [1800.0, 12.0],
+    'tx_pps': [2600.0, 9.0], 'rx_errs': [0.0, 0.0], 'tx_errs': [0.0, 0.0], 'rx_drop': [0.0, 0.0], 'tx_drop': [0.0, 0.0],
+}
+
+
+def make_data(cores, rng, busy, previous=None):
+    if previous is not None and not busy:
+        # Idle: ~5% of cores change per tick.
+        pc, mhz = list(previous['cpu_percent_per_core']), list(previous['core_mhz'])
+        for i in rng.sample(range(cores), max(1, cores // 20)):
+            pc[i] = round(rng.uniform(0, 5), 1)
+            mhz[i] = float(rng.choice((800, 1200, 2400)))
+    elif busy:
+        pc = [round(rng.uniform(20, 100), 1) for _ in range(cores)]
+        mhz = [float(round(rng.uniform(2000, 3700))) for _ in range(cores)]
+    else:
+        pc, mhz = [0.0] * cores, [800.0] * cores
+    return {
+        'cpu_percent': round(sum(pc) / cores, 1), 'cpu_percent_per_core': pc,
+        'core_mhz': mhz, 'cpu_freq_avg': round(sum(mhz) / cores), 'cpu_freq_min': 800.0,
+        'cpu_freq_max': 3700.0, 'mem_percent': 50.7, 'mem_used': 3833593856, 'mem_total': 8203091968,
+        'disk_percent': 52.6, 'disk_read_rate': 8429568.0, 'disk_write_rate': 22020096.0, 'disks': DISKS,
+        'net_sent_rate': 3751024.0, 'net_recv_rate': 1252048.0, 'net_sent': 8788888898, 'net_recv': 9999999999,
+        'net': NET,
+    }
+
+
+def sizes(body):
+    body = body.encode()
+    row = [len(body), len(gzip.compress(body, 6))]
+    if brotli is not None:
+        row.append(len(brotli.compress(body, quality=5)))
+    return row
+
+
+def main():
+    rng = random.Random(0)
+    columns = ['raw', 'gzip'] + (['br'] if brotli is not None else [])
+    header = ''.join(f"{c:>8}" for c in columns)
+    with monitor_app.app.app_context():
+        for busy in (False, True):
+            print(f"\n{'busy' if busy else 'idle'} host, bytes per tick")
+            print(f"{'cores':>6}  {'format':<14}{header}")
+            for cores in CORE_COUNTS:
+                first = make_data(cores, rng, busy)
+                prev = Snapshot(1, time.time(), first)
+                snap = Snapshot(2, time.time() + 1, make_data(cores, rng, busy, first))
+                rows = [
+                    ('json', monitor_app.realtime_json(snap)),
+                    ('compact full', monitor_app.app.json.dumps(compact_payload(snap))),
+                    ('compact delta', monitor_app.app.json.dumps(compact_payload(snap, prev))),
+                ]
+                base = len(rows[0][1])
+                for name, body in rows:
+                    cells = ''.join(f"{n:8d}" for n in sizes(body))
+                    print(f"{cores:6d}  {name:<14}{cells}   ({len(body) * 100 / base:5.1f}% of json)")
+
+
+if __name__ == '__main__':
+    main()
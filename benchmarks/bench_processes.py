@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Cost of one process scan (top-N by CPU and memory) against process count,
+on fake /proc trees, and per process against psutil.process_iter on the
+real /proc.
+
+    python benchmarks/bench_processes.py [scans]
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+import psutil
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from processes import ProcessTable
+from fakeproc import add_processes, tick_processes
+
+PROCESS_COUNTS = (500, 1000, 5000, 10000)
+
+
+def timed(fn, repeat):
+    wall, cpu = time.perf_counter(), time.process_time()
+    for _ in range(repeat):
+        fn()
+    return ((time.perf_counter() - wall) / repeat * 1000,
+            (time.process_time() - cpu) / repeat * 1000)
+
+
+def psutil_scan():
+    # What a naive top-N costs: new Process objects and their stat/statm/status reads every scan.
+    rows = [p.info for p in psutil.process_iter(['pid', 'name', 'cpu_percent', 'memory_info', 'username'])]
+    return sorted(rows, key=lambda r: r['cpu_percent'] or 0, reverse=True)[:20]
+
+
+def main():
+    scans = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    print(f"{'processes':>10}{'wall ms':>10}{'cpu ms':>9}{'us/proc':>9}{'cpu% @5s':>10}")
+    for count in PROCESS_COUNTS:
+        with tempfile.TemporaryDirectory() as root:
+            proc_root = os.path.join(root, 'proc')
+            pids = add_processes(proc_root, count)
+            table = ProcessTable(proc_root=proc_root)
+            table.scan()
+            tick_processes(proc_root, pids)
+            result = table.scan()
+            assert result['count'] == count and result['top']['cpu'][0]['cpu'] > 0
+            wall, cpu = timed(table.scan, scans)
+        print(f"{count:>10}{wall:>10.2f}{cpu:>9.2f}{wall * 1000 / count:>9.1f}{cpu / 5000 * 100:>9.2f}%")
+
+    real = len(psutil.pids())
+    table = ProcessTable()
+    table.scan()
+    wall, _ = timed(table.scan, scans)
+    psutil_scan()
+    old_wall, _ = timed(psutil_scan, scans)
+    print(f"\nreal /proc, {real} processes:")
+    print(f"  psutil.process_iter  {old_wall:8.2f} ms  {old_wall * 1000 / real:6.1f} us/proc")
+    print(f"  ProcessTable.scan    {wall:8.2f} ms  {wall * 1000 / real:6.1f} us/proc")
+
+
+if __name__ == '__main__':
+    main()
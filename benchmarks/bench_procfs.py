@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+Per-sample cost of reading per-core frequency against core count:
+parsing /proc/cpuinfo (the old path) vs os.pread on persistent sysfs fds.
+
+    python benchmarks/bench_procfs.py [iterations]
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from collectors import get_cpu_freq_mhz
+from procfs import CpuFreqReader
+from fakeproc import build_tree
+
+CORE_COUNTS = (4, 16, 64, 128, 256)
+
+
+def per_call_us(fn, iterations):
+    fn()
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    print(f"{'cores':>6}{'cpuinfo KB':>12}{'cpuinfo us':>12}{'pread us':>10}{'speedup':>9}")
+    for cores in CORE_COUNTS:
+        with tempfile.TemporaryDirectory() as root:
+            proc_root, sys_root = build_tree(root, cores)
+            cpuinfo = os.path.join(proc_root, 'cpuinfo')
+            reader = CpuFreqReader(sys_root=sys_root, proc_root=proc_root)
+            assert len(reader.read_mhz()) == len(get_cpu_freq_mhz(cpuinfo)) == cores
+            old_us = per_call_us(lambda: get_cpu_freq_mhz(cpuinfo), iterations)
+            new_us = per_call_us(reader.read_mhz, iterations)
+            reader.close()
+            size_kb = os.path.getsize(cpuinfo) / 1024
+        print(f"{cores:6d}{size_kb:12.0f}{old_us:12.1f}{new_us:10.1f}{old_us / new_us:8.1f}x")
+
+
+if __name__ == '__main__':
+    main()
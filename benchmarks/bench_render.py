@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark: dashboard render time and response bytes, before/after
+moving the template out of monitor().
+
+"before" rebuilds the old single-string template (CSS and JS inlined) and
+renders it with render_template_string on every call, like the original
+monitor(). "after" renders the precompiled templates/index.html.
+
+    python benchmarks/bench_render.py [iterations]
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from flask import render_template_string
+
+import app as monitor_app
+
+CONTEXT = dict(
+    cpu_percent=12.5, cpu_count=8, avg_mhz=2400, freq_max=3700, freq_min=1200,
+    cpu_color='#22c55e', cpu_model='Intel(R) Xeon(R) CPU', load_str='0.10 / 0.20 / 0.30',
+    mem_percent=50.7, mem_used='3.57 GB', mem_total='7.64 GB', mem_available='3.90 GB',
+    mem_color='#f59e0b', swap_percent=1.0, swap_used='10.00 MB', swap_total='2.00 GB',
+    swap_color='#22c55e', disk_percent=60.0, disk_used='30.00 GB', disk_total='50.00 GB',
+    disk_free='20.00 GB', disk_color='#f59e0b', uptime='1d 2h 3m', hostname='bench',
+    server_time='2026-01-01 00:00:00', os_info='Linux 6.8', python_version='3.12.0',
+    arch='x86_64', connections=42, tcp_states={'ESTABLISHED': 30, 'LISTEN': 12}, net_sent='1.00 GB', net_recv='2.00 GB', process_count=150,
+    process_scan_ms=1.2, get_size=monitor_app.get_size, get_status_color=monitor_app.get_status_color,
+    disks=[{'mount': '/', 'device': 'vda', 'fstype': 'ext4', 'total': 50 << 30, 'percent': 60.0,
+            'read_bps': 4096.0, 'write_bps': 1 << 20, 'read_iops': 1.0, 'write_iops': 25.0,
+            'await_ms': 0.5, 'util': 1.2}],
+    top_processes=[{'pid': 1000 + i, 'user': 'www-data', 'cpu': 1.5, 'rss': 50 << 20, 'state': 'S',
+                    'cmdline': f'php-fpm: pool www {i}'} for i in range(10)],
+    net_sent_rate='1.20 MB', net_recv_rate='3.50 MB',
+    interfaces=[{'iface': 'eth0', 'rx_bps': 3670016.0, 'tx_bps': 1258291.0, 'rx_pps': 2600.0, 'tx_pps': 1800.0,
+                 'rx_errs': 0.0, 'tx_errs': 0.0, 'rx_drop': 0.0, 'tx_drop': 0.0}],
+    alerts=[],
+    core_chart='all', js_config={'cpuCount': 8, 'freqMax': 3700, 'coreChart': 'all'},
+)
+
+
+def read_static(name):
+    with open(os.path.join(monitor_app.app.static_folder, name)) as f:
+        return f.read()
+
+
+def legacy_template():
+    """The pre-split template: one string with CSS and JS inlined."""
+    with open(os.path.join(monitor_app.app.root_path, monitor_app.app.template_folder, 'index.html')) as f:
+        html = f.read()
+    html = html.replace(
+        "<link rel=\"stylesheet\" href=\"{{ static_url('dashboard.css') }}\">",
+        '<style>\n' + read_static('dashboard.css') + '</style>')
+    html = html.replace(
+        "<script src=\"{{ static_url('dashboard.js') }}\"></script>",
+        '<script>\n' + read_static('dashboard.js') + '</script>')
+    return html
+
+
+def bench(fn, iterations):
+    fn()
+    start = time.perf_counter()
+    for _ in range(iterations):
+        body = fn()
+    return (time.perf_counter() - start) / iterations * 1e6, len(body.encode())
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    legacy = legacy_template()
+    static_bytes = sum(len(read_static(n).encode()) for n in ('dashboard.css', 'dashboard.js'))
+
+    with monitor_app.app.app_context():
+        before_us, before_bytes = bench(lambda: render_template_string(legacy, **CONTEXT), iterations)
+        after_us, after_bytes = bench(lambda: monitor_app.dashboard_template.render(**CONTEXT), iterations)
+
+    print(f"{'':24}{'render us':>12}{'HTML bytes':>12}")
+    print(f"{'before (inline string)':24}{before_us:12.1f}{before_bytes:12d}")
+    print(f"{'after (precompiled)':24}{after_us:12.1f}{after_bytes:12d}")
+    print(f"static assets: {static_bytes} bytes on first visit, 0 (304/cached) afterwards")
+    print(f"speedup: {before_us / after_us:.1f}x, bytes per repeat load: -{100 - after_bytes * 100 / before_bytes:.0f}%")
+
+
+if __name__ == '__main__':
+    main()
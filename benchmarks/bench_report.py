@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+/api/report cost and accuracy: the time to build a 30-day report (against
+the 30 days before) from 62 days of hourly sketches, the cost the sketches
+add to every sampler tick at 4 and 256 cores, and how far the sketch
+percentiles are from exact ones over a few hours of 1 s samples.
+
+    python benchmarks/bench_report.py [runs] [--json]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import report
+import sketches
+from history import HistoryStore
+
+DAY = 86400
+ACCURACY_SECONDS = 6 * 3600
+
+
+def draw(rng, metric, n):
+    """n plausible values of `metric`"""
+    if metric.endswith('_rate'):
+        return rng.lognormal(12, 2, n)
+    if metric == 'core_mhz':
+        return rng.choice(np.arange(800, 4001, 100), n).astype(np.float64)
+    return np.round(np.clip(rng.gamma(2, 12, n), 0, 100), 1)
+
+
+def bins_of(layout, values):
+    """Layout.index over an array"""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        i = 1 + ((np.log(values) - np.log(layout.low)) / sketches.LOG_GAMMA).astype(np.int64)
+    return np.where(values < layout.low, 0, np.minimum(i, layout.bins - 1))
+
+
+def fill(directory, now, cores=4, seed=0):
+    """Every sketch tier full, as if the monitor had sampled every second since then."""
+    rng = np.random.default_rng(seed)
+    store = sketches.SketchStore(directory)
+    for metric, layout in sketches.METRIC_LAYOUTS.items():
+        width = cores if metric in ('cpu_core', 'core_mhz') else 1
+        for tier in store.tiers:
+            ring = store._ring(metric, tier, layout.bins)
+            last = now - now % tier[1]
+            for start in range(last - (tier[2] - 1) * tier[1], last + 1, tier[1]):
+                values = draw(rng, metric, tier[1] * width)
+                counts = np.bincount(bins_of(layout, values), minlength=layout.bins) / width
+                ring.write(start, tier[1], values.sum() / width, values.max(), values.min(),
+                           counts.tolist())
+    store.close()
+
+
+def report_ms(directory, now, runs):
+    """(first report on a fresh store, median of the following ones) in ms"""
+    times = []
+    store = sketches.SketchStore(directory)
+    for _ in range(runs + 1):
+        started = time.perf_counter()
+        report.report(store, now - 30 * DAY, now)
+        times.append((time.perf_counter() - started) * 1000)
+    store.close()
+    return times[0], statistics.median(times[1:])
+
+
+def sample(rng, cores):
+    return {'cpu_percent': float(draw(rng, 'cpu_percent', 1)[0]),
+            'cpu_percent_per_core': draw(rng, 'cpu_core', cores).tolist(),
+            'core_mhz': draw(rng, 'core_mhz', cores).tolist(),
+            'mem_percent': 52.3, 'swap_percent': 0.0, 'disk_percent': 41.0,
+            'disk_read_rate': float(draw(rng, 'disk_read_rate', 1)[0]),
+            'disk_write_rate': float(draw(rng, 'disk_write_rate', 1)[0]),
+            'net_sent_rate': float(draw(rng, 'net_sent_rate', 1)[0]),
+            'net_recv_rate': float(draw(rng, 'net_recv_rate', 1)[0])}
+
+
+def record_us(directory, cores, ticks=2000, repeats=5):
+    """Sketch cost of one sampler tick, best of `repeats`"""
+    rng = np.random.default_rng(cores)
+    samples = [sample(rng, cores) for _ in range(50)]
+    store = sketches.SketchStore(directory)
+    ts = time.time() - repeats * ticks
+    best = float('inf')
+    for _ in range(repeats):
+        started = time.perf_counter()
+        for i in range(ticks):
+            ts += 1
+            store.record(ts, samples[i % len(samples)])
+        best = min(best, (time.perf_counter() - started) / ticks)
+    store.close()
+    return best * 1e6
+
+
+def accuracy(directory):
+    """Largest relative error of p50/p95/p99 against numpy over ACCURACY_SECONDS of 1 s samples"""
+    rng = np.random.default_rng(1)
+    history = HistoryStore(directory)
+    end = int(time.time())
+    recorded = {metric: [] for metric in ('cpu_percent', 'net_recv_rate', 'core_mhz')}
+    for ts in range(end - ACCURACY_SECONDS, end):
+        data = sample(rng, 4)
+        history.record(ts, data)
+        recorded['cpu_percent'].append(data['cpu_percent'])
+        recorded['net_recv_rate'].append(data['net_recv_rate'])
+        recorded['core_mhz'].extend(data['core_mhz'])
+    history.flush()
+    result = report.report(history.sketches, end - ACCURACY_SECONDS, end, shift=0, metrics=list(recorded))
+    history.close()
+    worst = 0.0
+    for metric, values in recorded.items():
+        exact = np.percentile(values, [50, 95, 99])
+        current = result['metrics'][metric]['current']
+        estimate = np.array([current['p50'], current['p95'], current['p99']])
+        worst = max(worst, float(np.max(np.abs(estimate - exact) / np.maximum(exact, 1e-9))))
+    return worst * 100
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Report endpoint cost and sketch accuracy')
+    parser.add_argument('runs', nargs='?', type=int, default=10)
+    parser.add_argument('--json', action='store_true', help='one JSON object, for run_all.py')
+    args = parser.parse_args()
+
+    now = int(time.time())
+    with tempfile.TemporaryDirectory() as root:
+        fill(os.path.join(root, 'full'), now)
+        first, warm = report_ms(os.path.join(root, 'full'), now, args.runs)
+        result = {
+            'bench': 'report',
+            'report_30d_first_ms': round(first, 1),
+            'report_30d_ms': round(warm, 1),
+            'record_us': {cores: round(record_us(os.path.join(root, f'record{cores}'), cores), 1)
+                          for cores in (4, 256)},
+            'quantile_error_pct': round(accuracy(os.path.join(root, 'accuracy')), 2),
+            'disk_mb': round(sum(os.path.getsize(os.path.join(root, 'full', name))
+                                 for name in os.listdir(os.path.join(root, 'full'))) / 2 ** 20, 1),
+        }
+
+    if args.json:
+        print(json.dumps(result))
+        return
+    print(f"{len(report.METRICS)} metrics, 30 days against the 30 before, {len(sketches.METRIC_LAYOUTS)} sketched metrics")
+    for key, value in result.items():
+        if key == 'record_us':
+            for cores, us in value.items():
+                print(f"  {f'record_us ({cores} cores)':<24}{us:10.1f}")
+        elif key != 'bench':
+            print(f"  {key:<24}{value:10.1f}")
+    print(f"  (sketch accuracy bound: {sketches.ACCURACY * 100:.1f}%)")
+
+
+if __name__ == '__main__':
+    main()
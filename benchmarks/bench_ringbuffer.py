@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Memory per hour of retention and query latency of the NumPy ring buffers,
+against the list-of-dicts layout of api_realtime()'s core_clocks.
+
+    python benchmarks/bench_ringbuffer.py [cores] [seconds]
+"""
+
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from ringbuffer import RingBuffer
+
+
+def dict_bytes_per_sample(cores, samples=60):
+    """tracemalloc'd size of `samples` core_clocks lists, per sample."""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    kept = [[{'core': i, 'current': 2400.0 + s, 'min': 1200.0, 'max': 3700.0}
+             for i in range(cores)] for s in range(samples)]
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del kept
+    return used / samples
+
+
+def timed_ms(fn, repeat=5):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main():
+    cores = int(sys.argv[1]) if len(sys.argv) > 1 else 256
+    seconds = int(sys.argv[2]) if len(sys.argv) > 2 else 86400
+
+    ring = RingBuffer(seconds, cores)
+    rng = np.random.default_rng(0)
+    block = rng.uniform(800, 3700, size=(3600, cores)).astype(np.float32)
+    t0 = 1_700_000_000_000
+    start = time.perf_counter()
+    for s in range(seconds):
+        ring.append(t0 + s * 1000, block[s % 3600])
+    append_us = (time.perf_counter() - start) / seconds * 1e6
+    end_ms = t0 + (seconds - 1) * 1000
+
+    ring_hour = ring.nbytes / seconds * 3600
+    dict_hour = dict_bytes_per_sample(cores) * 3600
+    print(f"{cores} cores x {seconds} s at 1 s resolution")
+    print(f"  ring buffer     {ring.nbytes / 2**20:8.1f} MiB total, {ring_hour / 2**20:6.2f} MiB per hour")
+    print(f"  list of dicts   {dict_hour * seconds / 3600 / 2**20:8.1f} MiB total, {dict_hour / 2**20:6.2f} MiB per hour")
+    print(f"  append          {append_us:8.2f} us per sample")
+    print(f"{'window':>10}{'min/max/avg ms':>16}{'+p95 ms':>10}{'overall ms':>12}")
+    for window in (60, 3600, seconds):
+        lo = end_ms - (window - 1) * 1000
+        basic = timed_ms(lambda: ring.aggregate(lo, end_ms, ('min', 'max', 'avg')))
+        full = timed_ms(lambda: ring.aggregate(lo, end_ms))
+        overall = timed_ms(lambda: ring.aggregate(lo, end_ms, per_column=False))
+        print(f"{window:>9}s{basic:16.2f}{full:10.2f}{overall:12.2f}")
+
+
+if __name__ == '__main__':
+    main()
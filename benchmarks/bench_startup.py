@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Startup cost of the web and headless modes: import time of app.py and
+recorder.py in a fresh interpreter (with the slowest imports), the time
+from launching Gunicorn to the first served / and /api/realtime, and the
+time from launching the recorder to its first sample on disk.
+
+    python benchmarks/bench_startup.py [runs] [--workers 2] [--preload] [--json]
+"""
+
+import argparse
+import glob
+import http.client
+import json
+import os
+import re
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+IMPORT_TIMER = "import time; t = time.perf_counter(); import {0}; print((time.perf_counter() - t) * 1000)"
+_IMPORTTIME_RE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( +)(\S+)$')
+
+
+def environment(root):
+    return dict(os.environ, MONITOR_HISTORY_DIR=os.path.join(root, 'history'), MONITOR_SHM_DIR=root,
+                MONITOR_SHM_NAME=f"bench-startup-{os.getpid()}", MONITOR_RECORD_DIR=os.path.join(root, 'samples'))
+
+
+def import_ms(module, env):
+    output = subprocess.run([sys.executable, '-c', IMPORT_TIMER.format(module)], cwd=ROOT, env=env,
+                            check=True, capture_output=True, text=True).stdout
+    return float(output.split()[-1])
+
+
+def slowest_imports(module, env, count=8):
+    """[(name, cumulative ms)] of the modules `module` imports directly"""
+    stderr = subprocess.run([sys.executable, '-X', 'importtime', '-c', f"import {module}"], cwd=ROOT, env=env,
+                            check=True, capture_output=True, text=True).stderr
+    # Children are listed before their parent, one level deeper.
+    direct = []
+    for line in stderr.splitlines():
+        match = _IMPORTTIME_RE.match(line)
+        if not match:
+            continue
+        depth = len(match.group(3)) // 2
+        if depth == 0:
+            if match.group(4) == module:
+                break
+            direct = []
+        elif depth == 1:
+            direct.append((match.group(4), int(match.group(2)) / 1000))
+    return sorted(direct, key=lambda item: -item[1])[:count]
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def get_status(port, path):
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+    try:
+        connection.request('GET', path)
+        return connection.getresponse().status
+    finally:
+        connection.close()
+
+
+def wait_for(check, started, timeout=30):
+    while time.perf_counter() - started < timeout:
+        try:
+            if check():
+                return (time.perf_counter() - started) * 1000
+        except OSError:
+            pass
+        time.sleep(0.005)
+    raise SystemExit('timed out waiting for startup')
+
+
+def gunicorn_startup(env, workers, preload):
+    """ms from launch to the first answer, the first 200 for / and for /api/realtime"""
+    port = free_port()
+    started = time.perf_counter()
+    server = subprocess.Popen([sys.executable, '-m', 'gunicorn', '--workers', str(workers),
+                               '--bind', f'127.0.0.1:{port}', *(['--preload'] if preload else []), 'app:app'],
+                              cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        listening = wait_for(lambda: get_status(port, '/api/self') > 0, started)
+        page = wait_for(lambda: get_status(port, '/') == 200, started)
+        realtime = wait_for(lambda: get_status(port, '/api/realtime') == 200, started)
+        return listening, page, realtime
+    finally:
+        server.terminate()
+        server.wait(10)
+
+
+def recorder_startup(env, root):
+    """ms from launching the recorder to its first sample written"""
+    directory = os.path.join(root, f"samples-{time.monotonic_ns()}")
+    started = time.perf_counter()
+    recorder = subprocess.Popen([sys.executable, 'recorder.py', 'record', '--dir', directory,
+                                 '--batch', '1', '--format', 'ndjson'],
+                                cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        return wait_for(lambda: any(os.path.getsize(p) for p in glob.glob(os.path.join(directory, 'samples-*'))),
+                        started)
+    finally:
+        recorder.terminate()
+        recorder.wait(10)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Import time and time to first request')
+    parser.add_argument('runs', nargs='?', type=int, default=5)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--preload', action='store_true', help='import the app once in the Gunicorn master')
+    parser.add_argument('--json', action='store_true', help='one JSON object, for run_all.py')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        env = environment(root)
+        result = {'bench': 'startup'}
+        for module in ('app', 'recorder'):
+            result[f'import_{module}_ms'] = round(statistics.median(import_ms(module, env) for _ in range(args.runs)), 1)
+        runs = [gunicorn_startup(env, args.workers, args.preload) for _ in range(args.runs)]
+        for i, name in enumerate(('listening', 'first_page', 'first_realtime')):
+            result[f'gunicorn_{name}_ms'] = round(statistics.median(run[i] for run in runs), 1)
+        result['recorder_first_sample_ms'] = round(statistics.median(recorder_startup(env, root) for _ in range(args.runs)), 1)
+        slowest = {module: slowest_imports(module, env) for module in ('app', 'recorder')}
+
+    if args.json:
+        print(json.dumps(result))
+        return
+    print(f"median of {args.runs} runs, {args.workers} Gunicorn workers{' (--preload)' if args.preload else ''}")
+    for key, value in result.items():
+        if key != 'bench':
+            print(f"  {key:<28}{value:10.1f}")
+    for module, imports in slowest.items():
+        print(f"\nslowest imports of {module} (cumulative ms, -X importtime):")
+        for name, ms in imports:
+            print(f"  {name:<28}{ms:10.1f}")
+
+
+if __name__ == '__main__':
+    main()
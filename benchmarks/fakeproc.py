@@ -0,0 +1,148 @@
+"""
+Build fake /proc and /sys trees with an arbitrary core count, so collector
+scaling can be measured without the hardware.
+
+The trees are complete enough for the whole sampler: point MONITOR_PROC_ROOT
+and MONITOR_SYS_ROOT at them (psutil follows MONITOR_PROC_ROOT too) and call
+write_system() with a growing tick to make the counters move.
+"""
+
+import os
+import random
+
+CPUINFO_BLOCK = """processor\t: {n}
+vendor_id\t: GenuineIntel
+cpu family\t: 6
+model\t\t: 106
+model name\t: Intel(R) Xeon(R) Platinum 8358 CPU @ 2.60GHz
+stepping\t: 6
+microcode\t: 0xd000390
+cpu MHz\t\t: {mhz:.3f}
+cache size\t: 49152 KB
+physical id\t: 0
+siblings\t: {cores}
+core id\t\t: {n}
+cpu cores\t: {cores}
+apicid\t\t: {n}
+fpu\t\t: yes
+fpu_exception\t: yes
+cpuid level\t: 27
+wp\t\t: yes
+flags\t\t: fpu vme de pse tsc msr pae mce cx8 apic sep mtrr pge mca cmov pat pse36 clflush dts acpi mmx fxsr sse sse2 ss ht tm pbe syscall nx pdpe1gb rdtscp lm constant_tsc art arch_perfmon pebs bts rep_good nopl xtopology nonstop_tsc cpuid aperfmperf pni pclmulqdq dtes64 monitor ds_cpl vmx smx est tm2 ssse3 sdbg fma cx16 xtpr pdcm pcid dca sse4_1 sse4_2 x2apic movbe popcnt tsc_deadline_timer aes xsave avx f16c rdrand lahf_lm abm 3dnowprefetch cpuid_fault epb cat_l3 invpcid_single intel_ppin ssbd mba ibrs ibpb stibp ibrs_enhanced tpr_shadow vnmi flexpriority ept vpid ept_ad fsgsbase tsc_adjust bmi1 avx2 smep bmi2 erms invpcid cqm rdt_a avx512f avx512dq rdseed adx smap avx512ifma clflushopt clwb intel_pt avx512cd sha_ni avx512bw avx512vl xsaveopt xsavec xgetbv1 xsaves cqm_llc cqm_occup_llc cqm_mbm_total cqm_mbm_local split_lock_detect wbnoinvd dtherm ida arat pln pts avx512vbmi umip pku ospke avx512_vbmi2 gfni vaes vpclmulqdq avx512_vnni avx512_bitalg tme avx512_vpopcntdq la57 rdpid fsrm md_clear pconfig flush_l1d arch_capabilities
+bugs\t\t: spectre_v1 spectre_v2 spec_store_bypass swapgs mmio_stale_data eibrs_pbrsb gds bhi
+bogomips\t: 5200.00
+clflush size\t: 64
+cache_alignment\t: 64
+address sizes\t: 46 bits physical, 57 bits virtual
+power management:
+
+"""
+
+
+def write(path, text):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        f.write(text)
+
+
+def build_tree(root, cores, seed=0):
+    """Create <root>/proc and <root>/sys for `cores` logical CPUs; return (proc, sys)."""
+    rng = random.Random(seed)
+    proc_root = os.path.join(root, 'proc')
+    sys_root = os.path.join(root, 'sys')
+    mhz = [rng.uniform(800, 3700) for _ in range(cores)]
+
+    write(os.path.join(proc_root, 'cpuinfo'),
+          ''.join(CPUINFO_BLOCK.format(n=n, mhz=mhz[n], cores=cores) for n in range(cores)))
+    for n in range(cores):
+        base = os.path.join(sys_root, 'devices/system/cpu', f'cpu{n}', 'cpufreq')
+        write(os.path.join(base, 'scaling_cur_freq'), f"{int(mhz[n] * 1000)}\n")
+        write(os.path.join(base, 'cpuinfo_min_freq'), "800000\n")
+        write(os.path.join(base, 'cpuinfo_max_freq'), "3700000\n")
+    write_system(proc_root, cores, seed=seed)
+    return proc_root, sys_root
+
+
+def write_system(proc_root, cores, tick=0, seed=0):
+    """(Re)write the system-wide files the sampler reads (stat, meminfo, diskstats, net/dev,
+    sockstat, tcp, mountinfo) as they would read `tick` seconds in; counters only grow."""
+    rng = random.Random(seed * 1000003 + tick)
+    cpu_lines = []
+    total = [0] * 8
+    for n in range(cores):
+        # user nice system idle iowait irq softirq steal, in ticks; ~30% busy on average
+        busy = rng.randrange(0, 60)
+        row = [tick * 100 * 3 // 10 + busy, 0, tick * 5, tick * 65 + (60 - busy), tick, 0, tick, 0]
+        total = [a + b for a, b in zip(total, row)]
+        cpu_lines.append(f"cpu{n} {' '.join(map(str, row))} 0 0\n")
+    write(os.path.join(proc_root, 'stat'),
+          f"cpu  {' '.join(map(str, total))} 0 0\n" + ''.join(cpu_lines) +
+          "intr 0\nctxt 0\nbtime 1790000000\nprocesses 1000\nprocs_running 2\nprocs_blocked 0\n")
+
+    mem_kb = 4 * 1024 * 1024 * max(1, cores // 4)
+    free_kb = mem_kb // 2 - rng.randrange(mem_kb // 10)
+    write(os.path.join(proc_root, 'meminfo'), ''.join(f"{k}: {v} kB\n" for k, v in (
+        ('MemTotal', mem_kb), ('MemFree', free_kb), ('MemAvailable', free_kb + mem_kb // 8),
+        ('Buffers', mem_kb // 64), ('Cached', mem_kb // 8), ('SwapCached', 0),
+        ('Active', mem_kb // 4), ('Inactive', mem_kb // 8), ('Shmem', mem_kb // 128),
+        ('SReclaimable', mem_kb // 64), ('SwapTotal', 2 * 1024 * 1024), ('SwapFree', 2 * 1024 * 1024 - 4096))))
+    write(os.path.join(proc_root, 'vmstat'), "pswpin 10\npswpout 20\n")
+
+    # "/" on a fake NVMe partition; statvfs still looks at the real "/".
+    write(os.path.join(proc_root, 'self', 'mountinfo'),
+          "22 1 259:2 / / rw,relatime shared:1 - ext4 /dev/nvme0n1p2 rw\n"
+          "23 22 0:21 / /proc rw,nosuid shared:2 - proc proc rw\n")
+    reads, writes = tick * 120, tick * 900
+    write(os.path.join(proc_root, 'diskstats'),
+          f" 259       0 nvme0n1 {reads} 0 {reads * 16} {reads // 4} {writes} 0 {writes * 64} {writes // 2} 0 {tick * 40} {tick * 60} 0 0 0 0\n"
+          f" 259       2 nvme0n1p2 {reads} 0 {reads * 16} {reads // 4} {writes} 0 {writes * 64} {writes // 2} 0 {tick * 40} {tick * 60} 0 0 0 0\n")
+
+    rx, tx = tick * 1_250_000 + rng.randrange(100000), tick * 3_750_000 + rng.randrange(100000)
+    write(os.path.join(proc_root, 'net', 'dev'),
+          "Inter-|   Receive                                                |  Transmit\n"
+          " face |bytes    packets errs drop fifo frame compressed multicast|bytes    packets errs drop fifo colls carrier compressed\n"
+          f"    lo: {tick * 5000} {tick * 50} 0 0 0 0 0 0 {tick * 5000} {tick * 50} 0 0 0 0 0 0\n"
+          f"  eth0: {rx} {rx // 900} 0 0 0 0 0 0 {tx} {tx // 1400} 0 0 0 0 0 0\n")
+
+    connections = 20 * cores
+    write(os.path.join(proc_root, 'net', 'sockstat'),
+          f"sockets: used {connections + 50}\nTCP: inuse {connections} orphan 0 tw {connections // 4} alloc {connections} mem 10\n"
+          "UDP: inuse 4 mem 1\nUDPLITE: inuse 0\nRAW: inuse 0\nFRAG: inuse 0 memory 0\n")
+    write(os.path.join(proc_root, 'net', 'sockstat6'), "TCP6: inuse 8\nUDP6: inuse 2\nUDPLITE6: inuse 0\nRAW6: inuse 0\nFRAG6: inuse 0 memory 0\n")
+    header = "  sl  local_address rem_address   st tx_queue rx_queue tr tm->when retrnsmt   uid  timeout inode\n"
+    write(os.path.join(proc_root, 'net', 'tcp'), header + ''.join(
+        f"{i:4d}: 0100007F:{8000 + i % 100:04X} 0A00000{i % 9}:{40000 + i:04X} {rng.choice(('01', '01', '01', '06', '0A'))} "
+        f"00000000:00000000 00:00000000 00000000  1000        0 {100000 + i} 1 0000000000000000 20 4 30 10 -1\n"
+        for i in range(connections)))
+    write(os.path.join(proc_root, 'net', 'tcp6'), header)
+
+
+STAT_LINE = ("{pid} ({name}) {state} 1 {pid} {pid} 0 -1 4194560 1200 0 0 0 {utime} {stime} 0 0 20 0 "
+             "{threads} 0 {start} 123456789 {rss} 18446744073709551615 1 1 0 0 0 0 0 4096 0 0 0 17 "
+             "{cpu} 0 0 0 0 0 0 0 0 0 0 0 0 0\n")
+
+
+def add_processes(proc_root, count, seed=0, first_pid=1000):
+    """Create <proc_root>/<pid>/stat and cmdline for `count` fake processes; return the pids."""
+    rng = random.Random(seed)
+    pids = list(range(first_pid, first_pid + count))
+    for pid in pids:
+        name = rng.choice(('nginx', 'php-fpm', 'python3', 'postgres', 'node', 'sshd', 'kworker/0:1'))
+        write(os.path.join(proc_root, str(pid), 'stat'), STAT_LINE.format(
+            pid=pid, name=name, state=rng.choice('SSSSSRD'), utime=rng.randrange(10 ** 6),
+            stime=rng.randrange(10 ** 5), threads=rng.randrange(1, 64), start=rng.randrange(10 ** 7),
+            rss=rng.randrange(100, 10 ** 6), cpu=rng.randrange(4)))
+        write(os.path.join(proc_root, str(pid), 'cmdline'), f"/usr/bin/{name}\0--worker\0{pid}\0")
+    return pids
+
+
+def tick_processes(proc_root, pids, seed=0, busy=0.05):
+    """Advance utime of a random `busy` fraction of the processes, as between two scans."""
+    rng = random.Random(seed)
+    for pid in rng.sample(pids, max(1, int(len(pids) * busy))):
+        path = os.path.join(proc_root, str(pid), 'stat')
+        with open(path) as f:
+            head, _, tail = f.read().rpartition(')')
+        fields = tail.split()
+        fields[11] = str(int(fields[11]) + rng.randrange(1, 500))
+        write(path, f"{head}) {' '.join(fields)}\n")
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Pre-deploy performance check: runs bench_collectors.py and bench_load.py
+on fake 4- and 256-core trees, bench_startup.py and bench_report.py, and
+exits 1 if anything is over budget.
+
+Two kinds of limits:
+  * BUDGETS, absolute and generous (a few times what a small VPS measures),
+    so a collector that suddenly scales with the wrong thing fails anywhere;
+  * --baseline FILE, the results of an earlier run on the same machine
+    (written with --save FILE); a metric more than --tolerance slower fails.
+    Baseline values are scaled by how much slower a fixed pure-Python loop
+    runs now than it did then, so a busier machine is not a regression.
+    Tail latencies (p99) are too noisy for that and only have a budget, as
+    has the sketch quantile error.
+
+    python benchmarks/run_all.py --save perf-baseline.json      # on the last good release
+    python benchmarks/run_all.py --baseline perf-baseline.json  # before deploying
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+CORE_COUNTS = (4, 256)
+LOAD_SECONDS = 5
+
+# Microseconds per call.
+COLLECTOR_BUDGETS = {
+    4: {'cpu_freq (sysfs pread)': 50, 'virtual_memory': 500, 'swap_memory': 500, 'disks': 1000,
+        'net': 1000, 'connections (sockstat)': 200, 'tcp_states': 1000, 'processes (500)': 50000},
+    256: {'cpu_freq (sysfs pread)': 2000, 'virtual_memory': 500, 'swap_memory': 500, 'disks': 1000,
+          'net': 1000, 'connections (sockstat)': 200, 'tcp_states': 50000, 'processes (500)': 50000},
+}
+# Milliseconds, for /api/realtime under the default 8 dashboards in --mode client.
+LOAD_BUDGETS = {'realtime_p50_ms': 5, 'realtime_p99_ms': 150, 'page_p50_ms': 20, 'cpu_ms_per_request': 3}
+# Milliseconds from a fresh interpreter or a Gunicorn launch.
+STARTUP_BUDGETS = {'import_app_ms': 1000, 'import_recorder_ms': 300, 'gunicorn_first_page_ms': 3000,
+                   'recorder_first_sample_ms': 2000}
+STARTUP_RUNS = 3
+# /api/report over 30 days (ms), sketch cost per sampler tick (us), worst percentile error (%).
+REPORT_BUDGETS = {'report_30d_ms': 500, 'sketch_record_us': 3000, 'quantile_error_pct': 2.5}
+# Compared with their budget only.
+NO_BASELINE = ('p99', 'error')
+
+
+def run(script, *args):
+    output = subprocess.run([sys.executable, os.path.join(HERE, script), '--json', *args],
+                            check=True, capture_output=True, text=True).stdout
+    return [json.loads(line) for line in output.splitlines() if line.startswith('{')]
+
+
+def collect():
+    """{'<metric>@<cores>': value}, lower is better for all of them"""
+    metrics = {}
+    for result in run('bench_collectors.py', '--cores', ','.join(map(str, CORE_COUNTS))):
+        for name, us in result['us'].items():
+            metrics[f"collector {name} us@{result['cores']}"] = round(us, 2)
+    for cores in CORE_COUNTS:
+        load, = run('bench_load.py', '--cores', str(cores), '--seconds', str(LOAD_SECONDS))
+        realtime, page = load['endpoints']['/api/realtime'], load['endpoints']['/']
+        metrics[f"load realtime_p50_ms@{cores}"] = realtime['p50_ms']
+        metrics[f"load realtime_p99_ms@{cores}"] = realtime['p99_ms']
+        metrics[f"load page_p50_ms@{cores}"] = page['p50_ms']
+        metrics[f"load cpu_ms_per_request@{cores}"] = load['cpu_ms_per_request']
+    startup, = run('bench_startup.py', str(STARTUP_RUNS))
+    for name in STARTUP_BUDGETS:
+        metrics[f"startup {name}@host"] = startup[name]
+    report, = run('bench_report.py')
+    metrics["report report_30d_ms@host"] = report['report_30d_ms']
+    metrics["report quantile_error_pct@host"] = report['quantile_error_pct']
+    for cores, us in report['record_us'].items():
+        metrics[f"report sketch_record_us@{cores}"] = us
+    return metrics
+
+
+def calibrate():
+    """milliseconds for a fixed loop, best of five"""
+    best = float('inf')
+    for _ in range(5):
+        started = time.perf_counter()
+        sum(i * i for i in range(200000))
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+
+def budget_for(metric):
+    kind, rest = metric.split(' ', 1)
+    name, cores = rest.rsplit('@', 1)
+    if kind == 'collector':
+        return COLLECTOR_BUDGETS.get(int(cores), {}).get(name[:-len(' us')])
+    if kind == 'startup':
+        return STARTUP_BUDGETS.get(name)
+    if kind == 'report':
+        return REPORT_BUDGETS.get(name)
+    return LOAD_BUDGETS.get(name)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Fail if the monitor got slower')
+    parser.add_argument('--baseline', help='results of an earlier --save run to compare against')
+    parser.add_argument('--tolerance', type=float, default=1.0, help='allowed slowdown against the baseline (1.0 = twice as slow)')
+    parser.add_argument('--save', help='write this run\'s results here')
+    args = parser.parse_args()
+
+    calibration = calibrate()
+    metrics = collect()
+    calibration = min(calibration, calibrate())
+    baseline, scale = {}, 1.0
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        scale = calibration / baseline.pop('calibration_ms', calibration)
+        print(f"machine speed against the baseline: x{1 / scale:.2f}")
+
+    failures = []
+    print(f"{'metric':<52}{'value':>12}{'budget':>12}{'baseline':>12}")
+    for metric, value in metrics.items():
+        budget = budget_for(metric)
+        previous = baseline.get(metric)
+        if previous is not None:
+            previous = round(previous * scale, 2)
+        verdict = ''
+        if budget is not None and value > budget:
+            verdict = 'OVER BUDGET'
+        elif previous and not any(word in metric for word in NO_BASELINE) and value > previous * (1 + args.tolerance):
+            verdict = f"+{(value / previous - 1) * 100:.0f}%"
+        if verdict:
+            failures.append(metric)
+        print(f"{metric:<52}{value:12.2f}{budget if budget is not None else '-':>12}"
+              f"{previous if previous is not None else '-':>12}  {verdict}")
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(dict(metrics, calibration_ms=round(calibration, 3)), f, indent=1, sort_keys=True)
+    if failures:
+        print(f"\n{len(failures)} regression(s): {', '.join(failures)}")
+        sys.exit(1)
+    print('\nall within budget')
+
+
+if __name__ == '__main__':
+    main()
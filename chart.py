@@ -0,0 +1,139 @@
+"""
+Chart series for /api/chart - a window of one metric reduced on the server
+to what a chart can show.
+
+Multi-column metrics (per core) are reduced across columns first:
+  * all   - every column (small hosts);
+  * bands - min / avg / max over all columns, so a 256-core host draws
+            three lines instead of 256;
+  * topk  - the k columns with the highest mean over the window, plus the
+            mean of the rest.
+auto picks all up to MAX_LINES columns and bands above.
+
+Then the window is reduced to at most `points` points in time: bands by
+their envelope per bucket (min of min, mean of avg, max of max), lines by
+Largest-Triangle-Three-Buckets, which keeps spikes a plain average would
+flatten. All lines of one response share the same timestamps.
+"""
+
+import os
+
+import lazy
+from history import METRICS
+
+# Only needed once a chart is built, so the dashboard renders without numpy.
+np = lazy.module('numpy')
+
+MODES = ('auto', 'all', 'bands', 'topk')
+# More columns than this are drawn as bands by default.
+MAX_LINES = int(os.environ.get('MONITOR_CHART_MAX_LINES', '8'))
+MAX_POINTS = 2000
+
+
+def auto_mode(columns):
+    return 'all' if columns <= MAX_LINES else 'bands'
+
+
+def lttb(x, y, points):
+    """Indices of `points` samples of (x, y) picked by Largest-Triangle-Three-Buckets."""
+    n = len(x)
+    if points >= n or points < 3:
+        return np.arange(n)
+    # Bucket i of the middle points is [edges[i], edges[i + 1]); first and last points are kept.
+    edges = np.linspace(1, n - 1, points - 1).astype(np.int64)
+    chosen = np.empty(points, dtype=np.int64)
+    chosen[0], chosen[-1] = 0, n - 1
+    a = 0
+    for i in range(points - 2):
+        lo, hi = edges[i], edges[i + 1]
+        next_lo, next_hi = (edges[i + 1], edges[i + 2]) if i + 2 < len(edges) else (n - 1, n)
+        avg_x, avg_y = x[next_lo:next_hi].mean(), y[next_lo:next_hi].mean()
+        # Twice the triangle area between the previous pick, each candidate and the next bucket's mean
+        area = np.abs((x[a] - avg_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a]))
+        a = lo + int(area.argmax())
+        chosen[i + 1] = a
+    return chosen
+
+
+def envelope(times, low, mean, high, points):
+    """Bands bucketed to `points`: first time, min of low, mean of mean, max of high per bucket."""
+    n = len(times)
+    if n <= points:
+        return times, low, mean, high
+    starts = np.linspace(0, n, points + 1).astype(np.int64)[:-1]
+    counts = np.diff(np.append(starts, n))
+    return (times[starts], np.minimum.reduceat(low, starts), np.add.reduceat(mean, starts) / counts,
+            np.maximum.reduceat(high, starts))
+
+
+def reduce_columns(values, peaks, mode, k):
+    """[(label, series)] across columns; `peaks` (per-bucket maxima, or None) feed the max band."""
+    columns = values.shape[1]
+    if mode == 'auto':
+        mode = auto_mode(columns)
+    if columns == 1:
+        return 'all', [('value', values[:, 0])]
+    if mode == 'bands':
+        high = (peaks if peaks is not None else values).max(axis=1)
+        return mode, [('min', values.min(axis=1)), ('avg', values.mean(axis=1)), ('max', high)]
+    if mode == 'topk':
+        means = values.mean(axis=0)
+        top = np.argsort(-means, kind='stable')[:k]
+        series = [(str(int(i)), values[:, i]) for i in top]
+        if columns > len(top):
+            rest = (values.sum(axis=1) - values[:, top].sum(axis=1)) / (columns - len(top))
+            series.append(('rest avg', rest))
+        return mode, series
+    return 'all', [(str(i), values[:, i]) for i in range(columns)]
+
+
+def build(times, values, peaks=None, mode='auto', k=4, points=300):
+    """{'mode', 't', 'series': [{'label', 'data'}]} from times (s) x values (rows x columns)"""
+    if not len(times):
+        return {'mode': mode, 't': [], 'series': []}
+    times = np.asarray(times, dtype=np.float64)
+    values = np.asarray(values, dtype=np.float64).reshape(len(times), -1)
+    if peaks is not None:
+        peaks = np.asarray(peaks, dtype=np.float64).reshape(len(times), -1)
+    mode, series = reduce_columns(values, peaks, mode, k)
+    if mode == 'bands':
+        times, low, mean, high = envelope(times, series[0][1], series[1][1], series[2][1], points)
+        series = [('min', low), ('avg', mean), ('max', high)]
+    elif len(times) > points:
+        # One set of timestamps for every line, picked on their mean.
+        driver = series[0][1] if len(series) == 1 else np.mean([s for _, s in series], axis=0)
+        chosen = lttb(times, driver, points)
+        times = times[chosen]
+        series = [(label, s[chosen]) for label, s in series]
+    return {
+        'mode': mode,
+        't': np.round(times, 3).tolist(),
+        'series': [{'label': label, 'data': np.round(s, 2).tolist()} for label, s in series],
+    }
+
+
+def from_memory(buffer, start, end, **options):
+    """Chart of the in-memory ring buffer's raw samples between start and end (s)."""
+    times, values = buffer.window(int(start * 1000), int(end * 1000))
+    return dict(build(times / 1000, values, **options), source='memory')
+
+
+def from_history(history, metric, start, end, step, **options):
+    """Chart of the on-disk roll-ups, bucketed to `step` seconds."""
+    result = history.query(metric, int(start), int(end), step)
+    return dict(build(result['t'], result['avg'], result['max'], **options), source='history', step=result['step'])
+
+
+def chart(metric, start, end, memory=None, history=None, step=None, **options):
+    """From the in-memory samples when they cover the window and no step is asked for, else from history."""
+    if metric not in METRICS:
+        raise KeyError(metric)
+    buffer = memory.get(metric) if memory is not None and not step else None
+    if buffer is not None and buffer.count and buffer.times[(buffer.head - buffer.count) % buffer.capacity] <= start * 1000:
+        return from_memory(buffer, start, end, **options)
+    if history is None:
+        if buffer is not None:
+            return from_memory(buffer, start, end, **options)
+        return None
+    points = options.get('points', 300)
+    return from_history(history, metric, start, end, step or max(1, int(np.ceil((end - start) / points))), **options)
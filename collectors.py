@@ -0,0 +1,48 @@
+"""
+System collectors - raw readings from psutil and /proc
+
+psutil is the lazily imported procfs.psutil, so importing this module is cheap.
+"""
+
+import datetime
+
+
+def get_uptime(boot_timestamp=None):
+    """Get system uptime"""
+    if boot_timestamp is None:
+        from procfs import psutil
+        boot_timestamp = psutil.boot_time()
+    boot_time = datetime.datetime.fromtimestamp(boot_timestamp)
+    now = datetime.datetime.now()
+    delta = now - boot_time
+    days = delta.days
+    hours, remainder = divmod(delta.seconds, 3600)
+    minutes, _ = divmod(remainder, 60)
+    return f"{days}d {hours}h {minutes}m"
+
+def to_mhz(value):
+    """Normalize frequency to MHz. psutil may return GHz (< 100) or MHz (>= 100)."""
+    if value < 100:
+        return round(value * 1000, 0)
+    return round(value, 0)
+
+def get_cpu_freq_mhz(path='/proc/cpuinfo'):
+    """Read per-core MHz from /proc/cpuinfo for accuracy."""
+    freqs = []
+    try:
+        with open(path, 'r') as f:
+            for line in f:
+                if line.startswith('cpu MHz'):
+                    mhz = float(line.split(':')[1].strip())
+                    freqs.append(round(mhz, 0))
+    except:
+        pass
+    return freqs
+
+def get_freq_range():
+    """Return (min, max) CPU frequency in MHz, with sane defaults."""
+    from procfs import psutil
+    cpu_freq = psutil.cpu_freq()
+    if not cpu_freq:
+        return 1200, 3700
+    return to_mhz(cpu_freq.min), to_mhz(cpu_freq.max)
@@ -0,0 +1,89 @@
+"""
+Compact /api/realtime representation.
+
+Fields that never change (core count, frequency range, memory total, mount
+and interface lists, server UTC offset) are sent once under "static". Per-core values are packed as
+base64 little-endian float32 arrays. With ?since=<seq>, only the cores whose
+value changed since that snapshot are sent, as a uint16 index array plus
+their values (or the whole array when most cores changed).
+"""
+
+import base64
+import sys
+import time
+from array import array
+
+FORMAT_VERSION = 1
+MEDIA_TYPE = 'application/vnd.monitor.compact+json'
+
+# Per-core arrays: compact key -> snapshot field
+CORE_FIELDS = (('pc', 'cpu_percent_per_core'), ('mhz', 'core_mhz'))
+
+# Per-mount row in "dk", in this order; the mount names are part of "static".
+DISK_FIELDS = ('percent', 'read_bps', 'write_bps', 'read_iops', 'write_iops', 'await_ms', 'util')
+
+# Per-interface row in "nk", in this order; the interface names are part of "static".
+NET_FIELDS = ('rx_bps', 'tx_bps', 'rx_pps', 'tx_pps', 'rx_errs', 'tx_errs', 'rx_drop', 'tx_drop')
+
+
+def _pack(typecode, values):
+    packed = array(typecode, values)
+    if sys.byteorder != 'little':
+        packed.byteswap()
+    return base64.b64encode(packed.tobytes()).decode('ascii')
+
+def pack_f32(values):
+    return _pack('f', values)
+
+def pack_u16(values):
+    return _pack('H', values)
+
+def static_part(snapshot):
+    data = snapshot.data
+    disks = data['disks']
+    return {
+        'cores': len(data['core_mhz']),
+        'freq_min': data['cpu_freq_min'],
+        'freq_max': data['cpu_freq_max'],
+        'mem_total': data['mem_total'],
+        'mounts': [{'mount': m, 'device': d, 'fstype': f, 'total': t} for m, d, f, t in zip(
+            disks['mount'], disks['device'], disks['fstype'], disks['total'])],
+        'ifaces': data['net']['iface'],
+        'tz': -(time.altzone if time.localtime(snapshot.ts).tm_isdst > 0 else time.timezone),
+    }
+
+def compact_payload(snapshot, base=None):
+    """Full document, or a delta against `base` (an older Snapshot) when possible."""
+    data = snapshot.data
+    doc = {
+        'v': FORMAT_VERSION,
+        'seq': snapshot.seq,
+        't': round(snapshot.ts, 3),
+        'cpu': data['cpu_percent'],
+        'fa': data['cpu_freq_avg'],
+        'mem': [data['mem_percent'], data['mem_used']],
+        'dio': [data['disk_read_rate'], data['disk_write_rate']],
+        'dk': [list(row) for row in zip(*(data['disks'][field] for field in DISK_FIELDS))],
+        'nio': [data['net_sent_rate'], data['net_recv_rate'], data['net_sent'], data['net_recv']],
+        'nk': [list(row) for row in zip(*(data['net'][field] for field in NET_FIELDS))],
+        'al': [[a['rule'], a['item'], a['value']] for a in (data.get('alerts') or {}).get('alerts', ())
+               if a['state'] == 'firing'],
+    }
+    static = static_part(snapshot)
+    if base is None or static_part(base) != static:
+        doc['static'] = static
+        for key, field in CORE_FIELDS:
+            doc[key] = pack_f32(data[field])
+        return doc
+
+    doc['base'] = base.seq
+    for key, field in CORE_FIELDS:
+        new, old = data[field], base.data[field]
+        changed = [i for i, (a, b) in enumerate(zip(new, old)) if a != b]
+        if len(changed) * 6 >= len(new) * 4:
+            # Index + value costs 6 bytes a core; past 2/3 changed the whole array is smaller.
+            doc[key] = pack_f32(new)
+        else:
+            doc[key + '_i'] = pack_u16(changed)
+            doc[key] = pack_f32([new[i] for i in changed])
+    return doc
@@ -0,0 +1,176 @@
+"""
+Mounted filesystems: usage per mount and I/O rates per backing device.
+
+The mount table is parsed from /proc/self/mountinfo once and again only
+when the kernel flags a change on it (POLLPRI/POLLERR). Per tick the rates
+of every device come from one pread of /proc/diskstats on a persistent fd,
+and usage from one statvfs per mount.
+"""
+
+import fnmatch
+import os
+import select
+
+from procfs import PROC_ROOT, column_rows, pread_text
+
+# Mountpoints to leave out, as shell patterns (e.g. "/snap/*,/boot/efi").
+DISK_IGNORE = [p for p in os.environ.get('MONITOR_DISK_IGNORE', '').replace(',', ' ').split() if p]
+
+# Filesystems on local block devices. Network filesystems are left out on
+# purpose: statvfs on a dead NFS server blocks the sampler.
+LOCAL_FILESYSTEMS = {
+    'ext2', 'ext3', 'ext4', 'xfs', 'btrfs', 'zfs', 'f2fs', 'jfs', 'reiserfs',
+    'vfat', 'exfat', 'ntfs', 'ntfs3', 'bcachefs',
+}
+
+SECTOR_SIZE = 512
+
+# Columns of the per-mount data in a snapshot, in order.
+COLUMNS = ('mount', 'device', 'fstype', 'total', 'used', 'free', 'percent',
+           'read_bps', 'write_bps', 'read_iops', 'write_iops', 'await_ms', 'util')
+
+
+def _unescape(field):
+    # mountinfo escapes space, tab, newline and backslash as \ooo
+    if '\\' not in field:
+        return field
+    return field.encode().decode('unicode_escape').encode('latin-1').decode(errors='replace')
+
+def parse_mountinfo(text, ignore=()):
+    """[(mountpoint, (major, minor), fstype, source)] of local filesystems, one per device.
+
+    "/" is always kept. A device mounted more than once (bind mounts) is
+    reported at its first mountpoint.
+    """
+    mounts, seen = [], set()
+    for line in text.splitlines():
+        fields = line.split()
+        try:
+            sep = fields.index('-', 6)
+            major, minor = fields[2].split(':')
+            device = (int(major), int(minor))
+            mountpoint = _unescape(fields[4])
+            fstype, source = fields[sep + 1], fields[sep + 2]
+        except (ValueError, IndexError):
+            continue
+        if mountpoint != '/':
+            if fstype not in LOCAL_FILESYSTEMS or device in seen:
+                continue
+            if any(fnmatch.fnmatchcase(mountpoint, p) for p in ignore):
+                continue
+        seen.add(device)
+        mounts.append((mountpoint, device, fstype, source))
+    # "/" first, then the rest by path
+    mounts.sort(key=lambda m: (m[0] != '/', m[0]))
+    return mounts
+
+def parse_diskstats(text):
+    """{(major, minor): (name, reads, sectors read, ms reading, writes, sectors written, ms writing, ms doing io)}"""
+    stats = {}
+    for line in text.splitlines():
+        fields = line.split()
+        if len(fields) < 14:
+            continue
+        try:
+            stats[(int(fields[0]), int(fields[1]))] = (
+                fields[2], int(fields[3]), int(fields[5]), int(fields[6]),
+                int(fields[7]), int(fields[9]), int(fields[10]), int(fields[12]))
+        except ValueError:
+            continue
+    return stats
+
+
+class DiskCollector:
+    """Per-mount usage and per-device I/O rates, as columns (see COLUMNS)."""
+
+    def __init__(self, proc_root=PROC_ROOT, ignore=DISK_IGNORE):
+        self.ignore = ignore
+        self.mounts = []
+        self._prev = None       # (monotonic time, parsed diskstats)
+        self._mountinfo_fd = self._open(os.path.join(proc_root, 'self/mountinfo'))
+        self._diskstats_fd = self._open(os.path.join(proc_root, 'diskstats'))
+        self._poll = None
+        if self._mountinfo_fd is not None:
+            self._poll = select.poll()
+            # The kernel raises POLLPRI|POLLERR on this fd whenever the mount table changes.
+            self._poll.register(self._mountinfo_fd, select.POLLPRI | select.POLLERR)
+        self._load_mounts()
+
+    @staticmethod
+    def _open(path):
+        try:
+            return os.open(path, os.O_RDONLY)
+        except OSError:
+            return None
+
+    def _load_mounts(self):
+        if self._mountinfo_fd is None:
+            self.mounts = [('/', (0, 0), '', '')]
+            return
+        self.mounts = parse_mountinfo(pread_text(self._mountinfo_fd), self.ignore)
+
+    def refresh_mounts(self):
+        """Re-read the mount table if it changed since the last call; True if it did."""
+        if self._poll is None or not self._poll.poll(0):
+            return False
+        self._load_mounts()
+        return True
+
+    def sample(self, now):
+        """Columns for every mount; rates are per second since the previous sample."""
+        self.refresh_mounts()
+        stats = parse_diskstats(pread_text(self._diskstats_fd)) if self._diskstats_fd is not None else {}
+        prev, self._prev = self._prev, (now, stats)
+        elapsed = now - prev[0] if prev is not None else 0
+
+        columns = {name: [] for name in COLUMNS}
+        for mountpoint, device, fstype, source in self.mounts:
+            try:
+                st = os.statvfs(mountpoint)
+            except OSError:
+                continue
+            total = st.f_blocks * st.f_frsize
+            free = st.f_bavail * st.f_frsize
+            used = (st.f_blocks - st.f_bfree) * st.f_frsize
+            # Same definition as psutil.disk_usage / df: the root reserve is not "free".
+            percent = round(used / (used + free) * 100, 1) if used + free else 0.0
+            current = stats.get(device)
+            rates = _rates(current, prev[1].get(device) if prev else None, elapsed)
+            columns['mount'].append(mountpoint)
+            columns['device'].append(current[0] if current else source)
+            columns['fstype'].append(fstype)
+            columns['total'].append(total)
+            columns['used'].append(used)
+            columns['free'].append(free)
+            columns['percent'].append(percent)
+            for name, value in zip(COLUMNS[7:], rates):
+                columns[name].append(value)
+        return columns
+
+    def close(self):
+        for fd in (self._mountinfo_fd, self._diskstats_fd):
+            if fd is not None:
+                os.close(fd)
+        self._mountinfo_fd = self._diskstats_fd = self._poll = None
+
+
+def as_rows(columns):
+    """The per-mount columns of a snapshot as one dict per mount"""
+    return column_rows(columns, COLUMNS)
+
+def _rates(current, previous, elapsed):
+    """(read B/s, write B/s, read IOPS, write IOPS, await ms, util %) between two diskstats rows"""
+    if current is None or previous is None or elapsed <= 0:
+        return 0.0, 0.0, 0.0, 0.0, 0.0, 0.0
+    # A counter that went backwards means the device was re-created; count it as idle.
+    d = [max(0, a - b) for a, b in zip(current[1:], previous[1:])]
+    reads, sectors_read, ms_reading, writes, sectors_written, ms_writing, ms_io = d
+    ios = reads + writes
+    return (
+        round(sectors_read * SECTOR_SIZE / elapsed, 1),
+        round(sectors_written * SECTOR_SIZE / elapsed, 1),
+        round(reads / elapsed, 1),
+        round(writes / elapsed, 1),
+        round((ms_reading + ms_writing) / ios, 2) if ios else 0.0,
+        round(min(100.0, ms_io / (elapsed * 10)), 1),
+    )
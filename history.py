@@ -0,0 +1,296 @@
+"""
+Persistent metric history - fixed-size mmap'd ring files with roll-up tiers.
+
+Every metric has one ring file per tier. A record is the bucket start time
+followed by the average and the maximum of each column over the bucket, and
+its slot is (bucket_start // step) % capacity, so a range query touches
+only the slots of that range and disk use never grows.
+"""
+
+import mmap
+import os
+import struct
+import threading
+import time
+
+HISTORY_DIR = os.environ.get(
+    'MONITOR_HISTORY_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'history'))
+
+# (name, bucket seconds, buckets kept)
+TIERS = (
+    ('raw', 1, 3600),       # 1 s for 1 hour
+    ('10s', 10, 8640),      # 10 s for 1 day
+    ('1m', 60, 43200),      # 1 min for 30 days
+)
+
+# metric name -> columns taken from a sampler snapshot
+METRICS = {
+    'cpu_percent': lambda d: [d['cpu_percent']],
+    'cpu_core': lambda d: d['cpu_percent_per_core'],
+    'core_mhz': lambda d: d['core_mhz'],
+    'mem_percent': lambda d: [d['mem_percent']],
+    'swap_percent': lambda d: [d['swap_percent']],
+    'disk_percent': lambda d: [d['disk_percent']],
+    'disk_read_rate': lambda d: [d['disk_read_rate']],
+    'disk_write_rate': lambda d: [d['disk_write_rate']],
+    'net_sent_rate': lambda d: [d['net_sent_rate']],
+    'net_recv_rate': lambda d: [d['net_recv_rate']],
+}
+
+MAGIC = b'MONRING1'
+HEADER = struct.Struct('<8sIII')   # magic, width, step, capacity
+# Start of the newest bucket written (0 = not known, files from older versions), in the header padding.
+NEWEST = struct.Struct('<q')
+NEWEST_OFFSET = 24
+HEADER_SIZE = 64
+
+
+def ensure_file(path, header, size):
+    """Make `path` a `size`-byte file starting with `header`, keeping it if it already is one.
+
+    A missing file or one with another layout (e.g. core count) starts over. It is
+    replaced rather than truncated because other workers may still map the old one.
+    """
+    try:
+        with open(path, 'rb') as f:
+            if f.read(len(header)) == header and os.fstat(f.fileno()).st_size == size:
+                return
+    except OSError:
+        pass
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, 'wb') as f:
+        f.write(header)
+        f.truncate(size)
+    os.replace(tmp, path)
+
+
+class RingFile:
+    """One metric x tier: `capacity` fixed-width records in a memory-mapped file."""
+
+    magic = MAGIC
+
+    def __init__(self, path, width, step, capacity):
+        self.path = path
+        self.width = width
+        self.step = step
+        self.capacity = capacity
+        self.record = struct.Struct(self.layout(width))
+        size = HEADER_SIZE + capacity * self.record.size
+        ensure_file(path, HEADER.pack(self.magic, width, step, capacity), size)
+        with open(path, 'r+b') as f:
+            self.inode = os.fstat(f.fileno()).st_ino
+            self.map = mmap.mmap(f.fileno(), size)
+
+    @classmethod
+    def open_existing(cls, path):
+        with open(path, 'rb') as f:
+            magic, width, step, capacity = HEADER.unpack(f.read(HEADER.size))
+        if magic != cls.magic:
+            raise ValueError(f"{path}: not a {cls.__name__} file")
+        return cls(path, width, step, capacity)
+
+    @staticmethod
+    def layout(width):
+        """struct format of one record: bucket start, then avg and max per column"""
+        return f'<q{2 * width}f'
+
+    def _offset(self, ts):
+        return HEADER_SIZE + (ts // self.step) % self.capacity * self.record.size
+
+    def newest(self):
+        return NEWEST.unpack_from(self.map, NEWEST_OFFSET)[0]
+
+    def _stored(self, ts):
+        if ts > self.newest():
+            NEWEST.pack_into(self.map, NEWEST_OFFSET, ts)
+
+    def write(self, ts, avg, peak):
+        self.record.pack_into(self.map, self._offset(ts), ts, *avg, *peak)
+        self._stored(ts)
+
+    def records(self, start, end):
+        """Yield the raw record tuples of stored buckets with start <= ts <= end."""
+        start = max(start - start % self.step, end - end % self.step - (self.capacity - 1) * self.step)
+        for ts in range(start, end + 1, self.step):
+            values = self.record.unpack_from(self.map, self._offset(ts))
+            if values[0] == ts:
+                yield values
+
+    def read(self, start, end):
+        """Yield (ts, avg, max) for stored buckets with start <= ts <= end."""
+        w = self.width
+        for values in self.records(start, end):
+            yield values[0], values[1:1 + w], values[1 + w:]
+
+    def close(self):
+        self.map.close()
+
+
+class Bucket:
+    """Running avg/max of one tier's current bucket, O(width) memory."""
+
+    __slots__ = ('start', 'sums', 'peaks', 'count')
+
+    def __init__(self, start, width):
+        self.start = start
+        self.sums = [0.0] * width
+        self.peaks = [float('-inf')] * width
+        self.count = 0
+
+    def add(self, values):
+        sums, peaks = self.sums, self.peaks
+        for i, v in enumerate(values):
+            sums[i] += v
+            if v > peaks[i]:
+                peaks[i] = v
+        self.count += 1
+
+    def averages(self):
+        return [s / self.count for s in self.sums]
+
+
+class RingStore:
+    """Ring files of `ring_class` for every metric/tier under `directory`."""
+
+    ring_class = RingFile
+    suffix = 'ring'
+
+    def __init__(self, directory, tiers):
+        self.directory = directory
+        self.tiers = tiers
+        self._rings = {}
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, metric, tier):
+        return os.path.join(self.directory, f"{metric}.{tier}.{self.suffix}")
+
+    def _ring(self, metric, tier, width=None):
+        """Ring for writing (width given) or reading, which follows files another process replaced."""
+        key = (metric, tier[0])
+        ring = self._rings.get(key)
+        if width is None:
+            path = self._path(metric, tier[0])
+            try:
+                inode = os.stat(path).st_ino
+            except OSError:
+                return None
+            if ring is not None and ring.inode == inode:
+                return ring
+        elif ring is not None and ring.width == width:
+            return ring
+        if ring is not None:
+            ring.close()
+        if width is None:
+            ring = self.ring_class.open_existing(path)
+        else:
+            ring = self.ring_class(self._path(metric, tier[0]), width, tier[1], tier[2])
+        self._rings[key] = ring
+        return ring
+
+    def pick_tier(self, metric, start, step, now=None):
+        """Finest tier of `metric` that still covers `start` and is not finer than `step`; call with the lock held.
+
+        Retention counts back from the newest bucket the tier holds, so a replayed
+        recording from days ago still gets its 1 s data; from `now` if that is unknown.
+        """
+        now = time.time() if now is None else now
+        covering = []
+        for t in self.tiers:
+            ring = self._ring(metric, t)
+            newest = (ring.newest() if ring is not None else 0) or int(now) - int(now) % t[1]
+            # Whole buckets, one bucket of slack: a window of exactly a tier's retention,
+            # taken a moment before `now`, still gets that tier.
+            if int(start) - int(start) % t[1] >= newest - t[1] * t[2]:
+                covering.append(t)
+        covering = covering or [self.tiers[-1]]
+        fitting = [t for t in covering if t[1] <= step] if step else []
+        return fitting[-1] if fitting else covering[0]
+
+    def close(self):
+        with self._lock:
+            for ring in self._rings.values():
+                ring.close()
+            self._rings.clear()
+
+
+class HistoryStore(RingStore):
+    """Ring files for every metric/tier under `directory`; bounded whatever the uptime.
+
+    `sketches` holds the quantile roll-ups of the same samples (sketches.py).
+    """
+
+    def __init__(self, directory=HISTORY_DIR, tiers=TIERS):
+        super().__init__(directory, tiers)
+        self._buckets = {}
+        # Imported here: sketches.py builds on RingFile and RingStore above.
+        from sketches import SketchStore
+        self.sketches = SketchStore(directory)
+
+    def record(self, ts, data):
+        """Fold one sampler snapshot into every tier; a bucket is written when it closes."""
+        self.sketches.record(ts, data)
+        ts = int(ts)
+        with self._lock:
+            for metric, columns in METRICS.items():
+                try:
+                    values = columns(data)
+                except KeyError:
+                    continue
+                width = len(values)
+                if not width:
+                    continue
+                for tier in self.tiers:
+                    start = ts - ts % tier[1]
+                    bucket = self._buckets.get((metric, tier[0]))
+                    if bucket is None or len(bucket.sums) != width:
+                        bucket = self._buckets[(metric, tier[0])] = Bucket(start, width)
+                    elif bucket.start != start:
+                        self._ring(metric, tier, width).write(bucket.start, bucket.averages(), bucket.peaks)
+                        bucket = self._buckets[(metric, tier[0])] = Bucket(start, width)
+                    bucket.add(values)
+
+    def flush(self):
+        """Write every tier's open bucket as it stands (end of a replay, shutdown)."""
+        self.sketches.flush()
+        with self._lock:
+            for (metric, name), bucket in self._buckets.items():
+                if bucket.count:
+                    tier = next(t for t in self.tiers if t[0] == name)
+                    self._ring(metric, tier, len(bucket.sums)).write(bucket.start, bucket.averages(), bucket.peaks)
+
+    def query(self, metric, start, end, step=None):
+        """Return {'tier', 'step', 't', 'avg', 'max'} for start..end, re-bucketed to `step`."""
+        if metric not in METRICS:
+            raise KeyError(metric)
+        with self._lock:
+            tier = self.pick_tier(metric, start, step)
+            step = max(step or tier[1], tier[1])
+            ring = self._ring(metric, tier)
+            rows = list(ring.read(int(start), int(end))) if ring is not None else []
+
+        times, avgs, peaks = [], [], []
+        group, group_start = [], None
+        for row in rows:
+            bucket = row[0] - row[0] % step
+            if group and bucket != group_start:
+                _emit(group, group_start, times, avgs, peaks)
+                group = []
+            group_start = bucket
+            group.append(row)
+        if group:
+            _emit(group, group_start, times, avgs, peaks)
+        return {'tier': tier[0], 'step': step, 't': times, 'avg': avgs, 'max': peaks}
+
+    def close(self):
+        self.sketches.close()
+        super().close()
+
+
+def _emit(group, start, times, avgs, peaks):
+    width = len(group[0][1])
+    avg = [round(sum(row[1][i] for row in group) / len(group), 2) for i in range(width)]
+    peak = [round(max(row[2][i] for row in group), 2) for i in range(width)]
+    times.append(start)
+    avgs.append(avg[0] if width == 1 else avg)
+    peaks.append(peak[0] if width == 1 else peak)
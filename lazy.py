@@ -0,0 +1,50 @@
+"""
+Modules imported on first use.
+
+module('aggregator') returns a stand-in that imports the real module the
+first time one of its attributes is looked up, so a process that never
+touches an optional subsystem (the fleet aggregator, the Prometheus
+exporter, psutil in workers that only follow the producer) never pays for
+loading it. load('disks:DiskCollector') imports and returns one attribute,
+for registries of factories.
+"""
+
+import importlib
+import threading
+
+_lock = threading.Lock()
+
+
+class LazyModule:
+    """Imports `name` on the first attribute lookup, then calls setup(module) once."""
+
+    def __init__(self, name, setup=None):
+        self._name = name
+        self._setup = setup
+        self._module = None
+
+    def _load(self):
+        with _lock:
+            if self._module is None:
+                module = importlib.import_module(self._name)
+                if self._setup is not None:
+                    self._setup(module)
+                self._module = module
+        return self._module
+
+    def __getattr__(self, attr):
+        # Only called for names not set in __init__, i.e. the module's own.
+        return getattr(self._module or self._load(), attr)
+
+    def __repr__(self):
+        state = 'loaded' if self._module is not None else 'not loaded'
+        return f"<lazy module {self._name!r} ({state})>"
+
+
+def module(name, setup=None):
+    return LazyModule(name, setup)
+
+def load(spec):
+    """'module:attribute' -> the attribute, importing the module now"""
+    name, _, attr = spec.partition(':')
+    return getattr(importlib.import_module(name), attr)
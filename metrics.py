@@ -0,0 +1,133 @@
+"""
+Prometheus text exposition of a sampler snapshot.
+
+The text is rendered once per snapshot and cached on it, so scrapes cost a
+dictionary lookup no matter how many scrapers hit /metrics or how often.
+"""
+
+import disks
+import network
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# name -> (type, help)
+FAMILIES = {
+    'monitor_cpu_usage_percent': ('gauge', 'CPU usage since the previous sample.'),
+    'monitor_cpu_core_usage_percent': ('gauge', 'Per-core CPU usage since the previous sample.'),
+    'monitor_cpu_core_frequency_mhz': ('gauge', 'Per-core current frequency.'),
+    'monitor_cpu_frequency_min_mhz': ('gauge', 'Minimum CPU frequency.'),
+    'monitor_cpu_frequency_max_mhz': ('gauge', 'Maximum CPU frequency.'),
+    'monitor_load_average': ('gauge', 'System load average.'),
+    'monitor_memory_used_bytes': ('gauge', 'Used memory.'),
+    'monitor_memory_available_bytes': ('gauge', 'Available memory.'),
+    'monitor_memory_total_bytes': ('gauge', 'Total memory.'),
+    'monitor_memory_usage_percent': ('gauge', 'Memory usage.'),
+    'monitor_swap_used_bytes': ('gauge', 'Used swap.'),
+    'monitor_swap_total_bytes': ('gauge', 'Total swap.'),
+    'monitor_swap_usage_percent': ('gauge', 'Swap usage.'),
+    'monitor_disk_used_bytes': ('gauge', 'Used space of the filesystem.'),
+    'monitor_disk_free_bytes': ('gauge', 'Free space of the filesystem.'),
+    'monitor_disk_total_bytes': ('gauge', 'Size of the filesystem.'),
+    'monitor_disk_usage_percent': ('gauge', 'Filesystem usage.'),
+    'monitor_disk_read_bytes_per_second': ('gauge', 'Bytes read from the device since the previous sample.'),
+    'monitor_disk_written_bytes_per_second': ('gauge', 'Bytes written to the device since the previous sample.'),
+    'monitor_disk_reads_per_second': ('gauge', 'Read operations completed since the previous sample.'),
+    'monitor_disk_writes_per_second': ('gauge', 'Write operations completed since the previous sample.'),
+    'monitor_disk_await_milliseconds': ('gauge', 'Average time per I/O operation since the previous sample.'),
+    'monitor_disk_utilization_percent': ('gauge', 'Share of time the device was busy since the previous sample.'),
+    'monitor_network_sent_bytes_total': ('counter', 'Bytes sent on all monitored interfaces.'),
+    'monitor_network_received_bytes_total': ('counter', 'Bytes received on all monitored interfaces.'),
+    'monitor_network_sent_bytes_per_second': ('gauge', 'Send rate since the previous sample.'),
+    'monitor_network_received_bytes_per_second': ('gauge', 'Receive rate since the previous sample.'),
+    'monitor_network_interface_received_bytes_total': ('counter', 'Bytes received on the interface.'),
+    'monitor_network_interface_sent_bytes_total': ('counter', 'Bytes sent on the interface.'),
+    'monitor_network_interface_received_bytes_per_second': ('gauge', 'Receive rate of the interface.'),
+    'monitor_network_interface_sent_bytes_per_second': ('gauge', 'Send rate of the interface.'),
+    'monitor_network_interface_received_packets_per_second': ('gauge', 'Packets received per second.'),
+    'monitor_network_interface_sent_packets_per_second': ('gauge', 'Packets sent per second.'),
+    'monitor_network_interface_errors_per_second': ('gauge', 'Receive/transmit errors per second.'),
+    'monitor_network_interface_drops_per_second': ('gauge', 'Receive/transmit drops per second.'),
+    'monitor_connections': ('gauge', 'inet sockets in use (TCP incl. TIME_WAIT, UDP).'),
+    'monitor_tcp_connections': ('gauge', 'TCP sockets by state.'),
+    'monitor_processes': ('gauge', 'Number of processes.'),
+    'monitor_boot_time_seconds': ('gauge', 'System boot time, unix seconds.'),
+    'monitor_sample_timestamp_seconds': ('gauge', 'When this sample was taken, unix seconds.'),
+}
+
+# "# HELP/# TYPE" headers never change; build them once.
+HEADERS = {
+    name: f"# HELP {name} {help_text}\n# TYPE {name} {kind}\n"
+    for name, (kind, help_text) in FAMILIES.items()
+}
+
+
+def _escape(value):
+    """Label value escaped as the text format requires: backslash, double quote, newline"""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in labels) + '}'
+
+def render_metrics(snapshot):
+    """Prometheus text for one snapshot"""
+    data = snapshot.data
+    samples = {name: [] for name in FAMILIES}
+
+    def add(name, value, *labels):
+        samples[name].append(f"{name}{_labels(labels)} {value}\n")
+
+    add('monitor_cpu_usage_percent', data['cpu_percent'])
+    for core, value in enumerate(data['cpu_percent_per_core']):
+        add('monitor_cpu_core_usage_percent', value, ('core', core))
+    for core, value in enumerate(data['core_mhz']):
+        add('monitor_cpu_core_frequency_mhz', value, ('core', core))
+    add('monitor_cpu_frequency_min_mhz', data['cpu_freq_min'])
+    add('monitor_cpu_frequency_max_mhz', data['cpu_freq_max'])
+    for period, value in zip(('1m', '5m', '15m'), data['load_avg']):
+        add('monitor_load_average', value, ('period', period))
+    add('monitor_memory_used_bytes', data['mem_used'])
+    add('monitor_memory_available_bytes', data['mem_available'])
+    add('monitor_memory_total_bytes', data['mem_total'])
+    add('monitor_memory_usage_percent', data['mem_percent'])
+    add('monitor_swap_used_bytes', data['swap_used'])
+    add('monitor_swap_total_bytes', data['swap_total'])
+    add('monitor_swap_usage_percent', data['swap_percent'])
+    for disk in disks.as_rows(data['disks']):
+        labels = (('mountpoint', disk['mount']), ('device', disk['device']))
+        add('monitor_disk_used_bytes', disk['used'], *labels)
+        add('monitor_disk_free_bytes', disk['free'], *labels)
+        add('monitor_disk_total_bytes', disk['total'], *labels)
+        add('monitor_disk_usage_percent', disk['percent'], *labels)
+        add('monitor_disk_read_bytes_per_second', disk['read_bps'], *labels)
+        add('monitor_disk_written_bytes_per_second', disk['write_bps'], *labels)
+        add('monitor_disk_reads_per_second', disk['read_iops'], *labels)
+        add('monitor_disk_writes_per_second', disk['write_iops'], *labels)
+        add('monitor_disk_await_milliseconds', disk['await_ms'], *labels)
+        add('monitor_disk_utilization_percent', disk['util'], *labels)
+    add('monitor_network_sent_bytes_total', data['net_sent'])
+    add('monitor_network_received_bytes_total', data['net_recv'])
+    add('monitor_network_sent_bytes_per_second', data['net_sent_rate'])
+    add('monitor_network_received_bytes_per_second', data['net_recv_rate'])
+    for nic in network.as_rows(data['net']):
+        iface = ('interface', nic['iface'])
+        add('monitor_network_interface_received_bytes_total', nic['rx_bytes'], iface)
+        add('monitor_network_interface_sent_bytes_total', nic['tx_bytes'], iface)
+        add('monitor_network_interface_received_bytes_per_second', nic['rx_bps'], iface)
+        add('monitor_network_interface_sent_bytes_per_second', nic['tx_bps'], iface)
+        add('monitor_network_interface_received_packets_per_second', nic['rx_pps'], iface)
+        add('monitor_network_interface_sent_packets_per_second', nic['tx_pps'], iface)
+        add('monitor_network_interface_errors_per_second', nic['rx_errs'], iface, ('direction', 'rx'))
+        add('monitor_network_interface_errors_per_second', nic['tx_errs'], iface, ('direction', 'tx'))
+        add('monitor_network_interface_drops_per_second', nic['rx_drop'], iface, ('direction', 'rx'))
+        add('monitor_network_interface_drops_per_second', nic['tx_drop'], iface, ('direction', 'tx'))
+    add('monitor_connections', data['connections'])
+    for state, count in sorted(data['tcp_states'].items()):
+        add('monitor_tcp_connections', count, ('state', state))
+    add('monitor_processes', data['process_count'])
+    add('monitor_boot_time_seconds', data['boot_time'])
+    add('monitor_sample_timestamp_seconds', round(snapshot.ts, 3))
+
+    return ''.join(HEADERS[name] + ''.join(lines) for name, lines in samples.items() if lines)
@@ -0,0 +1,113 @@
+"""
+Per-interface network rates from /proc/net/dev.
+
+One pread of /proc/net/dev per tick on a persistent fd gives every
+interface's counters; bytes, packets, errors and drops per second are the
+deltas against the previous tick. Counters that wrap (32-bit on some
+drivers) are unwrapped, and virtual interfaces are skipped by name pattern.
+"""
+
+import fnmatch
+import os
+
+from procfs import PROC_ROOT, column_rows, pread_text
+
+# Interfaces to leave out, as shell patterns. Loopback and container/VM
+# plumbing would otherwise count the same traffic twice.
+NET_IGNORE = os.environ.get(
+    'MONITOR_NET_IGNORE', 'lo,veth*,docker*,br-*,virbr*,vnet*,cali*,flannel*,cni*,ifb*').replace(',', ' ').split()
+
+# Columns of the per-interface data in a snapshot, in order. The *_bytes
+# columns are running totals; everything else is per second.
+COLUMNS = ('iface', 'rx_bytes', 'tx_bytes', 'rx_bps', 'tx_bps', 'rx_pps', 'tx_pps',
+           'rx_errs', 'tx_errs', 'rx_drop', 'tx_drop')
+
+# Positions in a /proc/net/dev line after "iface:"
+_RX_BYTES, _RX_PACKETS, _RX_ERRS, _RX_DROP = 0, 1, 2, 3
+_TX_BYTES, _TX_PACKETS, _TX_ERRS, _TX_DROP = 8, 9, 10, 11
+_COUNTERS = (_RX_BYTES, _TX_BYTES, _RX_PACKETS, _TX_PACKETS, _RX_ERRS, _TX_ERRS, _RX_DROP, _TX_DROP)
+
+_WRAP_32 = 1 << 32
+
+
+def parse_net_dev(text, ignore=()):
+    """{iface: (rx bytes, tx bytes, rx packets, tx packets, rx errs, tx errs, rx drop, tx drop)}"""
+    counters = {}
+    for line in text.splitlines()[2:]:
+        name, _, values = line.partition(':')
+        name = name.strip()
+        if not values or any(fnmatch.fnmatchcase(name, p) for p in ignore):
+            continue
+        fields = values.split()
+        try:
+            counters[name] = tuple(int(fields[i]) for i in _COUNTERS)
+        except (IndexError, ValueError):
+            continue
+    return counters
+
+def counter_delta(new, old):
+    """Increase of a kernel counter between two reads, across a 32-bit wrap.
+
+    A counter that drops from the upper half of the 32-bit range wrapped;
+    any other drop is a reset (interface re-created), counted from zero.
+    """
+    if new >= old:
+        return new - old
+    if old < _WRAP_32 and old >= _WRAP_32 // 2:
+        return new + _WRAP_32 - old
+    return new
+
+
+class NetCollector:
+    """Per-interface totals and rates, as columns (see COLUMNS)."""
+
+    def __init__(self, proc_root=PROC_ROOT, ignore=NET_IGNORE):
+        self.ignore = ignore
+        self._prev = None       # (monotonic time, parsed counters)
+        self._totals = {}       # iface -> [rx bytes, tx bytes], unwrapped
+        try:
+            self._fd = os.open(os.path.join(proc_root, 'net/dev'), os.O_RDONLY)
+        except OSError:
+            self._fd = None
+
+    def _read(self):
+        if self._fd is None:
+            return {}
+        return parse_net_dev(pread_text(self._fd), self.ignore)
+
+    def sample(self, now):
+        """Columns for every interface; rates are per second since the previous sample."""
+        counters = self._read()
+        prev, self._prev = self._prev, (now, counters)
+        elapsed = now - prev[0] if prev is not None else 0
+        totals = {}
+        columns = {name: [] for name in COLUMNS}
+        for iface in sorted(counters):
+            current = counters[iface]
+            before = prev[1].get(iface) if prev is not None else None
+            if before is None or elapsed <= 0:
+                deltas = (0,) * len(current)
+                total = self._totals.get(iface) or [current[0], current[1]]
+            else:
+                deltas = [counter_delta(a, b) for a, b in zip(current, before)]
+                total = self._totals.get(iface) or [before[0], before[1]]
+                total = [total[0] + deltas[0], total[1] + deltas[1]]
+            totals[iface] = total
+            columns['iface'].append(iface)
+            columns['rx_bytes'].append(total[0])
+            columns['tx_bytes'].append(total[1])
+            for name, delta in zip(COLUMNS[3:], deltas):
+                columns[name].append(round(delta / elapsed, 1) if elapsed > 0 else 0.0)
+        # Interfaces that disappeared are forgotten, so a re-created one starts over.
+        self._totals = totals
+        return columns
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+
+def as_rows(columns):
+    """The per-interface columns of a snapshot as one dict per interface"""
+    return column_rows(columns, COLUMNS)
@@ -0,0 +1,149 @@
+"""
+Per-process top-N from /proc/<pid>/stat.
+
+One scan reads a single stat file per process with one read() each and
+keeps (starttime, cpu ticks) per pid between scans, so CPU usage is a delta
+against the previous scan rather than a psutil.Process per pid. Only the
+processes that make a top-N list get their command line and user looked up.
+"""
+
+import heapq
+import os
+import pwd
+import time
+
+from procfs import PROC_ROOT
+
+CLOCK_TICKS = os.sysconf('SC_CLK_TCK')
+PAGE_SIZE = os.sysconf('SC_PAGE_SIZE')
+
+# Entries kept per sort key in a snapshot; /api/processes?limit= is capped to this.
+PROCESS_TOP = int(os.environ.get('MONITOR_PROCESS_TOP', '50'))
+
+SORT_KEYS = ('cpu', 'mem')
+
+# Field positions after the ")" that closes the command name in /proc/<pid>/stat
+_STATE, _PPID, _UTIME, _STIME, _THREADS, _STARTTIME, _RSS = 0, 1, 11, 12, 17, 19, 21
+
+# Longer command lines are cut; they are for display only.
+_CMDLINE_MAX = 512
+
+
+class ProcessTable:
+    """Scans /proc and ranks processes by CPU (delta since the last scan) and RSS."""
+
+    def __init__(self, proc_root=PROC_ROOT, top=PROCESS_TOP):
+        self.proc_root = proc_root
+        self.top = top
+        self._prev = {}         # pid -> (starttime, utime + stime)
+        self._prev_time = None
+        self._cmdlines = {}     # (pid, starttime) -> command line
+        self._users = {}        # uid -> user name
+
+    def scan(self):
+        """{'ts', 'count', 'states', 'top': {'cpu': [...], 'mem': [...]}, 'scan_ms', 'scan_cpu_ms'}"""
+        started, started_cpu = time.perf_counter(), time.thread_time()
+        now = time.monotonic()
+        elapsed = now - self._prev_time if self._prev_time is not None else None
+        prev, current = self._prev, {}
+        rows = []
+        states = {}
+        try:
+            with os.scandir(self.proc_root) as entries:
+                pids = [entry.name for entry in entries if entry.name.isdigit()]
+            # Paths relative to an open /proc fd skip the lookup of the root per file.
+            root_fd = os.open(self.proc_root, os.O_RDONLY | os.O_DIRECTORY)
+        except OSError:
+            pids, root_fd = [], None
+
+        open_, read, close_ = os.open, os.read, os.close
+        for pid in pids:
+            try:
+                fd = open_(pid + '/stat', os.O_RDONLY, dir_fd=root_fd)
+            except OSError:
+                continue    # exited between listdir and open
+            try:
+                raw = read(fd, 1024)
+            except OSError:
+                continue
+            finally:
+                close_(fd)
+            paren = raw.rfind(b')')
+            fields = raw[paren + 2:].split(None, _RSS + 1)
+            try:
+                ticks = int(fields[_UTIME]) + int(fields[_STIME])
+                starttime = int(fields[_STARTTIME])
+                rss = int(fields[_RSS]) * PAGE_SIZE
+            except (IndexError, ValueError):
+                continue
+            state = fields[_STATE]
+            states[state] = states.get(state, 0) + 1
+            current[pid] = (starttime, ticks)
+            before = prev.get(pid)
+            if elapsed and before is not None and before[0] == starttime:
+                cpu = (ticks - before[1]) / CLOCK_TICKS / elapsed * 100
+            else:
+                cpu = 0.0   # new process (or a reused pid): no baseline yet
+            rows.append((cpu, rss, pid, starttime, raw, fields))
+
+        if root_fd is not None:
+            os.close(root_fd)
+        self._prev, self._prev_time = current, now
+        top = {
+            'cpu': heapq.nlargest(self.top, rows, key=lambda r: (r[0], r[1])),
+            'mem': heapq.nlargest(self.top, rows, key=lambda r: r[1]),
+        }
+        listed = {(r[2], r[3]) for ranking in top.values() for r in ranking}
+        self._cmdlines = {key: value for key, value in self._cmdlines.items() if key in listed}
+        result = {
+            'ts': round(time.time(), 3),
+            'count': len(rows),
+            'states': {state.decode(): n for state, n in states.items()},
+            'top': {key: [self._describe(r) for r in ranking] for key, ranking in top.items()},
+        }
+        result['scan_ms'] = round((time.perf_counter() - started) * 1000, 2)
+        result['scan_cpu_ms'] = round((time.thread_time() - started_cpu) * 1000, 2)
+        return result
+
+    def _describe(self, row):
+        cpu, rss, pid, starttime, raw, fields = row
+        name = raw[raw.find(b'(') + 1:raw.rfind(b')')].decode(errors='replace')
+        return {
+            'pid': int(pid),
+            'name': name,
+            'cmdline': self._cmdline(pid, starttime, name),
+            'user': self._user(pid),
+            'state': fields[_STATE].decode(),
+            'ppid': int(fields[_PPID]),
+            'threads': int(fields[_THREADS]),
+            'cpu': round(cpu, 1),
+            'rss': rss,
+        }
+
+    def _cmdline(self, pid, starttime, name):
+        key = (pid, starttime)
+        cmdline = self._cmdlines.get(key)
+        if cmdline is None:
+            try:
+                with open(f"{self.proc_root}/{pid}/cmdline", 'rb') as f:
+                    raw = f.read(_CMDLINE_MAX)
+            except OSError:
+                raw = b''
+            # Kernel threads have an empty command line; show [name] like ps does.
+            cmdline = raw.rstrip(b'\0').replace(b'\0', b' ').decode(errors='replace') or f"[{name}]"
+            self._cmdlines[key] = cmdline
+        return cmdline
+
+    def _user(self, pid):
+        try:
+            uid = os.stat(f"{self.proc_root}/{pid}").st_uid
+        except OSError:
+            return None
+        user = self._users.get(uid)
+        if user is None:
+            try:
+                user = pwd.getpwuid(uid).pw_name
+            except KeyError:
+                user = str(uid)
+            self._users[uid] = user
+        return user
@@ -0,0 +1,190 @@
+"""
+Fast /proc and /sys readers.
+
+Static CPU facts are read once per process; per-core frequency is read
+with os.pread on file descriptors that stay open between samples, so a
+tick costs one syscall per core instead of parsing /proc/cpuinfo.
+"""
+
+import glob
+import os
+import platform
+import re
+import socket
+
+import lazy
+from collectors import get_cpu_freq_mhz, get_freq_range
+
+PROC_ROOT = os.environ.get('MONITOR_PROC_ROOT', '/proc')
+SYS_ROOT = os.environ.get('MONITOR_SYS_ROOT', '/sys')
+
+
+def _follow_proc_root(module):
+    # psutil reads the same tree (e.g. the host's /proc mounted into a container, or a fake one).
+    if PROC_ROOT != '/proc':
+        module.PROCFS_PATH = PROC_ROOT
+
+# Imported on first use: workers that only follow the producer never need it.
+psutil = lazy.module('psutil', _follow_proc_root)
+
+_CPU_DIR_RE = re.compile(r'/cpu(\d+)/')
+
+
+def _read_khz(path):
+    try:
+        with open(path, 'rb') as f:
+            return int(f.read())
+    except (OSError, ValueError):
+        return None
+
+def _cpu_paths(sys_root, name):
+    """cpufreq files for every CPU, ordered by CPU number (cpu10 after cpu9)."""
+    paths = glob.glob(os.path.join(sys_root, 'devices/system/cpu/cpu[0-9]*/cpufreq', name))
+    return sorted(paths, key=lambda p: int(_CPU_DIR_RE.search(p).group(1)))
+
+def pread_text(fd):
+    """Whole contents of a /proc file kept open as `fd`, read with pread from offset 0."""
+    chunks, offset = [], 0
+    while True:
+        chunk = os.pread(fd, 65536, offset)
+        if not chunk:
+            return b''.join(chunks).decode(errors='replace')
+        chunks.append(chunk)
+        offset += len(chunk)
+
+def column_rows(columns, names):
+    """Per-item columns of a snapshot ({name: [value per item]}) as one dict per item"""
+    return [dict(zip(names, row)) for row in zip(*(columns[name] for name in names))]
+
+
+class CpuFreqReader:
+    """Per-core current frequency from scaling_cur_freq, via persistent fds."""
+
+    def __init__(self, sys_root=SYS_ROOT, proc_root=PROC_ROOT):
+        self.cpuinfo_path = os.path.join(proc_root, 'cpuinfo')
+        self._fds = []
+        for path in _cpu_paths(sys_root, 'scaling_cur_freq'):
+            try:
+                self._fds.append(os.open(path, os.O_RDONLY))
+            except OSError:
+                self.close()
+                break
+
+    @property
+    def available(self):
+        return bool(self._fds)
+
+    def read_mhz(self):
+        """Return per-core MHz; falls back to parsing /proc/cpuinfo without cpufreq."""
+        if self._fds:
+            try:
+                return [round(int(os.pread(fd, 32, 0)) / 1000, 0) for fd in self._fds]
+            except (OSError, ValueError):
+                # A CPU went offline; stop using sysfs rather than report a partial list.
+                self.close()
+        return get_cpu_freq_mhz(self.cpuinfo_path)
+
+    def close(self):
+        for fd in self._fds:
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+        self._fds = []
+
+
+def read_cpu_static(proc_root=PROC_ROOT):
+    """Facts that do not change while the process runs: model and core count."""
+    cpu_model = "Unknown"
+    processors = 0
+    try:
+        with open(os.path.join(proc_root, 'cpuinfo'), 'r') as f:
+            for line in f:
+                if line.startswith('processor'):
+                    processors += 1
+                elif cpu_model == "Unknown" and line.startswith('model name'):
+                    cpu_model = line.split(':', 1)[1].strip()
+    except OSError:
+        pass
+    return {'cpu_model': cpu_model, 'cpu_count': processors or os.cpu_count() or 1}
+
+def read_freq_range(sys_root=SYS_ROOT):
+    """(min, max) MHz from cpufreq, else from psutil; only the sampler needs it."""
+    min_khz = _read_khz(os.path.join(sys_root, 'devices/system/cpu/cpu0/cpufreq/cpuinfo_min_freq'))
+    max_khz = _read_khz(os.path.join(sys_root, 'devices/system/cpu/cpu0/cpufreq/cpuinfo_max_freq'))
+    if min_khz and max_khz:
+        return round(min_khz / 1000, 0), round(max_khz / 1000, 0)
+    return get_freq_range()
+
+
+_cpu_static = None
+
+def cpu_static():
+    """read_cpu_static() for the real machine, computed once per process."""
+    global _cpu_static
+    if _cpu_static is None:
+        _cpu_static = read_cpu_static()
+    return _cpu_static
+
+def host_facts():
+    """cpu_static() plus hostname, OS, Python version and architecture: the dashboard's host facts."""
+    return dict(
+        cpu_static(),
+        hostname=socket.gethostname(),
+        os_info=f"{platform.system()} {platform.release()}",
+        python_version=platform.python_version(),
+        arch=platform.machine(),
+    )
+
+
+def read_sockstat(proc_root=PROC_ROOT):
+    """Socket counters from /proc/net/sockstat{,6}: {'TCP': {'inuse': n, 'tw': n, ...}, 'UDP6': {...}}"""
+    counters = {}
+    for name in ('sockstat', 'sockstat6'):
+        try:
+            with open(os.path.join(proc_root, 'net', name), 'r') as f:
+                for line in f:
+                    proto, _, rest = line.partition(':')
+                    fields = rest.split()
+                    counters[proto] = {k: int(v) for k, v in zip(fields[::2], fields[1::2])}
+        except (OSError, ValueError):
+            pass
+    return counters
+
+def count_connections(sockstat):
+    """inet sockets in use (TCP incl. TIME_WAIT, UDP; v4 + v6), like len(net_connections())."""
+    def get(proto, key):
+        return sockstat.get(proto, {}).get(key, 0)
+    return (get('TCP', 'inuse') + get('TCP', 'tw') + get('UDP', 'inuse')
+            + get('TCP6', 'inuse') + get('UDP6', 'inuse'))
+
+
+TCP_STATES = {
+    b'01': 'ESTABLISHED', b'02': 'SYN_SENT', b'03': 'SYN_RECV', b'04': 'FIN_WAIT1',
+    b'05': 'FIN_WAIT2', b'06': 'TIME_WAIT', b'07': 'CLOSE', b'08': 'CLOSE_WAIT',
+    b'09': 'LAST_ACK', b'0A': 'LISTEN', b'0B': 'CLOSING', b'0C': 'NEW_SYN_RECV',
+}
+_TCP_STATE_RE = re.compile(rb'^\s*\d+: [0-9A-F]+:[0-9A-F]+ [0-9A-F]+:[0-9A-F]+ ([0-9A-F]{2}) ', re.M)
+_CHUNK = 1 << 20
+
+def count_tcp_states(proc_root=PROC_ROOT):
+    """Per-state TCP socket counts from /proc/net/tcp{,6}, scanned in 1 MB chunks."""
+    counts = dict.fromkeys(TCP_STATES, 0)
+    for name in ('tcp', 'tcp6'):
+        try:
+            with open(os.path.join(proc_root, 'net', name), 'rb') as f:
+                tail = b''
+                while True:
+                    chunk = f.read(_CHUNK)
+                    if not chunk:
+                        break
+                    chunk = tail + chunk
+                    cut = chunk.rfind(b'\n') + 1
+                    chunk, tail = chunk[:cut], chunk[cut:]
+                    for state in _TCP_STATE_RE.findall(chunk):
+                        counts[state] = counts.get(state, 0) + 1
+                for state in _TCP_STATE_RE.findall(tail):
+                    counts[state] = counts.get(state, 0) + 1
+        except OSError:
+            pass
+    return {TCP_STATES.get(k, k.decode()): v for k, v in counts.items() if v}
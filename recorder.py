@@ -0,0 +1,395 @@
+#!/usr/bin/env python3
+"""
+Headless mode - run the collectors without a web server and append every
+snapshot to local files, then replay those files for post-incident analysis.
+
+    python recorder.py record --dir /var/lib/server-monitor/samples
+    python recorder.py cat samples/ --from 2024-05-01T10:00 --to 2024-05-01T11:00
+    python recorder.py replay samples/ --history-dir /tmp/incident --serve --speed 10
+
+Samples are buffered in memory and written once per batch (every
+MONITOR_RECORD_BATCH samples or MONITOR_RECORD_FLUSH seconds, whichever
+comes first) with a single write() to an O_APPEND file, which is rotated
+by size or age; only the newest MONITOR_RECORD_KEEP files are kept.
+
+Two formats:
+  * ndjson - one {"seq", "ts", "data"} object per line, greppable with jq;
+  * binary - one frame per batch: a FRAME header (with the first and last
+    timestamp, so readers skip batches outside a range without
+    decompressing them) followed by the batch's NDJSON lines, zlib
+    compressed. Repeated keys make this roughly 20x smaller.
+
+Every file starts with the recording machine's host facts (hostname, CPU
+model, core count, OS): a {"host": {...}} line, or in binary files a HOST
+frame holding that line uncompressed. `replay --serve` shows them instead
+of the replaying machine's.
+
+A crash loses at most the unwritten batch; a torn last line or frame is
+skipped by the reader.
+"""
+
+import argparse
+import datetime
+import json
+import logging
+import os
+import signal
+import struct
+import sys
+import threading
+import time
+import zlib
+
+from sampler import SAMPLE_INTERVAL, Snapshot, SnapshotSource
+
+RECORD_DIR = os.environ.get(
+    'MONITOR_RECORD_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'samples'))
+RECORD_FORMAT = os.environ.get('MONITOR_RECORD_FORMAT', 'binary')
+RECORD_BATCH = int(os.environ.get('MONITOR_RECORD_BATCH', '60'))
+RECORD_FLUSH = float(os.environ.get('MONITOR_RECORD_FLUSH', '60'))
+# A new file once the current one reaches either limit.
+RECORD_ROTATE_SIZE = int(os.environ.get('MONITOR_RECORD_ROTATE_SIZE', str(64 << 20)))
+RECORD_ROTATE_SECONDS = float(os.environ.get('MONITOR_RECORD_ROTATE_SECONDS', '86400'))
+RECORD_KEEP = int(os.environ.get('MONITOR_RECORD_KEEP', '30'))
+
+EXTENSIONS = {'ndjson': '.ndjson', 'binary': '.mrec'}
+# magic, compressed length, sample count, first ts, last ts
+FRAME = struct.Struct('<4sIIdd')
+FRAME_MAGIC = b'MRC1'
+HOST_MAGIC = b'MRH1'
+ZLIB_LEVEL = 6
+
+log = logging.getLogger(__name__)
+
+
+def encode_host(host):
+    return json.dumps({'host': host}, separators=(',', ':')).encode() + b'\n'
+
+
+def encode_sample(snapshot):
+    return json.dumps({'seq': snapshot.seq, 'ts': round(snapshot.ts, 3), 'data': snapshot.data},
+                      separators=(',', ':')).encode() + b'\n'
+
+
+class SampleLog:
+    """Append-only sample files under `directory`, written one batch at a time."""
+
+    def __init__(self, directory=RECORD_DIR, fmt=RECORD_FORMAT, batch=RECORD_BATCH, flush_seconds=RECORD_FLUSH,
+                 rotate_size=RECORD_ROTATE_SIZE, rotate_seconds=RECORD_ROTATE_SECONDS, keep=RECORD_KEEP, host=None):
+        if fmt not in EXTENSIONS:
+            raise ValueError(f"unknown record format {fmt!r}")
+        self.directory = directory
+        self.fmt = fmt
+        self.batch = batch
+        self.flush_seconds = flush_seconds
+        self.rotate_size = rotate_size
+        self.rotate_seconds = rotate_seconds
+        self.keep = keep
+        self.host = host
+        self.path = None
+        self.writes = 0
+        self._fd = None
+        self._size = 0
+        self._opened = 0.0
+        self._lines = []
+        self._first_ts = self._last_ts = None
+        self._buffered_since = None
+        os.makedirs(directory, exist_ok=True)
+
+    def add(self, snapshot):
+        if not self._lines:
+            self._first_ts, self._buffered_since = snapshot.ts, time.monotonic()
+        self._lines.append(encode_sample(snapshot))
+        self._last_ts = snapshot.ts
+        if len(self._lines) >= self.batch:
+            self.flush()
+
+    def flush_if_due(self):
+        if self._lines and time.monotonic() - self._buffered_since >= self.flush_seconds:
+            self.flush()
+
+    def flush(self):
+        if not self._lines:
+            return
+        body = b''.join(self._lines)
+        if self.fmt == 'binary':
+            packed = zlib.compress(body, ZLIB_LEVEL)
+            body = FRAME.pack(FRAME_MAGIC, len(packed), len(self._lines), self._first_ts, self._last_ts) + packed
+        if self._fd is None or self._size >= self.rotate_size or time.time() - self._opened >= self.rotate_seconds:
+            self._rotate()
+        view = memoryview(body)
+        while view:
+            view = view[os.write(self._fd, view):]
+        self._size += len(body)
+        self.writes += 1
+        self._lines = []
+
+    def _rotate(self):
+        if self._fd is not None:
+            os.close(self._fd)
+        stamp = time.strftime('%Y%m%d-%H%M%S', time.localtime(self._first_ts))
+        path = os.path.join(self.directory, f"samples-{stamp}{EXTENSIONS[self.fmt]}")
+        self._fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        self._size = os.fstat(self._fd).st_size
+        if not self._size and self.host is not None:
+            header = encode_host(self.host)
+            if self.fmt == 'binary':
+                header = FRAME.pack(HOST_MAGIC, len(header), 0, self._first_ts, self._first_ts) + header
+            os.write(self._fd, header)
+            self._size = len(header)
+        self._opened = time.time()
+        self.path = path
+        log.info('recording to %s', path)
+        self._prune()
+
+    def _prune(self):
+        if self.keep <= 0:
+            return
+        files = sample_files([self.directory])
+        for path in files[:-self.keep]:
+            try:
+                os.unlink(path)
+            except OSError:
+                log.warning('could not remove old sample file %s', path)
+
+    def close(self):
+        self.flush()
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+
+def sample_files(paths):
+    """Files given, and the sample files in directories given, oldest first."""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(os.path.join(path, name) for name in os.listdir(path)
+                                if name.startswith('samples-') and name.endswith(tuple(EXTENSIONS.values()))))
+        else:
+            files.append(path)
+    return files
+
+
+def _decode_lines(body, path, start, end):
+    for line in body.splitlines():
+        try:
+            sample = json.loads(line)
+        except ValueError:
+            log.warning('%s: skipping a torn or corrupt line', path)
+            continue
+        if 'ts' not in sample:
+            continue    # the host header
+        if start <= sample['ts'] <= end:
+            yield sample['ts'], sample['seq'], sample['data']
+
+
+def _read_frames(f, path, start, end):
+    while True:
+        header = f.read(FRAME.size)
+        if not header:
+            return
+        if len(header) < FRAME.size:
+            log.warning('%s: torn frame at the end', path)
+            return
+        magic, length, count, first_ts, last_ts = FRAME.unpack(header)
+        if magic not in (FRAME_MAGIC, HOST_MAGIC):
+            log.warning('%s: corrupt frame, skipping the rest of the file', path)
+            return
+        if magic == HOST_MAGIC or last_ts < start or first_ts > end:
+            f.seek(length, os.SEEK_CUR)
+            continue
+        packed = f.read(length)
+        try:
+            body = zlib.decompress(packed)
+        except zlib.error:
+            log.warning('%s: torn frame at the end', path)
+            return
+        yield from _decode_lines(body, path, start, end)
+
+
+def read_samples(paths, start=float('-inf'), end=float('inf')):
+    """Yield (ts, seq, data) from sample files (either format) and directories, in time order."""
+    for path in sample_files(paths):
+        with open(path, 'rb') as f:
+            if f.read(len(FRAME_MAGIC)) in (FRAME_MAGIC, HOST_MAGIC):
+                f.seek(0)
+                yield from _read_frames(f, path, start, end)
+            else:
+                f.seek(0)
+                yield from _decode_lines(f.read(), path, start, end)
+
+
+def read_host(paths):
+    """Host facts from the header of the newest sample file that has one, else None."""
+    for path in reversed(sample_files(paths)):
+        with open(path, 'rb') as f:
+            header = f.read(FRAME.size)
+            if header[:len(HOST_MAGIC)] == HOST_MAGIC and len(header) == FRAME.size:
+                line = f.read(FRAME.unpack(header)[1])
+            elif header.startswith(b'{"host"'):
+                f.seek(0)
+                line = f.readline()
+            else:
+                continue
+        try:
+            return json.loads(line)['host']
+        except (ValueError, KeyError):
+            log.warning('%s: corrupt host header', path)
+    return None
+
+
+class ReplaySource(SnapshotSource):
+    """Publishes recorded samples as snapshots, `speed` times faster than they were taken."""
+
+    def __init__(self, samples, speed=1.0, history=None, host=None):
+        if not speed > 0:
+            raise ValueError(f"replay speed must be positive, got {speed!r}")
+        super().__init__(SAMPLE_INTERVAL)
+        self.samples = samples
+        self.speed = speed
+        self.history = history
+        self.host = host
+        self.memory = None
+        self.replayed = 0
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='replay', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        previous = None
+        for ts, _, data in self.samples:
+            if previous is not None and self._stop.wait(max(ts - previous, 0) / self.speed):
+                return
+            previous = ts
+            # Renumbered: a recording spans producer restarts, clients need seq to grow.
+            self._set_latest(Snapshot(self._seq + 1, ts, data))
+            self.replayed += 1
+        log.info('replay finished after %d samples', self.replayed)
+
+
+def record(args):
+    from procfs import host_facts
+    from sampler import get_sampler
+
+    sample_log = SampleLog(args.dir, args.format, args.batch, args.flush, args.rotate_size,
+                           args.rotate_seconds, args.keep, host_facts())
+    stop = threading.Event()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda *_: stop.set())
+    seq = 0
+    try:
+        while not stop.is_set():
+            # Looked up every time: a follower may have been promoted to producer.
+            # The recorder counts as someone looking, so the sampler stays at full rate.
+            source = get_sampler()
+            source.touch()
+            snapshot = source.wait_next(seq, min(args.flush, 1.0))
+            if snapshot is not None:
+                seq = snapshot.seq
+                sample_log.add(snapshot)
+            sample_log.flush_if_due()
+    finally:
+        sample_log.close()
+        log.info('stopped after %d batch writes', sample_log.writes)
+
+
+def cat(args):
+    out = sys.stdout.buffer
+    for ts, seq, data in read_samples(args.files, args.start, args.end):
+        out.write(json.dumps({'seq': seq, 'ts': ts, 'data': data}, separators=(',', ':')).encode() + b'\n')
+
+
+def replay(args):
+    if not args.history_dir and not args.serve:
+        raise SystemExit('replay: give --history-dir, --serve or both')
+    history = None
+    if args.history_dir:
+        from history import HistoryStore
+        history = HistoryStore(args.history_dir)
+        count, first, last = 0, None, None
+        for ts, _, data in read_samples(args.files, args.start, args.end):
+            history.record(ts, data)
+            count += 1
+            first = ts if first is None else first
+            last = ts
+        history.flush()
+        if count:
+            log.info('%d samples from %s to %s written to %s', count, _format_ts(first), _format_ts(last),
+                     args.history_dir)
+        else:
+            log.warning('no samples in range')
+    if args.serve:
+        import sampler
+        from app import app
+        host = read_host(args.files)
+        if host is None:
+            log.warning('no host facts in the sample files, the dashboard shows this machine\'s')
+        sampler.use_source(ReplaySource(read_samples(args.files, args.start, args.end), args.speed, history, host))
+        app.run(host=args.host, port=args.port, threaded=True)
+
+
+def _format_ts(ts):
+    return datetime.datetime.fromtimestamp(ts).isoformat(' ', 'seconds')
+
+
+def parse_time(value):
+    """Unix seconds, or an ISO date/time in local time"""
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.datetime.fromisoformat(value).timestamp()
+
+
+def positive(value):
+    number = float(value)
+    if not number > 0:
+        raise argparse.ArgumentTypeError(f"expected a positive number, got {value!r}")
+    return number
+
+
+def size(value):
+    units = {'k': 1 << 10, 'm': 1 << 20, 'g': 1 << 30}
+    value = value.strip().lower().rstrip('b')
+    if value and value[-1] in units:
+        return int(float(value[:-1]) * units[value[-1]])
+    return int(value)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Record snapshots without a web server, and replay them')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    rec = commands.add_parser('record', help='sample this machine and append to sample files')
+    rec.add_argument('--dir', default=RECORD_DIR)
+    rec.add_argument('--format', choices=sorted(EXTENSIONS), default=RECORD_FORMAT)
+    rec.add_argument('--batch', type=int, default=RECORD_BATCH, help='samples per write')
+    rec.add_argument('--flush', type=float, default=RECORD_FLUSH, help='longest a sample waits in memory (s)')
+    rec.add_argument('--rotate-size', type=size, default=RECORD_ROTATE_SIZE, help='e.g. 64M')
+    rec.add_argument('--rotate-seconds', type=float, default=RECORD_ROTATE_SECONDS)
+    rec.add_argument('--keep', type=int, default=RECORD_KEEP, help='newest files kept; 0 = all')
+    rec.set_defaults(run=record)
+
+    for name, run, text in (('cat', cat, 'print samples as NDJSON'),
+                            ('replay', replay, 'load samples into a history dir and/or serve them on the dashboard')):
+        sub = commands.add_parser(name, help=text)
+        sub.add_argument('files', nargs='+', help='sample files or directories')
+        sub.add_argument('--from', dest='start', type=parse_time, default=float('-inf'),
+                         help='unix seconds or ISO time')
+        sub.add_argument('--to', dest='end', type=parse_time, default=float('inf'))
+        sub.set_defaults(run=run)
+        if name == 'replay':
+            sub.add_argument('--history-dir', help='history ring files to fill (served by /api/history)')
+            sub.add_argument('--serve', action='store_true', help='play the samples back on the dashboard')
+            sub.add_argument('--speed', type=positive, default=1.0, help='playback speed for --serve')
+            sub.add_argument('--host', default='127.0.0.1')
+            sub.add_argument('--port', type=int, default=5000)
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(name)s %(levelname)s %(message)s')
+    args.run(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+"""
+/api/report - p50 / p95 / p99, average, max and time above a threshold per
+metric over a window, next to the same for an earlier window of the same
+length (by default the one just before: this week against last week).
+
+Everything comes from the sketch roll-ups (sketches.py): a window is its
+10-minute or hourly histograms added up, so the cost depends on the number
+of buckets, not of samples. Window edges are rounded out to whole buckets.
+Per-core metrics (core_mhz, cpu_core) describe all cores pooled: their
+time above a threshold is the share of core-time.
+"""
+
+import math
+import time
+
+from sketches import METRIC_LAYOUTS
+
+QUANTILES = (('p50', 0.50), ('p95', 0.95), ('p99', 0.99))
+METRICS = ('cpu_percent', 'core_mhz', 'mem_percent', 'swap_percent', 'disk_percent',
+           'disk_read_rate', 'disk_write_rate', 'net_recv_rate', 'net_sent_rate')
+# Time above is reported for these by default, as in the default alert rules;
+# other metrics and other values with ?above=metric:value.
+THRESHOLDS = {'cpu_percent': 90, 'cpu_core': 90, 'mem_percent': 90, 'swap_percent': 80, 'disk_percent': 85}
+
+
+def parse_thresholds(text):
+    """'cpu_percent:80,net_recv_rate:1e8' -> {metric: value}; ValueError on bad input"""
+    thresholds = {}
+    for item in filter(None, (part.strip() for part in text.split(','))):
+        metric, sep, value = item.partition(':')
+        if not sep:
+            raise ValueError(f"above: expected metric:value, got {item!r}")
+        thresholds[metric.strip()] = float(value)
+        if not math.isfinite(thresholds[metric.strip()]):
+            raise ValueError(f"above: {item!r} is not a finite number")
+    return thresholds
+
+
+def summarize(sketches, metric, start, end, threshold=None):
+    """Statistics of one metric over start..end, None values if nothing was recorded"""
+    merged = sketches.merge(metric, start, end)
+    result = {'from': int(start), 'to': int(end), 'tier': None, 'seconds': 0}
+    result.update({name: None for name, _ in QUANTILES}, avg=None, max=None)
+    if threshold is not None:
+        result['above'] = {'threshold': threshold, 'seconds': 0, 'percent': None}
+    if merged is None:
+        return result
+    layout, counts, peak, seconds = METRIC_LAYOUTS[metric], merged['counts'], merged['peak'], merged['seconds']
+    floor = merged['floor']
+    result.update({'from': merged['from'], 'tier': merged['tier'], 'seconds': round(seconds),
+                   'avg': round(merged['total'] / seconds, 2), 'max': round(peak, 2)})
+    for name, q in QUANTILES:
+        result[name] = round(layout.quantile(counts, peak, q, floor), 2)
+    if threshold is not None:
+        # Bins hold seconds (core-seconds / cores for pooled metrics), so this is time.
+        above = layout.above(counts, peak, threshold)
+        result['above'] = {'threshold': threshold, 'seconds': round(above),
+                           'percent': round(above / seconds * 100, 2)}
+    return result
+
+
+def change(current, previous):
+    """Relative change (%) of each statistic; time above as a difference in percentage points"""
+    delta = {}
+    for name in [name for name, _ in QUANTILES] + ['avg', 'max']:
+        before, now = previous[name], current[name]
+        delta[name] = (round((now / before - 1) * 100, 1) or 0.0) if before and now is not None else None
+    if 'above' in current:
+        before, now = previous['above']['percent'], current['above']['percent']
+        delta['above_points'] = round(now - before, 2) if before is not None and now is not None else None
+    return delta
+
+
+def report(sketches, start, end, shift=None, metrics=METRICS, thresholds=None):
+    """{'from', 'to', 'compare_from', 'compare_to', 'metrics': {metric: {current, previous, change}}}
+
+    The second window is start..end moved `shift` seconds back (default: its
+    own length); shift 0 leaves it out. ValueError for a non-finite bound.
+    """
+    if not all(math.isfinite(value) for value in (start, end, 0 if shift is None else shift)):
+        raise ValueError('from, to and compare must be finite')
+    for metric in list(metrics) + list(thresholds or ()):
+        if metric not in METRIC_LAYOUTS:
+            raise KeyError(metric)
+    thresholds = dict(THRESHOLDS, **(thresholds or {}))
+    shift = end - start if shift is None else shift
+    started = time.perf_counter()
+    result = {'from': int(start), 'to': int(end), 'metrics': {}}
+    if shift:
+        result.update(compare_from=int(start - shift), compare_to=int(end - shift))
+    for metric in metrics:
+        threshold = thresholds.get(metric)
+        current = summarize(sketches, metric, start, end, threshold)
+        entry = result['metrics'][metric] = {'current': current}
+        if shift:
+            previous = summarize(sketches, metric, start - shift, end - shift, threshold)
+            entry.update(previous=previous, change=change(current, previous))
+    result['took_ms'] = round((time.perf_counter() - started) * 1000, 1)
+    return result
@@ -0,0 +1,484 @@
+"""
+Background sampler - one thread collects metrics at a fixed tick and
+publishes immutable snapshots; request handlers only read the latest one.
+"""
+
+import collections
+import json
+import logging
+import os
+import threading
+import time
+
+import lazy
+import procfs
+import selfstats
+import shm
+from procfs import psutil, read_freq_range
+
+SAMPLE_INTERVAL = float(os.environ.get('MONITOR_SAMPLE_INTERVAL', '1.0'))
+
+# Expensive collectors are refreshed at most once per TTL and reused in between.
+CONNECTIONS_TTL = float(os.environ.get('MONITOR_CONNECTIONS_TTL', '5'))
+TCP_STATES_TTL = float(os.environ.get('MONITOR_TCP_STATES_TTL', '30'))
+PROCESSES_TTL = float(os.environ.get('MONITOR_PROCESSES_TTL', '5'))
+
+# With nobody looking (no request for IDLE_AFTER seconds, no pending alert) the
+# sampler slows down to one tick per IDLE_INTERVAL; history and alerts keep
+# going at that rate. A request speeds it back up within a second.
+IDLE_INTERVAL = float(os.environ.get('MONITOR_IDLE_INTERVAL', '15'))
+IDLE_AFTER = float(os.environ.get('MONITOR_IDLE_AFTER', '30'))
+
+# How often an idle producer looks for requests served by other workers.
+ACTIVITY_POLL = 1.0
+# Requests closer together than this are noted once.
+TOUCH_EVERY = 0.5
+
+HISTORY_ENABLED = os.environ.get('MONITOR_HISTORY', '1') == '1'
+
+# One producer per host shares its snapshots with every worker through /dev/shm.
+SHARED_ENABLED = os.environ.get('MONITOR_SHARED', '1') == '1'
+
+# The sampler's self-stats published with snapshots are refreshed this often (seconds).
+SELF_STATS_TTL = 10
+
+# Snapshots kept for delta encoding against a client's last seen sequence number.
+RECENT_SNAPSHOTS = 32
+
+# What the producer builds, as "module:factory". Modules are imported when the
+# first Sampler is created; followers and replays never build them and load
+# disks, network and processes only when app.py first shows their columns. A
+# new collector is an entry here and its fields in Sampler.collect().
+COLLECTORS = {
+    'cpu_freq': 'procfs:CpuFreqReader',
+    'disks': 'disks:DiskCollector',
+    'net': 'network:NetCollector',
+    'processes': 'processes:ProcessTable',
+    'alerts': 'alerts:engine_from_config',
+}
+
+# Delay before the very first snapshot; psutil needs two readings for a delta.
+PRIME_DELAY = 0.2
+
+log = logging.getLogger(__name__)
+
+
+def collector(name, *args):
+    """Build the collector registered under `name` in COLLECTORS."""
+    return lazy.load(COLLECTORS[name])(*args)
+
+
+class Snapshot:
+    """One sample of the machine. Never mutated after it is published."""
+
+    __slots__ = ('seq', 'ts', 'data', '_derived')
+
+    def __init__(self, seq, ts, data):
+        self.seq = seq
+        self.ts = ts
+        self.data = data
+        self._derived = {}
+
+    def age(self):
+        return time.time() - self.ts
+
+    def derive(self, key, build):
+        """Return build(self), computed once per snapshot and cached under key."""
+        try:
+            return self._derived[key]
+        except KeyError:
+            value = self._derived[key] = build(self)
+            return value
+
+
+class Cached:
+    """Call fn() at most once per ttl seconds (idle_ttl while the sampler is idle);
+    return the previous value in between."""
+
+    def __init__(self, fn, ttl, idle_ttl=None):
+        self.fn = fn
+        self.ttl = ttl
+        self.idle_ttl = max(ttl, idle_ttl or ttl)
+        self.value = None
+        self.refreshed = None
+
+    def __call__(self, idle=False):
+        now = time.monotonic()
+        if self.refreshed is None or now - self.refreshed >= (self.idle_ttl if idle else self.ttl):
+            self.value = self.fn()
+            self.refreshed = now
+        return self.value
+
+
+class SnapshotSource:
+    """Latest and recent snapshots, and the wait/notify fan-out to subscribers."""
+
+    # Set by a Follower that took over from a dead producer; get_sampler() replaces it.
+    promoted = None
+
+    shared = None
+
+    # Facts about the machine the snapshots come from, when it is not this one (app.HOST).
+    host = None
+
+    def __init__(self, interval):
+        self.interval = interval
+        # Seconds until the next snapshot: `interval`, or IDLE_INTERVAL while idle.
+        self.tick = interval
+        self.pid = os.getpid()
+        self._latest = None
+        self._seq = 0
+        self._recent = collections.deque(maxlen=RECENT_SNAPSHOTS)
+        self._ready = threading.Event()
+        self._changed = threading.Condition()
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._touched = 0.0
+        self._thread = None
+
+    @property
+    def idle(self):
+        return self.tick > self.interval
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def _check_profile(self):
+        """Start profiling this process if any worker asked for it through shared memory."""
+        if self.shared is not None and selfstats.PROFILE_DIR:
+            until = self.shared.profile_until()
+            if until > time.time():
+                selfstats.start_profile(until)
+
+    def request_profile(self, seconds):
+        """Profile this process, and every other worker sharing the snapshot, for `seconds`."""
+        until = time.time() + seconds
+        if self.shared is not None:
+            self.shared.request_profile(until)
+            self._wake.set()
+        return selfstats.start_profile(until)
+
+    def touch(self):
+        """Note that someone is looking; an idle source speeds back up."""
+        now = time.time()
+        if now - self._touched < TOUCH_EVERY:
+            return
+        self._touched = now
+        if self.shared is not None:
+            self.shared.touch(now)
+        if self.idle:
+            self._wake.set()
+
+    def latest(self, timeout=None):
+        """Return the most recent Snapshot, waiting for the first one if needed."""
+        snapshot = self._latest
+        if snapshot is None:
+            self._ready.wait(self.interval + PRIME_DELAY + 1 if timeout is None else timeout)
+            snapshot = self._latest
+        return snapshot
+
+    def get(self, seq):
+        """A recent Snapshot by sequence number, or None if it has aged out."""
+        for snapshot in reversed(self._recent):
+            if snapshot.seq == seq:
+                return snapshot
+            if snapshot.seq < seq:
+                break
+        return None
+
+    def wait_next(self, after_seq, timeout):
+        """Block until a snapshot newer than after_seq is published; None on timeout.
+
+        This is the fan-out point for push subscribers: one producer, one
+        notify_all per tick, however many streams are waiting.
+        """
+        with self._changed:
+            self._changed.wait_for(lambda: self._seq > after_seq, timeout)
+        snapshot = self._latest
+        if snapshot is None or snapshot.seq <= after_seq:
+            return None
+        return snapshot
+
+    def _set_latest(self, snapshot):
+        with self._changed:
+            self._latest = snapshot
+            self._recent.append(snapshot)
+            self._seq = snapshot.seq
+            self._changed.notify_all()
+        self._ready.set()
+
+    def _open_history(self):
+        try:
+            from history import HistoryStore
+            return HistoryStore()
+        except OSError:
+            log.exception('history disabled')
+            return None
+
+
+class Sampler(SnapshotSource):
+    """Collects a Snapshot every `interval` seconds on a daemon thread.
+
+    With `shared`, each snapshot is also written to that SharedSnapshot and
+    the in-memory history lives in shared files, for Follower processes.
+    """
+
+    def __init__(self, interval=SAMPLE_INTERVAL, shared=None, lock_fd=None, first_seq=0):
+        super().__init__(interval)
+        self.shared = shared
+        self.lock_fd = lock_fd
+        self._seq = first_seq
+        self.freq_min, self.freq_max = read_freq_range()
+        self.freq_reader = collector('cpu_freq')
+        # While idle the expensive collectors run every 4th tick; CPU and memory every tick.
+        idle_ttl = 4 * IDLE_INTERVAL
+        wrap = selfstats.collectors.wrap
+        self.sockstat = Cached(wrap('sockstat', procfs.read_sockstat), CONNECTIONS_TTL, idle_ttl)
+        self.tcp_states = Cached(wrap('tcp_states', procfs.count_tcp_states), TCP_STATES_TTL, idle_ttl)
+        # Full /proc/<pid>/stat scan with per-pid CPU deltas; also gives the process count.
+        self.processes = Cached(wrap('processes', collector('processes').scan), PROCESSES_TTL, idle_ttl)
+        # The sampler's own cost, published with the snapshots for workers that do not sample.
+        self.self_stats = Cached(selfstats.producer_view, SELF_STATS_TTL) if selfstats.SELF_STATS else None
+        self.disks = collector('disks')
+        self.net = collector('net')
+        # Rules are evaluated by the producer only; followers get the result with the snapshot.
+        self.alerts = collector('alerts')
+        self.history = self._open_history() if HISTORY_ENABLED else None
+        self.memory = self._open_memory_store()
+
+    def start(self):
+        # Prime psutil's delta baseline; only this thread calls cpu_percent from now on.
+        psutil.cpu_percent(percpu=True)
+        psutil.cpu_percent()
+        self._thread = threading.Thread(target=self._run, name='sampler', daemon=True)
+        self._thread.start()
+
+    def _open_memory_store(self):
+        try:
+            from ringbuffer import MemoryStore
+        except ImportError:
+            log.info('numpy not installed, in-memory history disabled')
+            return None
+        if self.shared is not None:
+            return MemoryStore(self.interval, directory=shm.SHM_DIR, prefix=shm.SHM_NAME)
+        return MemoryStore(self.interval)
+
+    def collect(self):
+        """Read the machine once and return the raw snapshot data."""
+        measure = selfstats.collectors.measure
+        core_mhz = measure('cpu_freq', self.freq_reader.read_mhz)
+        cpu_percent = measure('cpu_percent', psutil.cpu_percent)
+        cpu_percent_per_core = measure('cpu_percent_per_core', psutil.cpu_percent, None, True)
+        memory = measure('memory', psutil.virtual_memory)
+        swap = measure('swap', psutil.swap_memory)
+        now = time.monotonic()
+        disks = measure('disks', self.disks.sample, now)
+        root = disks['mount'].index('/') if '/' in disks['mount'] else None
+        net = measure('net', self.net.sample, now)
+        idle = self.idle
+        processes = self.processes(idle)
+        return {
+            'cpu_percent': cpu_percent,
+            'cpu_percent_per_core': cpu_percent_per_core,
+            'core_mhz': core_mhz,
+            'cpu_freq_avg': round(sum(core_mhz) / len(core_mhz), 0) if core_mhz else 0,
+            'cpu_freq_min': self.freq_min,
+            'cpu_freq_max': self.freq_max,
+            'mem_percent': memory.percent,
+            'mem_used': memory.used,
+            'mem_total': memory.total,
+            'mem_available': memory.available,
+            'swap_percent': swap.percent,
+            'swap_used': swap.used,
+            'swap_total': swap.total,
+            'disk_percent': disks['percent'][root] if root is not None else 0.0,
+            'disk_used': disks['used'][root] if root is not None else 0,
+            'disk_total': disks['total'][root] if root is not None else 0,
+            'disk_free': disks['free'][root] if root is not None else 0,
+            'disk_read_rate': round(sum(disks['read_bps']), 1),
+            'disk_write_rate': round(sum(disks['write_bps']), 1),
+            'disks': disks,
+            'net_sent': sum(net['tx_bytes']),
+            'net_recv': sum(net['rx_bytes']),
+            'net_sent_rate': round(sum(net['tx_bps']), 1),
+            'net_recv_rate': round(sum(net['rx_bps']), 1),
+            'net': net,
+            'load_avg': measure('load_avg', psutil.getloadavg),
+            'boot_time': psutil.boot_time(),
+            'connections': procfs.count_connections(self.sockstat(idle)),
+            'tcp_states': self.tcp_states(idle),
+            'process_count': processes['count'],
+            'processes': processes,
+        }
+
+    def _publish(self, data):
+        snapshot = Snapshot(self._seq + 1, time.time(), data)
+        self._set_latest(snapshot)
+        if self.shared is not None:
+            payload = json.dumps(data, separators=(',', ':')).encode()
+            if not self.shared.publish(snapshot.seq, snapshot.ts, self.tick, payload):
+                log.error('snapshot of %d bytes does not fit MONITOR_SHM_SIZE', len(payload))
+
+    def _watched(self, data):
+        """Whether to keep sampling at full rate after this tick"""
+        if data.get('alerts') and data['alerts']['pending']:
+            return True     # a pending alert's duration is timed at full resolution
+        last = self._touched
+        if self.shared is not None:
+            last = max(last, self.shared.last_activity())
+        return time.time() - last < IDLE_AFTER
+
+    def _sleep_until(self, deadline):
+        """Wait for the next tick; True if it was cut short because someone started looking."""
+        while not self._stop.is_set():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            if not self.idle:
+                self._wake.wait(remaining)
+                self._wake.clear()
+                continue
+            # Idle: other workers' requests only show up in shared memory, so look there every second.
+            if self._wake.wait(min(remaining, ACTIVITY_POLL)):
+                self._wake.clear()
+                return not self._stop.is_set()
+            if self.shared is not None and time.time() - self.shared.last_activity() < IDLE_AFTER:
+                return True
+        return False
+
+    def _run(self):
+        next_tick = time.monotonic() + PRIME_DELAY
+        while True:
+            if self._sleep_until(next_tick):
+                next_tick = time.monotonic()
+                self.tick = self.interval
+            if self._stop.is_set():
+                return
+            self._check_profile()
+            started, started_cpu = time.perf_counter(), time.thread_time()
+            try:
+                data = self.collect()
+                data['alerts'] = (selfstats.collectors.measure('alerts', self.alerts.evaluate, data)
+                                  if self.alerts is not None else None)
+                self.tick = self.interval if IDLE_INTERVAL <= self.interval or self._watched(data) else IDLE_INTERVAL
+                # Seconds until the next snapshot, so readers can tell a slow tick from a dead producer.
+                data['sample_interval'] = self.tick
+                data['self'] = self.self_stats() if self.self_stats is not None else None
+                self._publish(data)
+                snapshot = self._latest
+                if self.memory is not None:
+                    self.memory.record(snapshot.ts, snapshot.data)
+                if self.history is not None:
+                    selfstats.collectors.measure('history', self.history.record, snapshot.ts, snapshot.data)
+            except Exception:
+                log.exception('sampler tick failed')
+            selfstats.collectors.record('tick', time.perf_counter() - started)
+            selfstats.collectors.record('tick_cpu', time.thread_time() - started_cpu)
+            next_tick += self.tick
+            now = time.monotonic()
+            if next_tick < now:
+                # Fell behind (suspend, slow /proc); skip missed ticks instead of bursting.
+                next_tick = now + self.tick
+
+
+class Follower(SnapshotSource):
+    """Serves the snapshots another process's Sampler writes to shared memory.
+
+    A follower never reads /proc. If the producer stops publishing, it
+    tries to take the producer lock and, once it holds it, sets
+    `promoted` and has get_sampler() start a Sampler in its place.
+    """
+
+    # Wake up this long after the producer's next expected publish.
+    FOLLOW_SLACK = 0.02
+
+    def __init__(self, shared, lock_path):
+        super().__init__(SAMPLE_INTERVAL)
+        self.shared = shared
+        self.lock_path = lock_path
+        self.history = self._open_history() if HISTORY_ENABLED else None
+        self.memory = self._open_memory_store()
+
+    def _open_memory_store(self):
+        try:
+            from ringbuffer import MemoryStore
+        except ImportError:
+            return None
+        return MemoryStore(self.interval, directory=shm.SHM_DIR, prefix=shm.SHM_NAME, writer=False)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='follower', daemon=True)
+        self._thread.start()
+
+    def _stale(self, record):
+        if record is None:
+            return True
+        return time.time() - record.ts > 3 * record.interval + 2
+
+    def _run(self):
+        while not self._stop.is_set():
+            record = self.shared.read()
+            if self._stale(record):
+                lock_fd = shm.try_lock(self.lock_path)
+                if lock_fd is not None:
+                    self.promoted = lock_fd
+                    get_sampler()   # start the replacement producer right away
+                    return
+            elif record.seq != self._seq:
+                self._set_latest(Snapshot(record.seq, record.ts, json.loads(record.payload)))
+            self._check_profile()
+            if record is None:
+                delay = 0.1
+            else:
+                self.tick = record.interval
+                delay = record.ts + record.interval - time.time() + self.FOLLOW_SLACK
+                delay = min(max(delay, 0.01), record.interval)
+                if time.time() - self._touched < IDLE_AFTER:
+                    # Someone is looking here: catch the producer's first fast tick promptly.
+                    delay = min(delay, self.interval)
+            self._wake.wait(delay)
+            self._wake.clear()
+
+
+_sampler = None
+_sampler_lock = threading.Lock()
+
+def _start_source():
+    """Producer if this process wins the host-wide lock, otherwise a Follower."""
+    if not SHARED_ENABLED:
+        return Sampler()
+    previous = _sampler if _sampler is not None and _sampler.pid == os.getpid() else None
+    try:
+        shared = shm.SharedSnapshot()
+        lock_path = shm.shm_path('lock')
+        lock_fd = previous.promoted if previous is not None else shm.try_lock(lock_path)
+    except OSError:
+        log.exception('shared snapshot unavailable, sampling in this process')
+        return Sampler()
+    if lock_fd is None:
+        return Follower(shared, lock_path)
+    record = shared.read()
+    # Continue the sequence so clients' ?since= and stream positions stay valid.
+    first_seq = max(record.seq if record else 0, previous._seq if previous else 0)
+    return Sampler(shared=shared, lock_fd=lock_fd, first_seq=first_seq)
+
+def use_source(source):
+    """Serve snapshots from `source` (e.g. a recording being replayed) instead of sampling."""
+    global _sampler
+    with _sampler_lock:
+        _sampler = source
+        source.start()
+
+def get_sampler():
+    """Return this process's snapshot source (Sampler or Follower), starting it on
+    first use, after fork, and when a Follower is promoted to producer."""
+    global _sampler
+    sampler = _sampler
+    if sampler is not None and sampler.pid == os.getpid() and sampler.promoted is None:
+        return sampler
+    with _sampler_lock:
+        if _sampler is None or _sampler.pid != os.getpid() or _sampler.promoted is not None:
+            _sampler = _start_source()
+            _sampler.start()
+        return _sampler
@@ -0,0 +1,227 @@
+"""
+What the monitor itself costs: timing histograms per collector and per
+route, this process's RSS and CPU time, and an on-demand sampling profiler.
+
+A histogram is a fixed array of log-spaced buckets (sqrt(2) apart, 1 us to
+~16 s), so recording is one bisect and an increment and memory never grows.
+Percentiles are reported as the upper bound of their bucket (capped at
+the maximum).
+
+The profiler samples every thread's stack with sys._current_frames() on a
+thread of its own for a limited time and writes collapsed stacks
+("thread;outer;inner count", the input of flamegraph.pl and speedscope)
+to MONITOR_PROFILE_DIR.
+"""
+
+import bisect
+import collections
+import logging
+import os
+import sys
+import threading
+import time
+
+SELF_STATS = os.environ.get('MONITOR_SELF_STATS', '1') == '1'
+# Where profiles are written; empty disables the profiler.
+PROFILE_DIR = os.environ.get('MONITOR_PROFILE_DIR', '')
+# Seconds between stack samples, and the longest profile one request may ask for.
+PROFILE_INTERVAL = float(os.environ.get('MONITOR_PROFILE_INTERVAL', '0.005'))
+PROFILE_MAX_SECONDS = 300
+
+# Bucket upper bounds in seconds: 1 us * sqrt(2)**i
+BOUNDS = tuple(1e-6 * 2 ** (i / 2) for i in range(49))
+
+PAGE_SIZE = os.sysconf('SC_PAGE_SIZE')
+STARTED = time.time()
+
+log = logging.getLogger(__name__)
+
+
+class Histogram:
+    """Count, sum and max of durations, and their distribution over BOUNDS."""
+
+    __slots__ = ('counts', 'count', 'total', 'max')
+
+    def __init__(self):
+        self.counts = [0] * (len(BOUNDS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds):
+        self.counts[bisect.bisect_left(BOUNDS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, q):
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank and n:
+                return min(BOUNDS[i], self.max) if i < len(BOUNDS) else self.max
+        return 0.0
+
+    def summary(self):
+        """{'count', 'total_ms', 'avg_ms', 'p50_ms', 'p90_ms', 'p99_ms', 'max_ms'}"""
+        if not self.count:
+            return {'count': 0}
+        return {
+            'count': self.count,
+            'total_ms': round(self.total * 1000, 3),
+            'avg_ms': round(self.total / self.count * 1000, 4),
+            'p50_ms': round(self.percentile(0.5) * 1000, 4),
+            'p90_ms': round(self.percentile(0.9) * 1000, 4),
+            'p99_ms': round(self.percentile(0.99) * 1000, 4),
+            'max_ms': round(self.max * 1000, 4),
+        }
+
+
+class Stats:
+    """Histograms by name, recorded from any thread."""
+
+    def __init__(self):
+        self.histograms = {}
+        self._lock = threading.Lock()
+
+    def record(self, name, seconds):
+        if not SELF_STATS:
+            return
+        with self._lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.record(seconds)
+
+    def measure(self, name, fn, *args):
+        """fn(*args), timed under name"""
+        if not SELF_STATS:
+            return fn(*args)
+        started = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            self.record(name, time.perf_counter() - started)
+
+    def wrap(self, name, fn):
+        """fn, timed under name on every call (for functions behind a cache)"""
+        def timed(*args):
+            return self.measure(name, fn, *args)
+        return timed
+
+    def summary(self):
+        with self._lock:
+            return {name: histogram.summary() for name, histogram in sorted(self.histograms.items())}
+
+
+# Filled by the sampler (producer only) and by every worker's request hooks.
+collectors = Stats()
+routes = Stats()
+
+
+def process_stats():
+    """RSS, CPU time and threads of this process"""
+    try:
+        with open('/proc/self/statm', 'rb') as f:
+            rss = int(f.read().split()[1]) * PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        rss = None
+    times = os.times()
+    uptime = time.time() - STARTED
+    cpu = times.user + times.system
+    return {
+        'pid': os.getpid(),
+        'rss': rss,
+        'cpu_user_s': round(times.user, 3),
+        'cpu_system_s': round(times.system, 3),
+        'cpu_percent_avg': round(cpu / uptime * 100, 3) if uptime > 0 else 0.0,
+        'threads': threading.active_count(),
+        'uptime_s': round(uptime, 1),
+    }
+
+def producer_view():
+    """What the sampler publishes with its snapshots, for workers that do not sample"""
+    return {'collectors': collectors.summary(), 'process': process_stats()}
+
+
+class Profiler:
+    """Samples the stacks of every other thread every `interval` seconds for `seconds`."""
+
+    def __init__(self, seconds, interval=PROFILE_INTERVAL, directory=PROFILE_DIR):
+        self.seconds = seconds
+        self.interval = interval
+        self.directory = directory
+        self.until = time.time() + seconds
+        self.samples = 0
+        self.path = None
+        self._thread = threading.Thread(target=self._run, name='profiler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    @property
+    def running(self):
+        return self._thread.is_alive()
+
+    def _run(self):
+        me = threading.get_ident()
+        stacks = collections.Counter()
+        labels = {}     # code object -> "name (file:line)"
+        deadline = time.monotonic() + self.seconds
+        while time.monotonic() < deadline:
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    label = labels.get(code)
+                    if label is None:
+                        label = labels[code] = f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+                    stack.append(label)
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                stacks[';'.join(reversed(stack))] += 1
+            self.samples += 1
+            time.sleep(self.interval)
+        self.path = self._write(stacks)
+
+    def _write(self, stacks):
+        os.makedirs(self.directory, exist_ok=True)
+        name = time.strftime('profile-%Y%m%d-%H%M%S', time.localtime(self.until - self.seconds))
+        path = os.path.join(self.directory, f"{name}-{os.getpid()}.folded")
+        with open(path, 'w') as f:
+            for stack, count in stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        log.info('profile of %d samples written to %s', self.samples, path)
+        return path
+
+    def view(self):
+        return {'running': self.running, 'until': round(self.until, 3),
+                'samples': self.samples, 'path': self.path}
+
+
+_profiler = None
+_profiler_lock = threading.Lock()
+
+def start_profile(until):
+    """Profile this process until `until` (wall time) unless it already is; the Profiler, or None."""
+    global _profiler
+    if not PROFILE_DIR:
+        return None
+    with _profiler_lock:
+        # Already profiling, or already done with this request (workers see it once per tick).
+        if _profiler is not None and (_profiler.running or _profiler.until >= until - 1):
+            return _profiler
+        seconds = min(until - time.time(), PROFILE_MAX_SECONDS)
+        if seconds <= 0:
+            return _profiler
+        _profiler = Profiler(seconds)
+        _profiler.start()
+        return _profiler
+
+def last_profile():
+    return _profiler
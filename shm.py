@@ -0,0 +1,121 @@
+"""
+Cross-process snapshot slot.
+
+One process (the producer, elected with an flock) runs the sampler and
+writes every snapshot into a shared mmap segment; every other Gunicorn
+worker reads it from there. Writes are guarded by a seqlock: the
+generation counter is odd while a write is in progress, and a reader
+retries if it changed underneath it.
+"""
+
+import fcntl
+import mmap
+import os
+import struct
+import tempfile
+import time
+
+SHM_DIR = os.environ.get(
+    'MONITOR_SHM_DIR', '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir())
+SHM_NAME = os.environ.get('MONITOR_SHM_NAME', f"server-monitor-{os.getuid()}")
+SHM_SIZE = int(os.environ.get('MONITOR_SHM_SIZE', str(4 << 20)))
+
+MAGIC = b'MONSNAP1'
+# magic, generation, seq, ts, interval, payload length, producer pid
+HEADER = struct.Struct('<8sQQddII')
+GENERATION = struct.Struct('<Q')
+GENERATION_OFFSET = 8
+# Wall time of the last request any worker served, written by every worker outside
+# the seqlock (one aligned 8-byte store) so an idle producer knows to speed up.
+ACTIVITY = struct.Struct('<d')
+ACTIVITY_OFFSET = 64
+# Wall time until which every process should run the sampling profiler (same rules).
+PROFILE_UNTIL_OFFSET = 72
+HEADER_SIZE = 128
+
+
+def shm_path(suffix):
+    return os.path.join(SHM_DIR, f"{SHM_NAME}.{suffix}")
+
+def try_lock(path):
+    """Non-blocking exclusive flock on path; the fd on success (keep it open), else None."""
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        os.close(fd)
+        return None
+    return fd
+
+
+class Record:
+    __slots__ = ('generation', 'seq', 'ts', 'interval', 'pid', 'payload')
+
+    def __init__(self, generation, seq, ts, interval, pid, payload):
+        self.generation = generation
+        self.seq = seq
+        self.ts = ts
+        self.interval = interval
+        self.pid = pid
+        self.payload = payload
+
+
+class SharedSnapshot:
+    """Single-writer / multi-reader snapshot slot in a file under SHM_DIR."""
+
+    def __init__(self, path=None, size=SHM_SIZE):
+        self.path = path or shm_path('snap')
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            # Never shrink: another process may have mapped the larger size.
+            size = max(size, os.fstat(fd).st_size)
+            if os.fstat(fd).st_size < size:
+                os.ftruncate(fd, size)
+            self.map = mmap.mmap(fd, size)
+        finally:
+            os.close(fd)
+        self.capacity = size - HEADER_SIZE
+
+    def generation(self):
+        return GENERATION.unpack_from(self.map, GENERATION_OFFSET)[0]
+
+    def publish(self, seq, ts, interval, payload):
+        """Write one snapshot (producer only). Returns False if it does not fit."""
+        if len(payload) > self.capacity:
+            return False
+        generation = self.generation()
+        # An odd value left by a producer that died mid-write is rounded up.
+        generation += 1 if generation % 2 == 0 else 2
+        GENERATION.pack_into(self.map, GENERATION_OFFSET, generation)
+        self.map[HEADER_SIZE:HEADER_SIZE + len(payload)] = payload
+        HEADER.pack_into(self.map, 0, MAGIC, generation, seq, ts, interval, len(payload), os.getpid())
+        GENERATION.pack_into(self.map, GENERATION_OFFSET, generation + 1)
+        return True
+
+    def read(self, retries=100):
+        """Consistent copy of the current snapshot, or None if nothing was published yet."""
+        for _ in range(retries):
+            magic, generation, seq, ts, interval, length, pid = HEADER.unpack_from(self.map, 0)
+            if magic != MAGIC:
+                return None
+            if generation % 2 == 0:
+                payload = self.map[HEADER_SIZE:HEADER_SIZE + length]
+                if self.generation() == generation:
+                    return Record(generation, seq, ts, interval, pid, payload)
+            time.sleep(0.0005)
+        return None
+
+    def touch(self, ts):
+        ACTIVITY.pack_into(self.map, ACTIVITY_OFFSET, ts)
+
+    def last_activity(self):
+        return ACTIVITY.unpack_from(self.map, ACTIVITY_OFFSET)[0]
+
+    def request_profile(self, until):
+        ACTIVITY.pack_into(self.map, PROFILE_UNTIL_OFFSET, until)
+
+    def profile_until(self):
+        return ACTIVITY.unpack_from(self.map, PROFILE_UNTIL_OFFSET)[0]
+
+    def close(self):
+        self.map.close()
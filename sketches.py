@@ -0,0 +1,239 @@
+"""
+Quantile sketches - log-histogram roll-ups of the history, for /api/report.
+
+Next to every metric's history rings there is one ring file per sketch
+tier whose records each hold one bucket's histogram over log-spaced bins:
+bin 0 counts values below `low`, bin i >= 1 values in
+[low * GAMMA**(i - 1), low * GAMMA**i), the last bin everything above. A
+quantile read back is within ACCURACY of the true one (relative), and
+merging buckets is adding their bins, so a 30-day report sums 720 hourly
+records per metric and never reads a sample.
+
+A sample weighs the seconds since the previous one (at most MAX_GAP), so
+quantiles and time above a threshold are shares of time, also while the
+sampler runs at its idle rate. Per-core metrics pool their cores, each core
+weighing 1/cores of the sample.
+"""
+
+import math
+from collections import Counter
+
+import lazy
+from history import HEADER_SIZE, METRICS, RingFile, RingStore
+
+# Only needed to merge records, so recording works without numpy.
+np = lazy.module('numpy')
+
+# (name, bucket seconds, buckets kept): 10 min for 2 days, 1 h for 62 days, so a
+# 30-day window can still be compared with the 30 days before it.
+SKETCH_TIERS = (
+    ('10m', 600, 288),
+    ('1h', 3600, 1488),
+)
+
+# Relative error of a quantile; bins grow by GAMMA.
+ACCURACY = 0.025
+GAMMA = (1 + ACCURACY) / (1 - ACCURACY)
+LOG_GAMMA = math.log(GAMMA)
+
+# Longer gaps between samples (monitor stopped) are not counted as time.
+MAX_GAP = 60
+# Open buckets are written this often, so other workers' reports see them.
+FLUSH_SECONDS = 10
+
+SKETCH_MAGIC = b'MONSKT01'
+
+
+class Layout:
+    """Log-spaced bins from `low` to `high`."""
+
+    def __init__(self, low, high):
+        self.low = low
+        self.high = high
+        self._log_low = math.log(low)
+        self.bins = 2 + math.ceil(math.log(high / low) / LOG_GAMMA)
+
+    def index(self, value):
+        if value < self.low:
+            return 0
+        i = 1 + int((math.log(value) - self._log_low) / LOG_GAMMA)
+        return i if i < self.bins else self.bins - 1
+
+    def edge(self, i):
+        """Lower bound of bin i >= 1"""
+        return self.low * GAMMA ** (i - 1)
+
+    def value(self, i):
+        """The value bin i stands for, within ACCURACY of all it holds"""
+        return 0.0 if i == 0 else self.edge(i) * 2 * GAMMA / (1 + GAMMA)
+
+    def quantile(self, counts, peak, q, floor=float('-inf')):
+        """q-th quantile (0..1) of merged bin weights; within the exact min (floor) and max"""
+        target = q * counts.sum()
+        i = int(np.searchsorted(np.cumsum(counts), target))
+        i = min(i, self.bins - 1)
+        return peak if i == self.bins - 1 else max(min(self.value(i), peak), floor)
+
+    def above(self, counts, peak, threshold):
+        """Weight of values above `threshold`, the bin it falls in split on a log scale"""
+        if threshold >= peak:
+            return 0.0
+        i = self.index(threshold)
+        weight = float(counts[i + 1:].sum())
+        if 0 < i < self.bins - 1:
+            weight += float(counts[i]) * (math.log(self.edge(i + 1) / threshold) / LOG_GAMMA)
+        elif i == self.bins - 1:
+            weight += float(counts[i])
+        return weight
+
+
+LAYOUTS = {
+    'percent': Layout(0.01, 100),
+    'mhz': Layout(10, 100000),
+    'rate': Layout(1, 1e12),    # bytes/s
+}
+
+# metric -> bin layout; metrics not listed have no sketch
+METRIC_LAYOUTS = {
+    'cpu_percent': LAYOUTS['percent'],
+    'cpu_core': LAYOUTS['percent'],
+    'core_mhz': LAYOUTS['mhz'],
+    'mem_percent': LAYOUTS['percent'],
+    'swap_percent': LAYOUTS['percent'],
+    'disk_percent': LAYOUTS['percent'],
+    'disk_read_rate': LAYOUTS['rate'],
+    'disk_write_rate': LAYOUTS['rate'],
+    'net_sent_rate': LAYOUTS['rate'],
+    'net_recv_rate': LAYOUTS['rate'],
+}
+
+
+class SketchRing(RingFile):
+    """Records of bucket start, seconds covered, weighted sum, max, min and `width` bin weights."""
+
+    magic = SKETCH_MAGIC
+
+    @staticmethod
+    def layout(width):
+        return f'<qddff{width}f'
+
+    def write(self, ts, seconds, total, peak, floor, counts):
+        self.record.pack_into(self.map, self._offset(ts), ts, seconds, total, peak, floor, *counts)
+        self._stored(ts)
+
+    def array(self):
+        """Every record as a numpy structured array over the map (drop it before close())."""
+        dtype = np.dtype([('ts', '<i8'), ('seconds', '<f8'), ('total', '<f8'), ('peak', '<f4'),
+                          ('floor', '<f4'), ('counts', '<f4', (self.width,))])
+        return np.frombuffer(self.map, dtype, count=self.capacity, offset=HEADER_SIZE)
+
+
+class Sketch:
+    """The open bucket of one metric x tier."""
+
+    __slots__ = ('start', 'seconds', 'total', 'peak', 'floor', 'counts')
+
+    def __init__(self, start, bins, record=None):
+        self.start = start
+        if record is None:
+            self.seconds, self.total, self.counts = 0.0, 0.0, [0.0] * bins
+            self.peak, self.floor = float('-inf'), float('inf')
+        else:
+            # Carry on with what an earlier process wrote for this bucket.
+            self.seconds, self.total, self.peak, self.floor = record[1:5]
+            self.counts = list(record[5:])
+
+
+class SketchStore(RingStore):
+    """Sketch rings for every metric/tier under `directory`, written from the samples HistoryStore records."""
+
+    ring_class = SketchRing
+    suffix = 'sketch'
+
+    def __init__(self, directory, tiers=SKETCH_TIERS):
+        super().__init__(directory, tiers)
+        self._open = {}
+        self._last = None
+        self._written = 0
+
+    def _open_bucket(self, metric, tier, start, bins):
+        ring = self._ring(metric, tier, bins)
+        sketch = self._open[(metric, tier[0])] = Sketch(start, bins, next(ring.records(start, start), None))
+        return sketch
+
+    def _write(self, metric, tier, sketch):
+        self._ring(metric, tier, len(sketch.counts)).write(sketch.start, sketch.seconds, sketch.total,
+                                                           sketch.peak, sketch.floor, sketch.counts)
+
+    def record(self, ts, data):
+        with self._lock:
+            seconds = 1.0 if self._last is None else min(ts - self._last, MAX_GAP)
+            if seconds <= 0:
+                return
+            self._last = ts
+            ts = int(ts)
+            for metric, layout in METRIC_LAYOUTS.items():
+                try:
+                    values = METRICS[metric](data)
+                except KeyError:
+                    continue
+                if not values:
+                    continue
+                weight = seconds / len(values)
+                # Cores mostly run at the same few clocks / percentages: bin each value once.
+                bins = Counter()
+                for value, n in Counter(values).items():
+                    bins[layout.index(value)] += n
+                bins = bins.items()
+                total, peak, floor = sum(values) * weight, max(values), min(values)
+                for tier in self.tiers:
+                    start = ts - ts % tier[1]
+                    sketch = self._open.get((metric, tier[0]))
+                    if sketch is None or sketch.start != start:
+                        if sketch is not None:
+                            self._write(metric, tier, sketch)
+                        sketch = self._open_bucket(metric, tier, start, layout.bins)
+                    counts = sketch.counts
+                    for i, n in bins:
+                        counts[i] += weight * n
+                    sketch.seconds += seconds
+                    sketch.total += total
+                    if peak > sketch.peak:
+                        sketch.peak = peak
+                    if floor < sketch.floor:
+                        sketch.floor = floor
+            if ts - self._written >= FLUSH_SECONDS:
+                self._written = ts
+                self._flush()
+
+    def _flush(self):
+        for (metric, name), sketch in self._open.items():
+            self._write(metric, next(t for t in self.tiers if t[0] == name), sketch)
+
+    def flush(self):
+        with self._lock:
+            self._flush()
+
+    def merge(self, metric, start, end):
+        """{'tier', 'from', 'seconds', 'total', 'peak', 'floor', 'counts'} of the buckets of start..end added up, or None"""
+        if metric not in METRIC_LAYOUTS:
+            raise KeyError(metric)
+        with self._lock:
+            tier = self.pick_tier(metric, start, None)
+            start = int(start) - int(start) % tier[1]
+            ring = self._ring(metric, tier)
+            if ring is None:
+                return None
+            records = ring.array()
+            chosen = records[(records['ts'] >= start) & (records['ts'] <= end) & (records['seconds'] > 0)]
+            result = {
+                'tier': tier[0],
+                'from': start,
+                'seconds': float(chosen['seconds'].sum()),
+                'total': float(chosen['total'].sum()),
+                'peak': float(chosen['peak'].max()) if len(chosen) else None,
+                'floor': float(chosen['floor'].min()) if len(chosen) else None,
+                'counts': chosen['counts'].sum(axis=0, dtype=np.float64),
+            }
+            del records, chosen
+        return result if result['seconds'] else None
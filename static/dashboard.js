@@ -0,0 +1,494 @@
+var MAX_POINTS = 60;
+var REFRESH_MS = 2000;
+var API_BASE = window.location.pathname.replace(/\/+$/, '');
+var CORE_COLORS = [
+    '#ef4444', '#f59e0b', '#22c55e', '#06b6d4',
+    '#3b82f6', '#8b5cf6', '#ec4899', '#f97316'
+];
+
+var labels = [];
+
+// Clock Chart: a line per core, or on many-core hosts a min / avg / max band over all cores
+var CORE_BANDS = MONITOR_CONFIG.coreChart === 'bands';
+var clockCtx = document.getElementById('clockChart').getContext('2d');
+var clockDatasets = [];
+if (CORE_BANDS) {
+    // Max fills down to min (two datasets on), avg is drawn on top.
+    clockDatasets.push(
+        { label: 'Max', data: [], borderColor: '#f59e0b', backgroundColor: 'rgba(59,130,246,0.15)', borderWidth: 1, pointRadius: 0, tension: 0.3, fill: '+2' },
+        { label: 'Avg', data: [], borderColor: '#3b82f6', backgroundColor: '#3b82f620', borderWidth: 2, pointRadius: 0, tension: 0.3, fill: false },
+        { label: 'Min', data: [], borderColor: '#94a3b8', backgroundColor: '#94a3b820', borderWidth: 1, pointRadius: 0, tension: 0.3, fill: false }
+    );
+}
+for (var i = 0; !CORE_BANDS && i < MONITOR_CONFIG.cpuCount; i++) {
+    clockDatasets.push({
+        label: 'Core ' + i,
+        data: [],
+        borderColor: CORE_COLORS[i % CORE_COLORS.length],
+        backgroundColor: CORE_COLORS[i % CORE_COLORS.length] + '20',
+        borderWidth: 2,
+        pointRadius: 0,
+        tension: 0.3,
+        fill: false,
+    });
+}
+var clockChart = new Chart(clockCtx, {
+    type: 'line',
+    data: { labels: labels, datasets: clockDatasets },
+    options: {
+        responsive: true,
+        maintainAspectRatio: false,
+        animation: { duration: 300 },
+        interaction: { mode: 'index', intersect: false },
+        plugins: {
+            legend: { labels: { color: '#94a3b8', usePointStyle: true, pointStyle: 'circle', font: { size: 11 } } },
+            tooltip: {
+                backgroundColor: 'rgba(15, 23, 42, 0.9)',
+                titleColor: '#e2e8f0', bodyColor: '#94a3b8',
+                borderColor: 'rgba(255,255,255,0.1)', borderWidth: 1,
+                callbacks: { label: function(ctx) { return ctx.dataset.label + ': ' + ctx.parsed.y + ' MHz'; } }
+            }
+        },
+        scales: {
+            x: { ticks: { color: '#475569', maxTicksLimit: 10 }, grid: { color: 'rgba(255,255,255,0.03)' } },
+            y: { min: 0, max: MONITOR_CONFIG.freqMax + 200,
+                ticks: { color: '#475569', callback: function(v) { return v + ' MHz'; } },
+                grid: { color: 'rgba(255,255,255,0.05)' } }
+        }
+    }
+});
+
+// Usage Chart
+var usageCtx = document.getElementById('usageChart').getContext('2d');
+var usageChart = new Chart(usageCtx, {
+    type: 'line',
+    data: {
+        labels: labels,
+        datasets: [
+            { label: 'CPU %', data: [], borderColor: '#f59e0b', backgroundColor: 'rgba(245,158,11,0.1)', borderWidth: 2, pointRadius: 0, tension: 0.3, fill: true },
+            { label: 'Memory %', data: [], borderColor: '#8b5cf6', backgroundColor: 'rgba(139,92,246,0.1)', borderWidth: 2, pointRadius: 0, tension: 0.3, fill: true }
+        ]
+    },
+    options: {
+        responsive: true, maintainAspectRatio: false,
+        animation: { duration: 300 },
+        interaction: { mode: 'index', intersect: false },
+        plugins: {
+            legend: { labels: { color: '#94a3b8', usePointStyle: true, pointStyle: 'circle', font: { size: 11 } } },
+            tooltip: {
+                backgroundColor: 'rgba(15, 23, 42, 0.9)',
+                titleColor: '#e2e8f0', bodyColor: '#94a3b8',
+                borderColor: 'rgba(255,255,255,0.1)', borderWidth: 1,
+                callbacks: { label: function(ctx) { return ctx.dataset.label + ': ' + ctx.parsed.y.toFixed(1) + '%'; } }
+            }
+        },
+        scales: {
+            x: { ticks: { color: '#475569', maxTicksLimit: 10 }, grid: { color: 'rgba(255,255,255,0.03)' } },
+            y: { min: 0, max: 100,
+                ticks: { color: '#475569', callback: function(v) { return v + '%'; } },
+                grid: { color: 'rgba(255,255,255,0.05)' } }
+        }
+    }
+});
+
+// Bytes-per-second charts (disk I/O, network)
+function rateChart(canvasId, datasets) {
+    return new Chart(document.getElementById(canvasId).getContext('2d'), {
+        type: 'line',
+        data: { labels: labels, datasets: datasets },
+        options: {
+            responsive: true, maintainAspectRatio: false,
+            animation: { duration: 300 },
+            interaction: { mode: 'index', intersect: false },
+            plugins: {
+                legend: { labels: { color: '#94a3b8', usePointStyle: true, pointStyle: 'circle', font: { size: 11 } } },
+                tooltip: {
+                    backgroundColor: 'rgba(15, 23, 42, 0.9)',
+                    titleColor: '#e2e8f0', bodyColor: '#94a3b8',
+                    borderColor: 'rgba(255,255,255,0.1)', borderWidth: 1,
+                    callbacks: { label: function(ctx) { return ctx.dataset.label + ': ' + formatBytes(ctx.parsed.y) + '/s'; } }
+                }
+            },
+            scales: {
+                x: { ticks: { color: '#475569', maxTicksLimit: 10 }, grid: { color: 'rgba(255,255,255,0.03)' } },
+                y: { min: 0,
+                    ticks: { color: '#475569', callback: function(v) { return formatBytes(v) + '/s'; } },
+                    grid: { color: 'rgba(255,255,255,0.05)' } }
+            }
+        }
+    });
+}
+
+var diskChart = rateChart('diskChart', [
+    { label: 'Read', data: [], borderColor: '#22c55e', backgroundColor: 'rgba(34,197,94,0.1)', borderWidth: 2, pointRadius: 0, tension: 0.3, fill: true },
+    { label: 'Write', data: [], borderColor: '#ef4444', backgroundColor: 'rgba(239,68,68,0.1)', borderWidth: 2, pointRadius: 0, tension: 0.3, fill: true }
+]);
+var netChart = rateChart('netChart', [
+    { label: 'Received', data: [], borderColor: '#06b6d4', backgroundColor: 'rgba(6,182,212,0.1)', borderWidth: 2, pointRadius: 0, tension: 0.3, fill: true },
+    { label: 'Sent', data: [], borderColor: '#f97316', backgroundColor: 'rgba(249,115,22,0.1)', borderWidth: 2, pointRadius: 0, tension: 0.3, fill: true }
+]);
+
+function getColor(percent) {
+    if (percent < 50) return '#22c55e';
+    if (percent < 80) return '#f59e0b';
+    return '#ef4444';
+}
+
+// Set an element's text only when it changed, so unchanged nodes are not re-laid out.
+function setText(el, text) {
+    if (typeof el === 'string') el = document.getElementById(el);
+    if (el.textContent !== text) el.textContent = text;
+}
+
+// Core tiles are built once; each tick only touches the tiles whose clock changed.
+var coreTiles = [];
+
+function updateCoreGrid(coreClocks, maxFreq) {
+    var grid = document.getElementById('core-grid');
+    if (coreTiles.length !== coreClocks.length) {
+        grid.innerHTML = coreClocks.map(function(core) {
+            return '<div class="core-item">' +
+                '<div class="core-label">Core ' + core.core + '</div>' +
+                '<div class="core-clock"></div>' +
+                '<div class="core-clock-unit"></div>' +
+                '<div class="core-bar"><div class="core-bar-fill"></div></div></div>';
+        }).join('');
+        coreTiles = Array.prototype.map.call(grid.children, function(item) {
+            return { mhz: null, clock: item.children[1], unit: item.children[2], bar: item.children[3].firstChild };
+        });
+    }
+    coreClocks.forEach(function(core, i) {
+        var tile = coreTiles[i];
+        var mhz = Math.round(core.current);
+        if (tile.mhz === mhz) return;
+        tile.mhz = mhz;
+        tile.clock.textContent = (core.current / 1000).toFixed(2);
+        tile.unit.textContent = 'GHz (' + mhz + ' MHz)';
+        tile.bar.style.width = (core.current / maxFreq * 100).toFixed(0) + '%';
+    });
+}
+
+function td(html, attributes) {
+    return '<td' + (attributes ? ' ' + attributes : '') + '>' + html + '</td>';
+}
+
+// Replace a table body's rows (arrays of td() cells) touching only the cells that changed.
+function patchRows(tbody, rows) {
+    if (typeof tbody === 'string') tbody = document.getElementById(tbody);
+    var previous = tbody.cells_ || [];
+    var shapeChanged = previous.length !== rows.length || rows.some(function(row, r) {
+        return previous[r].length !== row.length;
+    });
+    if (shapeChanged) {
+        tbody.innerHTML = rows.map(function(row) { return '<tr>' + row.join('') + '</tr>'; }).join('');
+    } else {
+        rows.forEach(function(row, r) {
+            row.forEach(function(html, c) {
+                if (previous[r][c] !== html) tbody.rows[r].cells[c].outerHTML = html;
+            });
+        });
+    }
+    tbody.cells_ = rows;
+}
+
+function pushPoint(chart, values) {
+    chart.data.datasets.forEach(function(dataset, i) {
+        dataset.data.push(values[i]);
+        if (dataset.data.length > MAX_POINTS) dataset.data.shift();
+    });
+    chart.update('none');
+}
+
+function updateDiskRows(disks) {
+    patchRows('disk-rows', disks.map(function(d) {
+        return [td(escapeHtml(d.mount)), td(escapeHtml(d.device) + ' <span class="card-sub">' + escapeHtml(d.fstype) + '</span>'),
+            td(d.percent + '% <span class="card-sub">of ' + formatBytes(d.total) + '</span>', 'style="color: ' + getColor(d.percent) + '"'),
+            td(formatBytes(d.read_bps)), td(formatBytes(d.write_bps)),
+            td(d.read_iops + ' / ' + d.write_iops), td(d.await_ms + ' ms'), td(d.util + '%')];
+    }));
+}
+
+function updateNetRows(interfaces) {
+    patchRows('net-rows', interfaces.map(function(n) {
+        return [td(escapeHtml(n.iface)), td(formatBytes(n.rx_bps)), td(formatBytes(n.tx_bps)),
+            td(n.rx_pps + ' / ' + n.tx_pps), td(n.rx_errs + ' / ' + n.tx_errs), td(n.rx_drop + ' / ' + n.tx_drop)];
+    }));
+}
+
+function updateAlerts(alerts) {
+    var badge = document.getElementById('alert-badge');
+    badge.style.display = alerts.length ? '' : 'none';
+    badge.textContent = alerts.length + (alerts.length === 1 ? ' ALERT' : ' ALERTS');
+    badge.title = alerts.map(function(a) {
+        return a.rule + (a.item ? ' [' + a.item + ']' : '') + ': ' + a.value;
+    }).join('\n');
+}
+
+function updateDashboard(data) {
+    labels.push(data.timestamp);
+    if (labels.length > MAX_POINTS) labels.shift();
+
+    if (CORE_BANDS) {
+        var low = Infinity, high = -Infinity, sum = 0;
+        data.core_clocks.forEach(function(core) {
+            low = Math.min(low, core.current);
+            high = Math.max(high, core.current);
+            sum += core.current;
+        });
+        pushPoint(clockChart, [Math.round(high), Math.round(sum / data.core_clocks.length), Math.round(low)]);
+    } else {
+        pushPoint(clockChart, data.core_clocks.map(function(core) { return core.current; }));
+    }
+
+    usageChart.data.datasets[0].data.push(data.cpu_percent);
+    usageChart.data.datasets[1].data.push(data.mem_percent);
+    if (usageChart.data.datasets[0].data.length > MAX_POINTS) {
+        usageChart.data.datasets[0].data.shift();
+        usageChart.data.datasets[1].data.shift();
+    }
+    usageChart.update('none');
+
+    pushPoint(diskChart, [data.disk_read_rate, data.disk_write_rate]);
+    updateDiskRows(data.disks);
+    pushPoint(netChart, [data.net_recv_rate, data.net_sent_rate]);
+    updateNetRows(data.net);
+    updateAlerts(data.alerts);
+    setText('net-sent-rate', formatBytes(data.net_sent_rate) + '/s');
+    setText('net-recv-rate', formatBytes(data.net_recv_rate) + '/s');
+    if (data.net_sent !== undefined) {
+        setText('net-sent', formatBytes(data.net_sent) + ' total');
+        setText('net-recv', formatBytes(data.net_recv) + ' total');
+    }
+
+    updateCoreGrid(data.core_clocks, data.cpu_freq_max);
+    setText('clock-avg', Math.round(data.cpu_freq_avg) + ' MHz');
+
+    setText('cpu-percent', data.cpu_percent.toFixed(1) + '%');
+    document.getElementById('cpu-percent').style.color = getColor(data.cpu_percent);
+    document.getElementById('cpu-bar').style.width = data.cpu_percent + '%';
+    document.getElementById('cpu-bar').style.background = getColor(data.cpu_percent);
+    setText('cpu-detail', data.core_clocks.length + ' cores @ ' + Math.round(data.cpu_freq_avg) + ' MHz');
+
+    setText('mem-percent', data.mem_percent.toFixed(1) + '%');
+    document.getElementById('mem-percent').style.color = getColor(data.mem_percent);
+    document.getElementById('mem-bar').style.width = data.mem_percent + '%';
+    document.getElementById('mem-bar').style.background = getColor(data.mem_percent);
+    setText('mem-detail', data.mem_used + ' / ' + data.mem_total);
+
+    setText('server-time', data.server_time);
+    setText('last-update', data.server_time);
+}
+
+// Order of the per-mount values in a compact document's "dk" rows
+var DISK_FIELDS = ['percent', 'read_bps', 'write_bps', 'read_iops', 'write_iops', 'await_ms', 'util'];
+// ... and of the per-interface values in "nk" rows
+var NET_FIELDS = ['rx_bps', 'tx_bps', 'rx_pps', 'tx_pps', 'rx_errs', 'tx_errs', 'rx_drop', 'tx_drop'];
+
+// Decoder state for the compact format: static fields and per-core arrays as of COMPACT.seq.
+var COMPACT = { seq: 0, static: null, pc: [], mhz: [] };
+
+function unpack(b64, ArrayType) {
+    var bin = atob(b64);
+    var bytes = new Uint8Array(bin.length);
+    for (var i = 0; i < bin.length; i++) bytes[i] = bin.charCodeAt(i);
+    return Array.prototype.slice.call(new ArrayType(bytes.buffer));
+}
+
+function formatBytes(value) {
+    var units = ['B', 'KB', 'MB', 'GB', 'TB'];
+    for (var i = 0; i < units.length; i++) {
+        if (value < 1024) return value.toFixed(2) + ' ' + units[i];
+        value /= 1024;
+    }
+    return value.toFixed(2) + ' PB';
+}
+
+// Apply a compact document; returns /api/realtime-shaped data, or null if a delta's base is unknown.
+function decodeCompact(doc) {
+    if (doc.static) {
+        COMPACT.static = doc.static;
+        COMPACT.pc = unpack(doc.pc, Float32Array);
+        COMPACT.mhz = unpack(doc.mhz, Float32Array);
+    } else {
+        if (doc.base !== COMPACT.seq) return null;
+        ['pc', 'mhz'].forEach(function(key) {
+            var values = unpack(doc[key], Float32Array);
+            if (doc[key + '_i'] === undefined) {
+                COMPACT[key] = values;
+                return;
+            }
+            unpack(doc[key + '_i'], Uint16Array).forEach(function(core, j) { COMPACT[key][core] = values[j]; });
+        });
+    }
+    COMPACT.seq = doc.seq;
+    var st = COMPACT.static;
+    var serverTime = new Date((doc.t + st.tz) * 1000).toISOString().slice(0, 19).replace('T', ' ');
+    return {
+        timestamp: serverTime.slice(11),
+        server_time: serverTime,
+        cpu_percent: doc.cpu,
+        cpu_percent_per_core: COMPACT.pc.slice(),
+        cpu_freq_avg: doc.fa,
+        cpu_freq_max: st.freq_max,
+        cpu_freq_min: st.freq_min,
+        core_clocks: COMPACT.mhz.map(function(mhz, i) {
+            return { core: i, current: mhz, min: st.freq_min, max: st.freq_max };
+        }),
+        mem_percent: doc.mem[0],
+        mem_used: formatBytes(doc.mem[1]),
+        mem_total: formatBytes(st.mem_total),
+        disk_read_rate: doc.dio[0],
+        disk_write_rate: doc.dio[1],
+        disks: doc.dk.map(function(row, i) {
+            var disk = { mount: st.mounts[i].mount, device: st.mounts[i].device, fstype: st.mounts[i].fstype, total: st.mounts[i].total };
+            DISK_FIELDS.forEach(function(field, j) { disk[field] = row[j]; });
+            return disk;
+        }),
+        net_sent_rate: doc.nio[0],
+        net_recv_rate: doc.nio[1],
+        net_sent: doc.nio[2],
+        net_recv: doc.nio[3],
+        net: doc.nk.map(function(row, i) {
+            var nic = { iface: st.ifaces[i] };
+            NET_FIELDS.forEach(function(field, j) { nic[field] = row[j]; });
+            return nic;
+        }),
+        alerts: doc.al.map(function(a) { return { rule: a[0], item: a[1], value: a[2] }; })
+    };
+}
+
+function fetchData() {
+    fetch(API_BASE + '/api/realtime?format=compact' + (COMPACT.seq ? '&since=' + COMPACT.seq : ''))
+        .then(function(r) { return r.json(); })
+        .then(function(doc) {
+            var data = decodeCompact(doc);
+            if (data) updateDashboard(data);
+            else COMPACT.seq = 0;   // lost sync: next poll asks for a full document
+        })
+        .catch(function(err) { console.error('Fetch error:', err); });
+}
+
+var pollTimer = null;
+var stream = null;
+
+function startPolling() {
+    if (pollTimer) return;
+    fetchData();
+    pollTimer = setInterval(fetchData, REFRESH_MS);
+}
+
+// Prefer the server push stream; fall back to polling if it is disabled or breaks.
+function startStream() {
+    if (stream) return;
+    if (!MONITOR_CONFIG.stream || !window.EventSource) {
+        startPolling();
+        return;
+    }
+    var source = stream = new EventSource(API_BASE + '/api/stream?format=compact&interval=' + (REFRESH_MS / 1000));
+    var received = false;
+    source.onmessage = function(e) {
+        received = true;
+        var data = decodeCompact(JSON.parse(e.data));
+        if (data) updateDashboard(data);
+    };
+    source.onerror = function() {
+        // EventSource reconnects by itself once it has worked; give up only if it never did.
+        if (!received || source.readyState === EventSource.CLOSED) {
+            source.close();
+            stream = null;
+            startPolling();
+        }
+    };
+}
+
+function stopUpdates() {
+    if (pollTimer) {
+        clearInterval(pollTimer);
+        pollTimer = null;
+    }
+    if (stream) {
+        stream.close();
+        stream = null;
+    }
+}
+
+// A hidden tab stops asking for data, so the server can drop to its idle sampling rate.
+document.addEventListener('visibilitychange', function() {
+    if (document.hidden) stopUpdates();
+    else startStream();
+});
+
+// Seed the charts from server-side history so a reload does not start empty.
+function loadHistory() {
+    var query = '&from=-' + (MAX_POINTS * REFRESH_MS / 1000) + '&step=' + (REFRESH_MS / 1000);
+    var metrics = ['cpu_percent', 'mem_percent', 'core_mhz', 'disk_read_rate', 'disk_write_rate', 'net_recv_rate', 'net_sent_rate'];
+    var requests = metrics.map(function(metric) {
+        // Per-core clocks come already reduced to the chart's lines (bands on many-core hosts).
+        var url = metric === 'core_mhz'
+            ? '/api/chart?metric=core_mhz&mode=' + (CORE_BANDS ? 'bands' : 'all') + query
+            : '/api/history?metric=' + metric + query;
+        return fetch(API_BASE + url).then(function(r) { return r.ok ? r.json() : null; });
+    });
+    return Promise.all(requests).then(function(results) {
+        var cpu = results[0];
+        if (!cpu || !results[1] || !results[2]) return;
+        // metric -> {t: avg}, for lining the other series up with the CPU timestamps
+        var at = {};
+        metrics.forEach(function(metric, m) {
+            at[metric] = {};
+            if (!results[m]) return;
+            results[m].t.forEach(function(t, i) {
+                at[metric][t] = results[m].avg ? results[m].avg[i]
+                    : results[m].series.map(function(line) { return line.data[i]; });
+            });
+        });
+        cpu.t.forEach(function(t, i) {
+            if (!(t in at.mem_percent) || !(t in at.core_mhz)) return;
+            labels.push(new Date(t * 1000).toTimeString().slice(0, 8));
+            usageChart.data.datasets[0].data.push(cpu.avg[i]);
+            usageChart.data.datasets[1].data.push(at.mem_percent[t]);
+            diskChart.data.datasets[0].data.push(at.disk_read_rate[t] || 0);
+            diskChart.data.datasets[1].data.push(at.disk_write_rate[t] || 0);
+            netChart.data.datasets[0].data.push(at.net_recv_rate[t] || 0);
+            netChart.data.datasets[1].data.push(at.net_sent_rate[t] || 0);
+            // Bands arrive as min, avg, max; the chart draws max first so it can fill down to min.
+            var clocks = CORE_BANDS ? at.core_mhz[t].slice().reverse() : at.core_mhz[t];
+            clocks.forEach(function(value, line) {
+                if (clockChart.data.datasets[line]) clockChart.data.datasets[line].data.push(Math.round(value));
+            });
+        });
+    }).catch(function(err) { console.error('History error:', err); });
+}
+
+function escapeHtml(text) {
+    return String(text).replace(/[&<>"']/g, function(c) {
+        return {'&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;', "'": '&#39;'}[c];
+    });
+}
+
+var processSort = 'cpu';
+
+function fetchProcesses() {
+    if (document.hidden) return;
+    fetch(API_BASE + '/api/processes?sort=' + processSort + '&limit=' + MONITOR_CONFIG.topProcesses)
+        .then(function(r) { return r.json(); })
+        .then(function(doc) {
+            setText('process-summary', doc.count + ' processes, scanned in ' + doc.scan_ms + ' ms');
+            patchRows('process-rows', doc.processes.map(function(p) {
+                return [td(p.pid), td(escapeHtml(p.user)), td(p.cpu), td(formatBytes(p.rss)), td(p.state),
+                    td(escapeHtml(p.cmdline), 'class="cmdline" title="' + escapeHtml(p.cmdline) + '"')];
+            }));
+        })
+        .catch(function(err) { console.error('Processes error:', err); });
+}
+
+document.querySelectorAll('[data-sort]').forEach(function(link) {
+    link.addEventListener('click', function(e) {
+        e.preventDefault();
+        processSort = link.getAttribute('data-sort');
+        fetchProcesses();
+    });
+});
+setInterval(fetchProcesses, MONITOR_CONFIG.processesMs);
+
+loadHistory().then(startStream);
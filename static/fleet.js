@@ -0,0 +1,71 @@
+var FLEET_QUERY = window.location.search;
+
+function escapeHtml(text) {
+    return String(text).replace(/[&<>"']/g, function(c) {
+        return {'&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;', "'": '&#39;'}[c];
+    });
+}
+
+function statusColor(percent) {
+    if (percent < 50) return '#22c55e';
+    if (percent < 80) return '#f59e0b';
+    return '#ef4444';
+}
+
+function formatSize(value) {
+    var units = ['B', 'KB', 'MB', 'GB', 'TB'];
+    for (var i = 0; i < units.length; i++) {
+        if (value < 1024) return value.toFixed(2) + ' ' + units[i];
+        value /= 1024;
+    }
+    return value.toFixed(2) + ' PB';
+}
+
+function hostLink(host) {
+    return '<a href="fleet/host/' + encodeURIComponent(host.name) + '/">' + escapeHtml(host.name) + '</a>';
+}
+
+function renderTop(key, hosts) {
+    document.getElementById('top-' + key).innerHTML = hosts.map(function(host) {
+        var value = host[key];
+        return '<div class="top-row">' + hostLink(host) +
+            '<div class="progress-bar"><div class="progress-fill" style="width: ' + value + '%; background: ' + statusColor(value) + '"></div></div>' +
+            '<span class="top-value">' + value + '%</span></div>';
+    }).join('');
+}
+
+function renderRow(host) {
+    var cells = '<td>' + hostLink(host) + (host.error ? '<div class="fleet-error">' + escapeHtml(host.error) + '</div>' : '') + '</td>' +
+        '<td><span class="badge badge-' + (host.status === 'ok' ? 'online' : host.status) + '">' + host.status.toUpperCase() + '</span></td>';
+    if (host.cpu !== undefined) {
+        cells += '<td>' + host.cpu + '% <span class="card-sub">/ ' + host.cores + 'c</span></td>' +
+            '<td>' + host.load1.toFixed(2) + '</td>' +
+            '<td>' + host.mem + '%</td>' +
+            '<td>' + host.disk + '%</td>' +
+            '<td>' + formatSize(host.net_sent_rate) + '/s / ' + formatSize(host.net_recv_rate) + '/s</td>';
+    } else {
+        cells += '<td>-</td><td>-</td><td>-</td><td>-</td><td>-</td>';
+    }
+    cells += '<td>' + (host.age !== null ? host.age.toFixed(1) + 's' : '-') + '</td>' +
+        '<td>' + (host.latency_ms !== null ? Math.round(host.latency_ms) + ' ms' : '-') + '</td>';
+    return '<tr>' + cells + '</tr>';
+}
+
+function renderFleet(view) {
+    document.getElementById('fleet-counts').innerHTML =
+        '<span class="badge badge-online">' + view.counts.ok + ' OK</span>' +
+        '<span class="badge badge-stale">' + view.counts.stale + ' STALE</span>' +
+        '<span class="badge badge-down">' + view.counts.down + ' DOWN</span>';
+    ['cpu', 'mem', 'disk'].forEach(function(key) { renderTop(key, view.top[key]); });
+    document.getElementById('fleet-hosts').innerHTML = view.hosts.map(renderRow).join('');
+    document.getElementById('last-update').textContent = new Date(view.ts * 1000).toTimeString().slice(0, 8);
+}
+
+function refreshFleet() {
+    fetch('api/fleet' + FLEET_QUERY)
+        .then(function(r) { return r.json(); })
+        .then(renderFleet)
+        .catch(function(err) { console.error('Fleet error:', err); });
+}
+
+setInterval(refreshFleet, FLEET_CONFIG.interval * 1000);